@@ -9,17 +9,36 @@
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
+from tkinter import font as tkfont
 from tkinter.scrolledtext import ScrolledText
 import os
+import re
 import sys
 import threading
+import weakref
+import multiprocessing
+import queue
 import tempfile
 import subprocess
 import time
+import csv
+import itertools
+import bisect
 import shutil
+import hashlib
+import uuid
+import zipfile
+import zlib
+import json
+import sqlite3
+import inspect
+import functools
 import winreg
 from pathlib import Path
 from io import BytesIO
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # ============== 检查依赖 ==============
 def check_dependencies():
@@ -45,7 +64,7 @@ if not check_dependencies():
     input("按回车键退出...")
     sys.exit(1)
 
-from PIL import Image
+from PIL import Image, ImageChops, TiffImagePlugin, features
 from pptx import Presentation
 from pptx.util import Inches, Emu
 import fitz
@@ -72,6 +91,15 @@ except ImportError:
     HAS_SELENIUM = False
     print("⚠️ 未安装 selenium，请运行: pip install selenium")
 
+try:
+    from multiprocessing import shared_memory
+    HAS_SHARED_MEMORY = True
+except ImportError:
+    HAS_SHARED_MEMORY = False
+
+# 缓存、数据库等持久化数据目录
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".document_converter")
+
 
 class TaskController:
     """任务控制器"""
@@ -104,6 +132,126 @@ class TaskController:
         return self.stop_flag
 
 
+class AtomicOutput:
+    """输出文件先写入同目录的 .partial 临时文件，commit() 时再原子改名为最终文件
+    
+    未 commit 就退出（转换失败、异常、终止）时删除临时文件，
+    最终路径上不会留下写了一半的文件。
+    """
+    
+    def __init__(self, path):
+        root, ext = os.path.splitext(path)
+        self.path = path
+        # 保留原扩展名，pix.save / PIL 等按扩展名判断格式
+        self.temp_path = f"{root}.partial{ext}"
+        self.committed = False
+    
+    def __enter__(self):
+        return self
+    
+    def commit(self):
+        os.replace(self.temp_path, self.path)
+        self.committed = True
+    
+    def discard(self):
+        """删除未提交的临时文件"""
+        if not self.committed and os.path.exists(self.temp_path):
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.discard()
+        return False
+
+
+class BatchJournal:
+    """批量任务断点续传日志
+    
+    每完成一项就向输出文件夹中的 JSON Lines 文件追加一行：输入文件指纹 + 输出文件的大小、SHA-1 和修改时间，
+    并立即 fsync。进程崩溃最多丢失正在写的最后一行，读取时忽略不完整的行。
+    续传时，输入未变化且所有输出文件校验一致的项目直接跳过，其余项目重新转换。
+    输出文件的大小和修改时间（纳秒）都与记录一致时视为未变化，不再读取内容；
+    只有修改时间变了才重新计算 SHA-1。verify=True 时总是逐个校验 SHA-1。
+    """
+    
+    def __init__(self, output_folder, operation, params=None, resume=False, verify=False):
+        self.path = os.path.join(output_folder, f".{operation}.journal.jsonl")
+        self.verify = verify
+        # 参数（DPI、格式等）不同的记录不能复用
+        self.params_key = hashlib.sha1(
+            json.dumps(params or {}, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()[:12]
+        self.completed = {}
+        
+        if resume and os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get('params') == self.params_key:
+                        self.completed[record['input']] = record
+        
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+    
+    @staticmethod
+    def _fingerprint(path):
+        st = os.stat(path)
+        return [st.st_size, int(st.st_mtime)]
+    
+    @staticmethod
+    def _checksum(path):
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        return h.hexdigest()
+    
+    @classmethod
+    def _output_entry(cls, path):
+        st = os.stat(path)
+        return [st.st_size, cls._checksum(path), st.st_mtime_ns]
+    
+    def is_completed(self, input_path):
+        record = self.completed.get(os.path.abspath(input_path))
+        if record is None:
+            return False
+        try:
+            if record['fingerprint'] != self._fingerprint(input_path):
+                return False
+            for out_path, saved in record['outputs'].items():
+                # 旧版日志只有 [大小, SHA-1]，没有修改时间，总是校验内容
+                size, checksum = saved[:2]
+                st = os.stat(out_path)
+                if st.st_size != size:
+                    return False
+                if not self.verify and saved[2:] == [st.st_mtime_ns]:
+                    continue
+                if self._checksum(out_path) != checksum:
+                    return False
+        except OSError:
+            return False
+        return True
+    
+    def record(self, input_path, output_paths):
+        record = {
+            'input': os.path.abspath(input_path),
+            'fingerprint': self._fingerprint(input_path),
+            'params': self.params_key,
+            'outputs': {os.path.abspath(p): self._output_entry(p) for p in output_paths},
+            'time': time.time(),
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+    
+    def close(self):
+        self._file.close()
+
+
 class BrowserDriverManager:
     """浏览器驱动管理器 - 支持离线使用"""
     
@@ -208,1059 +356,6344 @@ class BrowserDriverManager:
 """
 
 
-class DocumentConverter:
-    """文档转换核心类"""
+class ImageContainerWriter:
+    """PDF转图片的容器输出：多页 TIFF / ZIP / CBZ / 纯图片 PDF
     
-    def __init__(self, log_callback=None, progress_callback=None):
-        self.log = log_callback or print
-        self.progress = progress_callback or (lambda x, y: None)
-        self.controller = TaskController()
-        self.driver_manager = BrowserDriverManager(self.log)
-        self._check_available_tools()
+    每渲染一页就追加写入一页，内存占用与总页数无关，
+    也避免了逐页生成大量小文件带来的文件系统开销。
+    """
     
-    def _check_available_tools(self):
-        """检查可用工具"""
-        self.tools = {
-            'ms_word': False,
-            'ms_excel': False,
-            'wps': False,
-            'libreoffice': False,
-            'chrome': None,
-            'edge': None,
-        }
+    EXTENSIONS = {'tiff': '.tiff', 'zip': '.zip', 'cbz': '.cbz', 'pdf': '.pdf'}
+    
+    def __init__(self, path, mode, encode_image, img_format='png', dpi=150, tiff_compression='tiff_lzw'):
+        self.path = path
+        self.mode = mode
+        self.encode_image = encode_image      # (PIL图片, 文件对象) -> 按输出格式编码
+        self.img_format = img_format.lower()
+        self.dpi = dpi
+        self.tiff_compression = tiff_compression
+        self.page_count = 0
         
-        if HAS_WIN32COM:
-            try:
-                word = win32com.client.Dispatch("Word.Application")
-                word.Quit()
-                self.tools['ms_word'] = True
-                self.log("✅ 检测到 Microsoft Word")
-            except:
-                pass
-            
-            try:
-                excel = win32com.client.Dispatch("Excel.Application")
-                excel.Quit()
-                self.tools['ms_excel'] = True
-                self.log("✅ 检测到 Microsoft Excel")
-            except:
-                pass
-            
-            try:
-                wps = win32com.client.Dispatch("KWPS.Application")
-                wps.Quit()
-                self.tools['wps'] = True
-                self.log("✅ 检测到 WPS Office")
-            except:
-                try:
-                    wps = win32com.client.Dispatch("KET.Application")
-                    wps.Quit()
-                    self.tools['wps'] = True
-                except:
-                    pass
+        if mode == 'tiff':
+            self._tiff = TiffImagePlugin.AppendingTiffWriter(path, new=True)
+        elif mode in ['zip', 'cbz']:
+            # 图片本身已压缩，ZIP 内只存储不再压缩
+            self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        elif mode == 'pdf':
+            self._pdf = ImagePdfWriter(path)
+        else:
+            raise ValueError(f"不支持的容器格式: {mode}")
+    
+    def add_page(self, img, name, page_rect=None):
+        """追加一页，name 为 ZIP 内文件名，page_rect 为 PDF 页面尺寸（磅）"""
+        if self.mode == 'tiff':
+            compression = self.tiff_compression
+            if img.mode == '1' and compression != 'tiff_lzw':
+                compression = 'group4'
+            elif img.mode != '1' and compression == 'group4':
+                compression = 'tiff_lzw'
+            img.save(self._tiff, 'TIFF', compression=compression, dpi=(self.dpi, self.dpi))
+            self._tiff.newFrame()
+        elif self.mode in ['zip', 'cbz']:
+            buf = BytesIO()
+            self.encode_image(img, buf)
+            self._zip.writestr(name, buf.getvalue())
+        else:
+            if page_rect is None:
+                page_rect = fitz.Rect(0, 0, img.width * 72 / self.dpi, img.height * 72 / self.dpi)
+            jpeg_data = None
+            if self.img_format in ['jpg', 'jpeg'] and img.mode != '1':
+                buf = BytesIO()
+                self.encode_image(img, buf)
+                jpeg_data = buf.getvalue()
+            self._pdf.add_image_page(img, page_rect.width, page_rect.height, jpeg_data)
+        self.page_count += 1
+    
+    def close(self):
+        if self.mode == 'tiff':
+            self._tiff.close()
+        elif self.mode in ['zip', 'cbz']:
+            self._zip.close()
+        else:
+            self._pdf.close()
+
+
+class ImagePdfWriter:
+    """流式写入纯图片 PDF：每页的图片/内容/页面对象立即写盘，最后补写页树和交叉引用表"""
+    
+    def __init__(self, path):
+        self.f = open(path, 'wb')
+        self.f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        # 1 号对象为 Catalog，2 号对象为 Pages，均在 close() 时写入
+        self.offsets = [None, None]
+        self.page_ids = []
+    
+    def _write_object(self, body, stream=None):
+        self.offsets.append(self.f.tell())
+        obj_id = len(self.offsets)
+        self._write_object_at(obj_id, body, stream)
+        return obj_id
+    
+    def _write_object_at(self, obj_id, body, stream=None):
+        self.f.write(f"{obj_id} 0 obj\n".encode('ascii'))
+        if stream is None:
+            self.f.write(body.encode('ascii'))
+        else:
+            self.f.write(body.encode('ascii') + b"\nstream\n")
+            self.f.write(stream)
+            self.f.write(b"\nendstream")
+        self.f.write(b"\nendobj\n")
+    
+    def add_image_page(self, img, page_w, page_h, jpeg_data=None):
+        """提供 jpeg_data 时直接以 DCTDecode 嵌入，否则以 FlateDecode 存储原始像素"""
+        if img.mode not in ['1', 'L', 'RGB']:
+            img = img.convert('RGB')
+        colorspace = '/DeviceRGB' if img.mode == 'RGB' else '/DeviceGray'
+        bpc = 1 if img.mode == '1' else 8
         
-        libreoffice_paths = [
-            r"C:\Program Files\LibreOffice\program\soffice.exe",
-            r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
-        ]
-        for path in libreoffice_paths:
-            if os.path.exists(path):
-                self.tools['libreoffice'] = path
-                self.log("✅ 检测到 LibreOffice")
-                break
+        if jpeg_data:
+            filter_name = '/DCTDecode'
+            data = jpeg_data
+        else:
+            filter_name = '/FlateDecode'
+            data = zlib.compress(img.tobytes(), 6)
         
-        edge_paths = [
-            r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe",
-            r"C:\Program Files\Microsoft\Edge\Application\msedge.exe",
-        ]
-        for path in edge_paths:
-            if os.path.exists(path):
-                self.tools['edge'] = path
-                self.log("✅ 检测到 Edge 浏览器")
-                break
+        self.add_encoded_page({
+            'width': img.width, 'height': img.height, 'colorspace': colorspace, 'bpc': bpc,
+            'filter': filter_name, 'data': data,
+        }, page_w, page_h)
+    
+    def add_encoded_page(self, encoded, page_w, page_h, placement=None):
+        """写入已编码的图片（AdaptiveImageEncoder.encode 的结果）作为一页，placement 为 (x, y, 宽, 高)，默认铺满"""
+        data = encoded['data']
+        parms = f" /DecodeParms {encoded['decode_parms']}" if encoded.get('decode_parms') else ""
+        image_id = self._write_object(
+            f"<< /Type /XObject /Subtype /Image /Width {encoded['width']} /Height {encoded['height']} "
+            f"/ColorSpace {encoded['colorspace']} /BitsPerComponent {encoded['bpc']} "
+            f"/Filter {encoded['filter']}{parms} /Length {len(data)} >>", data)
+        x, y, w, h = placement or (0, 0, page_w, page_h)
+        content = f"q {w:.2f} 0 0 {h:.2f} {x:.2f} {y:.2f} cm /Im0 Do Q".encode('ascii')
+        content_id = self._write_object(f"<< /Length {len(content)} >>", content)
+        page_id = self._write_object(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_w:.2f} {page_h:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>")
+        self.page_ids.append(page_id)
+    
+    def close(self):
+        kids = ' '.join(f"{pid} 0 R" for pid in self.page_ids)
+        self.offsets[1] = self.f.tell()
+        self._write_object_at(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>")
+        self.offsets[0] = self.f.tell()
+        self._write_object_at(1, "<< /Type /Catalog /Pages 2 0 R >>")
         
-        chrome_paths = [
-            r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-            r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-            os.path.expandvars(r"%LOCALAPPDATA%\Google\Chrome\Application\chrome.exe"),
-        ]
-        for path in chrome_paths:
-            if os.path.exists(path):
-                self.tools['chrome'] = path
-                self.log("✅ 检测到 Chrome 浏览器")
-                break
+        xref_pos = self.f.tell()
+        self.f.write(f"xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n".encode('ascii'))
+        for offset in self.offsets:
+            self.f.write(f"{offset:010d} 00000 n \n".encode('ascii'))
+        self.f.write(f"trailer\n<< /Size {len(self.offsets) + 1} /Root 1 0 R >>\n"
+                     f"startxref\n{xref_pos}\n%%EOF\n".encode('ascii'))
+        self.f.close()
+
+
+class CsvTablePdfWriter(ImagePdfWriter):
+    """流式把 CSV 行排版成带表头的分页表格 PDF：每满一页立即写盘，内存占用与行数无关
+    
+    字体使用阅读器内置的 STSong-Light（Adobe-GB1，不嵌入字形），中英文均可显示；
+    列宽按样本行估算（ASCII 记半个字宽，其余记一个字宽），放不下的单元格截断并以 … 结尾；
+    列总宽超过页宽时把列分成若干组，同一批行按组依次输出多页
+    """
+    
+    PAGE_SIZE = (841.89, 595.28)  # A4 横向
+    MARGIN = 28
+    CELL_PAD = 3
+    MIN_COLUMN_EM = 4
+    MAX_COLUMN_EM = 40
+    # UniGB-UCS2-H 每个字符固定 2 字节，BMP 以外的字符（emoji 等）编码为代理对会错位，替换为 U+FFFD
+    NON_BMP = re.compile('[\U00010000-\U0010ffff]')
+    
+    def __init__(self, path, header, sample_rows, font_size=8):
+        super().__init__(path)
+        self.font_size = font_size
+        self.row_height = font_size * 1.6
+        self.page_w, self.page_h = self.PAGE_SIZE
+        self.rows_per_page = max(1, int((self.page_h - 2 * self.MARGIN) / self.row_height) - 1)
+        self.row_count = 0
+        self._rows = []
         
-        if self.driver_manager.get_edge_driver():
-            self.log("✅ Edge驱动已就绪")
-        elif self.tools['edge']:
-            self.log("⚠️ 未找到Edge驱动，网页转换需要下载驱动")
+        descriptor_id = self._write_object(
+            "<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6 "
+            "/FontBBox [-25 -254 1000 880] /ItalicAngle 0 /Ascent 880 /Descent -120 "
+            "/CapHeight 880 /StemV 93 >>")
+        cid_font_id = self._write_object(
+            "<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light "
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 4 >> "
+            f"/FontDescriptor {descriptor_id} 0 R /DW 1000 /W [1 95 500 814 939 500] >>")
+        self.font_id = self._write_object(
+            "<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light-UniGB-UCS2-H "
+            f"/Encoding /UniGB-UCS2-H /DescendantFonts [{cid_font_id} 0 R] >>")
         
-        if self.driver_manager.get_chrome_driver():
-            self.log("✅ Chrome驱动已就绪")
-        elif self.tools['chrome']:
-            self.log("⚠️ 未找到Chrome驱动")
+        self.header = [self._clean(cell) for cell in header]
+        self.column_count = max([len(self.header)] + [len(row) for row in sample_rows])
+        self.header += [''] * (self.column_count - len(self.header))
+        self.widths = self._measure_columns(sample_rows)
+        self.groups = self._group_columns()
+        self._max_em = [(w - 2 * self.CELL_PAD) / font_size for w in self.widths]
     
-    def get_controller(self):
-        return self.controller
+    @classmethod
+    def _clean(cls, text):
+        if not text.isprintable():
+            text = ''.join(ch if ch.isprintable() else ' ' for ch in text)
+        if not text.isascii():
+            text = cls.NON_BMP.sub('\ufffd', text)
+        return text
     
-    def get_driver_instructions(self):
-        return self.driver_manager.download_driver_instructions()
+    @staticmethod
+    def _text_em(text):
+        """以字宽（em）估算文本宽度"""
+        if text.isascii():
+            return len(text) * 0.5
+        return sum(0.5 if ' ' <= ch <= '~' else 1.0 for ch in text)
     
-    # ==================== 批量文档转PDF ====================
-    def documents_to_pdf(self, doc_paths, output_folder):
-        """批量文档转PDF"""
-        try:
-            self.controller.is_running = True
-            total = len(doc_paths)
-            success_count = 0
-            
-            self.log(f"🔄 批量转换 {total} 个文档...")
-            os.makedirs(output_folder, exist_ok=True)
-            
-            for i, doc_path in enumerate(doc_paths):
-                if not self.controller.check_pause():
+    def _measure_columns(self, sample_rows):
+        """取样本行各列宽度的 90 分位与表头宽度中的较大者，换算为磅"""
+        widths = []
+        for col in range(self.column_count):
+            values = sorted(self._text_em(row[col]) for row in sample_rows if col < len(row))
+            typical = values[int(len(values) * 0.9)] if values else 0
+            em = max(self._text_em(self.header[col]), typical, self.MIN_COLUMN_EM)
+            widths.append(min(em, self.MAX_COLUMN_EM) * self.font_size + 2 * self.CELL_PAD)
+        return widths
+    
+    def _group_columns(self):
+        available = self.page_w - 2 * self.MARGIN
+        groups, current, used = [], [], 0
+        for col, width in enumerate(self.widths):
+            if current and used + width > available:
+                groups.append(current)
+                current, used = [], 0
+            current.append(col)
+            used += width
+        groups.append(current)
+        return groups
+    
+    def _fit(self, text, max_em):
+        """清理控制字符、截断到列宽以内并编码为 UTF-16BE 十六进制串"""
+        text = self._clean(text)
+        if self._text_em(text) > max_em:
+            used, end = 1.0, 0
+            for end, ch in enumerate(text):
+                used += 0.5 if ' ' <= ch <= '~' else 1.0
+                if used > max_em:
                     break
-                
-                self.progress(i + 1, total)
-                base_name = Path(doc_path).stem
-                output_path = os.path.join(output_folder, f"{base_name}.pdf")
-                
-                if self.document_to_pdf(doc_path, output_path):
-                    success_count += 1
-            
-            self.log(f"✅ 完成！成功 {success_count}/{total}")
-            return success_count > 0
-            
-        except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
+            text = text[:end] + '…'
+        return text.encode('utf-16-be', 'replace').hex()
+    
+    def add_row(self, row):
+        self._rows.append(row)
+        self.row_count += 1
+        if len(self._rows) >= self.rows_per_page:
+            self._flush_page()
+    
+    def _flush_page(self):
+        for group in self.groups:
+            self._write_table_page(group, self._rows)
+        self._rows = []
+    
+    def _write_table_page(self, columns, rows):
+        fs, rh, pad = self.font_size, self.row_height, self.CELL_PAD
+        left = self.MARGIN
+        top = self.page_h - self.MARGIN
+        xs = [left]
+        for col in columns:
+            xs.append(xs[-1] + self.widths[col])
+        right = xs[-1]
+        bottom = top - rh * (len(rows) + 1)
+        baseline = (rh - fs) / 2 + fs * 0.12
+        
+        parts = [f"0.9 g {left:.2f} {top - rh:.2f} {right - left:.2f} {rh:.2f} re f 0 g"]
+        parts.append("0.6 G 0.4 w")
+        for i in range(len(rows) + 2):
+            y = top - rh * i
+            parts.append(f"{left:.2f} {y:.2f} m {right:.2f} {y:.2f} l")
+        for x in xs:
+            parts.append(f"{x:.2f} {top:.2f} m {x:.2f} {bottom:.2f} l")
+        parts.append(f"S BT /F1 {fs} Tf")
+        
+        cells = [(col, f"{x + pad:.2f}", self._max_em[col]) for col, x in zip(columns, xs)]
+        for i, row in enumerate([self.header] + rows):
+            y = f"{top - rh * (i + 1) + baseline:.2f}"
+            count = len(row)
+            for col, x, max_em in cells:
+                if col < count and row[col]:
+                    parts.append(f"1 0 0 1 {x} {y} Tm <{self._fit(row[col], max_em)}> Tj")
+        parts.append("ET")
+        
+        content = zlib.compress('\n'.join(parts).encode('ascii'), 1)
+        content_id = self._write_object(
+            f"<< /Length {len(content)} /Filter /FlateDecode >>", content)
+        page_id = self._write_object(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.page_w:.2f} {self.page_h:.2f}] "
+            f"/Resources << /Font << /F1 {self.font_id} 0 R >> >> /Contents {content_id} 0 R >>")
+        self.page_ids.append(page_id)
+    
+    def close(self):
+        if self._rows or not self.page_ids:
+            self._flush_page()
+        super().close()
+
+
+class AdaptiveImageEncoder:
+    """按图片内容选择 PDF 图像编码
+    
+    - photo 照片：DCTDecode（JPEG）；原文件已是 JPEG 且无需缩放时直接嵌入原始数据，不重新编码
+    - lineart 线稿 / 文字 / 截图：FlateDecode + PNG 预测器，无损，文字边缘不会出现振铃
+    - bilevel 黑白：CCITTFaxDecode G4（Pillow 未带 libtiff 时改用 1 位 Flate）
+    - flat 纯色（非照片，灰度不超过 16 级或彩色不超过 256 色）：Indexed 调色板 + Flate，颜色少时按 1 / 2 / 4 位存储
+    Flate 数据直接取自 Pillow 编码的 PNG 的 IDAT，与 PDF 的 PNG 预测器格式一致。
+    分类只在图片中心不超过 SAMPLE×SAMPLE 的区域上做几次 C 层运算，不逐像素遍历；
+    是否黑白则看整张图片的点采样缩略图，中心以外的照片区域也不会被二值化。
+    """
+    
+    CLASSES = ['photo', 'lineart', 'bilevel', 'flat']
+    SAMPLE = 1024
+    # 亮度 < 48 或 > 207 视为“纸 / 墨”，其余为中间调
+    DARK, LIGHT = 48, 208
+    # 黑白判断：整张图片点采样到不超过 OVERVIEW 边长，再分成 GRID×GRID 个区块；
+    # 中间调过半的区块（照片、灰度图）超过 TONAL_BLOCKS 个时不按黑白处理
+    OVERVIEW = 512
+    GRID = 16
+    TONAL_BLOCKS = 2
+    
+    def __init__(self, jpeg_quality=85):
+        self.jpeg_quality = jpeg_quality
+        self.has_g4 = features.check('libtiff')
+    
+    def _sample(self, img):
+        w, h = img.size
+        if w <= self.SAMPLE and h <= self.SAMPLE:
+            return img
+        left, top = max(0, (w - self.SAMPLE) // 2), max(0, (h - self.SAMPLE) // 2)
+        return img.crop((left, top, left + min(w, self.SAMPLE), top + min(h, self.SAMPLE)))
+    
+    def _overview(self, img):
+        """整张图片的最近邻缩略图：保留原始像素值（不像 BOX 缩小那样把细笔画平均成中间调）"""
+        w, h = img.size
+        scale = max(w, h) / self.OVERVIEW
+        if scale <= 1:
+            return img
+        return img.resize((max(1, round(w / scale)), max(1, round(h / scale))), Image.Resampling.NEAREST)
+    
+    def _is_bilevel_scan(self, lum):
+        """黑白扫描页：纸 / 墨像素至少 95%，且没有成片的中间调区域"""
+        hist = lum.histogram()
+        extremes = (sum(hist[:self.DARK]) + sum(hist[self.LIGHT:])) / max(1, sum(hist))
+        if extremes < 0.95:
             return False
-        finally:
-            self.controller.is_running = False
+        mid = lum.point([255 if self.DARK <= v < self.LIGHT else 0 for v in range(256)])
+        blocks = mid.resize((self.GRID, self.GRID), Image.Resampling.BOX)
+        return sum(blocks.histogram()[128:]) <= self.TONAL_BLOCKS
     
-    def document_to_pdf(self, doc_path, output_path):
-        """单个文档转PDF"""
+    @staticmethod
+    def _is_gray(sample, tolerance=8):
+        """RGB 图片的各通道差异都很小时按灰度处理"""
+        small = sample.copy()
+        small.thumbnail((256, 256))
+        r, g, b = small.split()
+        spread = ImageChops.lighter(ImageChops.difference(r, g), ImageChops.difference(g, b))
+        hist = spread.histogram()
+        return sum(hist[:tolerance + 1]) >= 0.995 * sum(hist)
+    
+    def classify(self, img):
+        """返回 (类别, 是否灰度)；img 为 '1' / 'L' / 'RGB' 模式
+        
+        先判断连续色调：颜色数少不代表适合无损（R=G=B 的灰度照片最多 256 种颜色，Flate 远大于 JPEG），
+        只有不是照片的图片才按颜色数归为 flat：灰度不超过 16 级，彩色不超过 256 色。
+        """
+        if img.mode == '1':
+            return 'bilevel', True
+        sample = self._sample(img)
+        gray = img.mode == 'L' or self._is_gray(sample)
+        lum = sample if sample.mode == 'L' else sample.convert('L')
+        
+        # 各通道相同的 RGB 按灰度统计颜色数
+        levels = (img if img.mode == 'L' else img.convert('L')) if gray else img
+        colors = levels.getcolors(16)
+        if gray and colors is not None and {c for _, c in colors} <= {0, 255}:
+            return 'bilevel', True
+        
+        if gray:
+            # 扫描的黑白文字页：只有少量抗锯齿 / 噪点的中间调；在整张图片上判断
+            overview = self._overview(img)
+            if self._is_bilevel_scan(overview if overview.mode == 'L' else overview.convert('L')):
+                return 'bilevel', True
+        
+        # 相邻像素完全相同的比例：截图、线稿接近 1，照片和带噪点的扫描件很低（无损压缩效果差）
+        w, h = lum.size
+        flatness = 0.0
+        if w > 1:
+            diff = ImageChops.difference(lum.crop((1, 0, w, h)), lum.crop((0, 0, w - 1, h)))
+            flatness = diff.histogram()[0] / ((w - 1) * h)
+        if flatness < 0.5:
+            return 'photo', gray
+        if colors is None and not gray:
+            colors = img.getcolors(256)
+        if colors is not None:
+            return 'flat', gray
+        return 'lineart', gray
+    
+    @staticmethod
+    def _png_parts(png):
+        """解析 PNG：返回 (位深, 颜色类型, 调色板, 合并后的 IDAT 数据)"""
+        pos = 8
+        bits = color_type = None
+        palette = b''
+        idat = []
+        while pos < len(png):
+            length = int.from_bytes(png[pos:pos + 4], 'big')
+            kind = png[pos + 4:pos + 8]
+            body = png[pos + 8:pos + 8 + length]
+            if kind == b'IHDR':
+                bits, color_type = body[8], body[9]
+            elif kind == b'PLTE':
+                palette = body
+            elif kind == b'IDAT':
+                idat.append(body)
+            elif kind == b'IEND':
+                break
+            pos += length + 12
+        return bits, color_type, palette, b''.join(idat)
+    
+    def _flate(self, img):
+        out = BytesIO()
+        img.save(out, 'PNG', compress_level=6)
+        bits, color_type, palette, data = self._png_parts(out.getvalue())
+        colors = {0: 1, 2: 3, 3: 1}[color_type]
+        if color_type == 3:
+            count = len(palette) // 3
+            colorspace = f"[/Indexed /DeviceRGB {count - 1} <{palette.hex()}>]"
+        else:
+            colorspace = '/DeviceRGB' if color_type == 2 else '/DeviceGray'
+        return {
+            'width': img.width, 'height': img.height, 'colorspace': colorspace, 'bpc': bits,
+            'filter': '/FlateDecode', 'data': data,
+            'decode_parms': f"<< /Predictor 15 /Colors {colors} /BitsPerComponent {bits} /Columns {img.width} >>",
+        }
+    
+    def _g4(self, img):
+        out = BytesIO()
+        # 单条带存储，CCITT 数据即整页
+        img.save(out, 'TIFF', compression='group4', tiffinfo={278: img.height})
+        tiff = Image.open(BytesIO(out.getvalue()))
+        offsets, counts = tiff.tag_v2[273], tiff.tag_v2[279]
+        if len(offsets) != 1:
+            return self._flate(img)
+        data = out.getvalue()[offsets[0]:offsets[0] + counts[0]]
+        return {
+            'width': img.width, 'height': img.height, 'colorspace': '/DeviceGray', 'bpc': 1,
+            'filter': '/CCITTFaxDecode', 'data': data,
+            # Pillow 的 '1' 模式为 BlackIsZero，libtiff 按位值编码
+            'decode_parms': f"<< /K -1 /Columns {img.width} /Rows {img.height} /BlackIs1 true >>",
+        }
+    
+    def encode(self, img, kind, gray, source=None):
+        """按类别编码；source 为原始文件内容，照片类且尺寸未变时直接嵌入原 JPEG"""
+        if kind == 'bilevel':
+            if img.mode != '1':
+                img = img.convert('L').point(lambda v: 255 if v >= 128 else 0, '1')
+            return self._g4(img) if self.has_g4 else self._flate(img)
+        
+        if gray and img.mode != 'L':
+            img = img.convert('L')
+        if kind == 'flat':
+            if img.mode == 'RGB':
+                colors = img.getcolors(256)
+                img = img.convert('P', palette=Image.Palette.ADAPTIVE, colors=len(colors) if colors else 256)
+            return self._flate(img)
+        if kind == 'lineart':
+            return self._flate(img)
+        
+        if source and source[:3] == b'\xff\xd8\xff':
+            with Image.open(BytesIO(source)) as original:
+                if original.size == img.size and original.mode == img.mode:
+                    return {
+                        'width': img.width, 'height': img.height, 'bpc': 8, 'filter': '/DCTDecode', 'data': source,
+                        'colorspace': '/DeviceRGB' if img.mode == 'RGB' else '/DeviceGray',
+                    }
+        out = BytesIO()
+        img.save(out, 'JPEG', quality=self.jpeg_quality, optimize=False)
+        return {
+            'width': img.width, 'height': img.height, 'bpc': 8, 'filter': '/DCTDecode', 'data': out.getvalue(),
+            'colorspace': '/DeviceRGB' if img.mode == 'RGB' else '/DeviceGray',
+        }
+
+
+class StreamingPptxWriter:
+    """流式写入图片幻灯片 PPTX：每加一页就把幻灯片 XML 和图片写进 ZIP，内存占用与页数无关
+    
+    母版、版式、主题等固定部件取自 python-pptx 的默认模板（与 Presentation() 生成的完全相同），
+    presentation.xml、其关系文件和 [Content_Types].xml 需要列出全部幻灯片，在 close() 时最后写入。
+    内容完全相同的图片（按 SHA-1）只写入一个图片部件，由多页幻灯片共同引用。
+    """
+    
+    NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    CT_SLIDE = 'application/vnd.openxmlformats-officedocument.presentationml.slide+xml'
+    IMAGE_TYPES = {'png': 'image/png', 'jpeg': 'image/jpeg', 'gif': 'image/gif',
+                   'bmp': 'image/bmp', 'tiff': 'image/tiff'}
+    # PIL 格式名 → 可直接嵌入的图片扩展名，其余格式需要先转码
+    IMAGE_FORMATS = {'PNG': 'png', 'JPEG': 'jpeg', 'GIF': 'gif', 'BMP': 'bmp', 'TIFF': 'tiff'}
+    
+    SLIDE_XML = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<p:sld xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+        'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main">'
+        '<p:cSld><p:spTree><p:nvGrpSpPr><p:cNvPr id="1" name=""/><p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr>'
+        '<p:grpSpPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="0" cy="0"/>'
+        '<a:chOff x="0" y="0"/><a:chExt cx="0" cy="0"/></a:xfrm></p:grpSpPr>'
+        '<p:pic><p:nvPicPr><p:cNvPr id="2" name="Picture 1"/>'
+        '<p:cNvPicPr><a:picLocks noChangeAspect="1"/></p:cNvPicPr><p:nvPr/></p:nvPicPr>'
+        '<p:blipFill><a:blip r:embed="rId2"/><a:stretch><a:fillRect/></a:stretch></p:blipFill>'
+        '<p:spPr><a:xfrm><a:off x="{left}" y="{top}"/><a:ext cx="{width}" cy="{height}"/></a:xfrm>'
+        '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></p:spPr></p:pic>'
+        '</p:spTree></p:cSld><p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sld>'
+    )
+    
+    SLIDE_RELS = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="{ns}/slideLayout" Target="../slideLayouts/{layout}"/>'
+        '<Relationship Id="rId2" Type="{ns}/image" Target="../media/{media}"/>'
+        '</Relationships>'
+    )
+    
+    def __init__(self, path, slide_width, slide_height):
+        self.path = path
+        self.slide_width = int(slide_width)
+        self.slide_height = int(slide_height)
+        self.slide_count = 0
+        self.media_count = 0
+        self.media_exts = set()
+        self.shared_count = 0
+        self._media_by_hash = {}
+        
+        prs = Presentation()
+        prs.slide_width = Emu(self.slide_width)
+        prs.slide_height = Emu(self.slide_height)
+        # 使用"空白"版式（slide_layouts[6]）
+        self.layout = os.path.basename(prs.slide_layouts[6].part.partname)
+        buf = BytesIO()
+        prs.save(buf)
+        
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+        self._deferred = {}
+        with zipfile.ZipFile(buf) as template:
+            for name in template.namelist():
+                data = template.read(name)
+                if name in ['[Content_Types].xml', 'ppt/presentation.xml', 'ppt/_rels/presentation.xml.rels']:
+                    self._deferred[name] = data.decode('utf-8')
+                else:
+                    self._zip.writestr(name, data)
+    
+    def add_picture_slide(self, image_data, ext, left, top, width, height, digest=None):
+        """追加一页只含一张图片的幻灯片，位置和尺寸单位为 EMU，ext 为 png / jpeg 等
+        
+        digest 为图片数据的 SHA-1（不传则自动计算）；与已写入的图片相同时直接共用
+        """
+        if digest is None:
+            digest = hashlib.sha1(image_data).hexdigest()
+        media = self._media_by_hash.get(digest)
+        if media is None:
+            self.media_count += 1
+            media = f"image{self.media_count}.{ext}"
+            # 图片本身已压缩，只存储不再压缩
+            self._zip.writestr(f"ppt/media/{media}", image_data, zipfile.ZIP_STORED)
+            self.media_exts.add(ext)
+            self._media_by_hash[digest] = media
+        else:
+            self.shared_count += 1
+        
+        self.slide_count += 1
+        n = self.slide_count
+        self._zip.writestr(f"ppt/slides/slide{n}.xml", self.SLIDE_XML.format(
+            left=int(left), top=int(top), width=int(width), height=int(height)))
+        self._zip.writestr(f"ppt/slides/_rels/slide{n}.xml.rels", self.SLIDE_RELS.format(
+            ns=self.NS_REL, layout=self.layout, media=media))
+    
+    def close(self):
+        presentation = self._deferred['ppt/presentation.xml']
+        rels = self._deferred['ppt/_rels/presentation.xml.rels']
+        types = self._deferred['[Content_Types].xml']
+        
+        # 新关系 ID 接在模板已有的 rId 之后
+        first_rid = max(int(x) for x in re.findall(r'Id="rId(\d+)"', rels)) + 1
+        slide_ids = ''.join(f'<p:sldId id="{256 + i}" r:id="rId{first_rid + i}"/>'
+                            for i in range(self.slide_count))
+        presentation = presentation.replace('</p:sldMasterIdLst>',
+                                            f'</p:sldMasterIdLst><p:sldIdLst>{slide_ids}</p:sldIdLst>', 1)
+        slide_rels = ''.join(f'<Relationship Id="rId{first_rid + i}" Type="{self.NS_REL}/slide" '
+                             f'Target="slides/slide{i + 1}.xml"/>' for i in range(self.slide_count))
+        rels = rels.replace('</Relationships>', slide_rels + '</Relationships>')
+        
+        entries = []
+        for ext in sorted(self.media_exts):
+            if f'Extension="{ext}"' not in types:
+                entries.append(f'<Default Extension="{ext}" ContentType="{self.IMAGE_TYPES[ext]}"/>')
+        entries.extend(f'<Override PartName="/ppt/slides/slide{i + 1}.xml" ContentType="{self.CT_SLIDE}"/>'
+                       for i in range(self.slide_count))
+        types = types.replace('</Types>', ''.join(entries) + '</Types>')
+        
+        self._zip.writestr('ppt/presentation.xml', presentation)
+        self._zip.writestr('ppt/_rels/presentation.xml.rels', rels)
+        self._zip.writestr('[Content_Types].xml', types)
+        self._zip.close()
+
+
+# ==================== 预检 ====================
+class PreflightProbe:
+    """批量转换前的快速预检：按文件头识别真实格式，读取页数/尺寸/加密状态，估算处理成本
+    
+    只读文件头和目录结构，不解码图片、不渲染页面；损坏、加密或格式不符的文件提前标出，
+    不必等到转换中途失败（例如 LibreOffice 在损坏的 .docx 上耗满 120 秒超时）。
+    成本为按 dpi 估算的总像素数（各页像素之和），供调度和进度估计使用；
+    max_width/max_height 为最大一页的尺寸，用于估算渲染的峰值内存。
+    """
+    
+    # 预期格式：扩展名 → 文件头识别出的格式
+    EXT_KINDS = {
+        '.pdf': 'pdf', '.docx': 'docx', '.xlsx': 'xlsx', '.pptx': 'pptx',
+        '.doc': 'ole', '.xls': 'ole', '.wps': 'ole', '.et': 'ole', '.ppt': 'ole',
+        '.odt': 'odf', '.ods': 'odf', '.rtf': 'rtf', '.csv': 'text', '.txt': 'text',
+        '.png': 'image', '.jpg': 'image', '.jpeg': 'image', '.bmp': 'image', '.gif': 'image',
+        '.tiff': 'image', '.tif': 'image', '.webp': 'image',
+    }
+    # 各类批量操作可接受的格式
+    ACCEPTS = {
+        'document': {'docx', 'odf', 'ole', 'rtf', 'html', 'text'},
+        'spreadsheet': {'xlsx', 'odf', 'ole', 'html', 'text'},
+        'pdf': {'pdf'},
+        'image': {'image'},
+    }
+    # 无法读出页数的文档按大小估计页数
+    BYTES_PER_PAGE = {'ole': 30 * 1024, 'rtf': 30 * 1024, 'html': 20 * 1024, 'text': 2400,
+                      'docx': 20 * 1024, 'xlsx': 20 * 1024, 'pptx': 200 * 1024, 'odf': 20 * 1024}
+    A4_POINTS = (595, 842)
+    MAX_SCANNED_PAGES = 10000
+    # PDF 不少于此数量且有多个 CPU 时改用进程池预检，进程启动的开销才划算
+    PROCESS_MIN_PDFS = 16
+    
+    _fitz_lock = threading.Lock()
+    
+    def __init__(self, dpi=150, workers=4):
+        self.dpi = dpi
+        self.workers = workers
+    
+    @staticmethod
+    def sniff(head):
+        """根据文件头字节判断格式"""
+        if head.startswith(b'%PDF') or b'%PDF-' in head[:1024]:
+            return 'pdf'
+        if head.startswith((b'\x89PNG', b'\xff\xd8\xff', b'GIF87a', b'GIF89a', b'BM',
+                            b'II*\x00', b'MM\x00*')) or (head[:4] == b'RIFF' and head[8:12] == b'WEBP'):
+            return 'image'
+        if head.startswith(b'PK\x03\x04'):
+            return 'zip'
+        if head.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+            return 'ole'
+        if head.startswith(b'{\\rtf'):
+            return 'rtf'
+        if not head or b'\x00' in head[:4096]:
+            return 'binary' if head else 'empty'
+        if head.lstrip(b'\xef\xbb\xbf \t\r\n')[:1] == b'<':
+            return 'html'
+        return 'text'
+    
+    def probe(self, path):
+        """预检单个文件，返回信息字典；error 非空表示文件无法转换"""
+        info = {'path': path, 'kind': None, 'size': 0, 'pages': 0, 'width': 0, 'height': 0,
+                'max_width': 0, 'max_height': 0, 'area': 0,
+                'mode': None, 'encrypted': False, 'error': None, 'warning': None, 'cost': 0}
         try:
-            self.log(f"🔄 转换文档: {os.path.basename(doc_path)}")
-            
-            doc_path = os.path.abspath(doc_path)
-            output_path = os.path.abspath(output_path)
-            
-            if self.tools['ms_word'] and HAS_WIN32COM:
-                return self._word_to_pdf_msword(doc_path, output_path)
-            
-            if self.tools['wps'] and HAS_WIN32COM:
-                return self._word_to_pdf_wps(doc_path, output_path)
-            
-            if self.tools['libreoffice']:
-                return self._doc_to_pdf_libreoffice(doc_path, output_path)
+            info['size'] = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                head = f.read(8192)
+            kind = self.sniff(head)
+            if kind == 'zip':
+                kind = self._probe_zip(path, info)
+            elif kind == 'pdf':
+                self._probe_pdf(path, info)
+            elif kind == 'image':
+                try:
+                    self._probe_image(path, info)
+                except Exception as e:
+                    info['error'] = f"图片已损坏: {e}"
+            elif kind == 'ole':
+                self._probe_ole(path, info)
+            elif kind == 'binary':
+                # 其他 Pillow 能识别的图片格式（ICO、PPM 等）
+                try:
+                    self._probe_image(path, info)
+                    kind = 'image'
+                except Exception:
+                    info['error'] = "无法识别的文件格式"
+            elif kind == 'empty':
+                info['error'] = "空文件"
+            info['kind'] = kind
             
-            self.log("❌ 未找到可用的转换工具")
-            return False
+            expected = self.EXT_KINDS.get(Path(path).suffix.lower())
+            if expected and expected != kind and not info['error'] and not info['warning']:
+                info['warning'] = f"扩展名与实际格式（{kind}）不符"
             
+            if not info['pages'] and kind in self.BYTES_PER_PAGE:
+                info['pages'] = max(1, info['size'] // self.BYTES_PER_PAGE[kind])
+            if not info['width'] and info['pages']:
+                info['width'], info['height'] = self.A4_POINTS
+            if not info['max_width']:
+                info['max_width'], info['max_height'] = info['width'], info['height']
+            if not info['area']:
+                info['area'] = info['pages'] * info['width'] * info['height']
+            if not info['error']:
+                scale = 1 if kind == 'image' else (self.dpi / 72) ** 2
+                info['cost'] = int(info['area'] * scale)
         except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
-            return False
+            info['error'] = f"无法读取: {e}"
+        return info
     
-    def _word_to_pdf_msword(self, doc_path, output_path):
-        try:
-            self.log("  使用 Microsoft Word 转换...")
-            
-            word = win32com.client.Dispatch("Word.Application")
-            word.Visible = False
-            word.DisplayAlerts = False
-            
+    def _probe_pdf(self, path, info):
+        # PyMuPDF 不支持多线程并发使用，同一进程内 PDF 的打开和检查串行进行；
+        # 大批量 PDF 由 probe_many 分给进程池，各进程有自己的锁，互不阻塞
+        with self._fitz_lock:
             try:
-                doc = word.Documents.Open(doc_path)
-                doc.SaveAs(output_path, FileFormat=17)
-                doc.Close()
-                self.log(f"✅ PDF保存成功: {output_path}")
-                return True
+                doc = fitz.open(path)
+            except Exception as e:
+                info['error'] = f"PDF 已损坏: {e}"
+                return
+            try:
+                if doc.needs_pass:
+                    info['encrypted'] = True
+                    info['error'] = "PDF 受密码保护"
+                    return
+                info['pages'] = doc.page_count
+                if not doc.page_count:
+                    info['error'] = "PDF 没有页面"
+                    return
+                rect = doc.load_page(0).rect
+                info['width'], info['height'] = rect.width, rect.height
+                # page_cropbox 只读页面字典，不加载页面内容；超长文档按前若干页外推
+                boxes = [doc.page_cropbox(i) for i in range(min(doc.page_count, self.MAX_SCANNED_PAGES))]
+                largest = max(boxes, key=lambda r: r.width * r.height)
+                info['max_width'], info['max_height'] = largest.width, largest.height
+                info['area'] = sum(r.width * r.height for r in boxes) * doc.page_count / len(boxes)
+            except Exception as e:
+                info['error'] = f"PDF 已损坏: {e}"
+                return
             finally:
-                word.Quit()
-                
-        except Exception as e:
-            self.log(f"  Word转换失败: {e}")
-            return False
+                doc.close()
+        
+        with open(path, 'rb') as f:
+            f.seek(max(0, info['size'] - 1024))
+            tail = f.read()
+        if b'%%EOF' not in tail:
+            info['warning'] = "PDF 文件不完整（可能被截断），已尝试修复"
     
-    def _word_to_pdf_wps(self, doc_path, output_path):
-        try:
-            self.log("  使用 WPS 转换...")
-            
-            try:
-                wps = win32com.client.Dispatch("KWPS.Application")
-            except:
-                wps = win32com.client.Dispatch("KET.Application")
-            
-            wps.Visible = False
-            
+    def _probe_image(self, path, info):
+        # Image.open 只解析文件头，不解码像素
+        with Image.open(path) as img:
+            info['width'], info['height'] = img.size
+            info['mode'] = img.mode
+            info['pages'] = getattr(img, 'n_frames', 1)
+            fmt = img.format
+        # 先只检查文件尾的结束标记；找不到时才真正解码确认：动态照片、追加了元数据的文件
+        # 结束标记之后还有数据，但图片本身完好
+        with open(path, 'rb') as f:
+            f.seek(max(0, info['size'] - 1024))
+            tail = f.read()
+        if (fmt == 'PNG' and b'IEND' not in tail) or (fmt == 'JPEG' and b'\xff\xd9' not in tail):
             try:
-                doc = wps.Documents.Open(doc_path)
-                doc.ExportAsFixedFormat(output_path, 17)
-                doc.Close()
-                self.log(f"✅ PDF保存成功: {output_path}")
-                return True
-            finally:
-                wps.Quit()
-                
-        except Exception as e:
-            self.log(f"  WPS转换失败: {e}")
-            return False
+                with Image.open(path) as img:
+                    img.load()
+            except Exception:
+                info['error'] = "图片文件不完整（可能被截断）"
+                return
+            info['warning'] = "图片结束标记之后有附加数据"
+        expected = Image.registered_extensions().get(Path(path).suffix.lower())
+        if expected and expected != fmt and not info['warning']:
+            info['warning'] = f"扩展名与实际格式（{fmt}）不符"
     
-    def _doc_to_pdf_libreoffice(self, doc_path, output_path):
+    def _probe_zip(self, path, info):
         try:
-            self.log("  使用 LibreOffice 转换...")
-            
-            soffice = self.tools['libreoffice']
-            output_dir = os.path.dirname(output_path)
-            
-            cmd = [soffice, '--headless', '--convert-to', 'pdf', '--outdir', output_dir, doc_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-            
-            expected_output = os.path.join(output_dir, Path(doc_path).stem + '.pdf')
-            
-            if os.path.exists(expected_output):
-                if expected_output != output_path:
-                    shutil.move(expected_output, output_path)
-                self.log(f"✅ PDF保存成功: {output_path}")
-                return True
+            with zipfile.ZipFile(path) as zf:
+                names = set(zf.namelist())
+                if 'word/document.xml' in names:
+                    kind, tag = 'docx', b'<Pages>'
+                elif 'xl/workbook.xml' in names:
+                    kind, tag = 'xlsx', b'<Pages>'
+                elif 'ppt/presentation.xml' in names:
+                    kind, tag = 'pptx', b'<Slides>'
+                elif 'mimetype' in names:
+                    return 'odf'
+                else:
+                    return 'zip'
+                # Office 保存时把页数/幻灯片数写在 docProps/app.xml 中
+                if 'docProps/app.xml' in names:
+                    match = re.search(re.escape(tag) + rb'(\d+)', zf.read('docProps/app.xml'))
+                    if match:
+                        info['pages'] = int(match.group(1))
+                return kind
+        except (zipfile.BadZipFile, OSError) as e:
+            info['error'] = f"文件已损坏（ZIP 结构无效）: {e}"
+            return 'zip'
+    
+    def _probe_ole(self, path, info):
+        """加密的 docx/xlsx 以 OLE 容器保存，目录中含 EncryptedPackage 流"""
+        marker = 'EncryptedPackage'.encode('utf-16-le')
+        with open(path, 'rb') as f:
+            if info['size'] <= 16 * 1024 * 1024:
+                data = f.read()
             else:
-                self.log(f"  转换失败: {result.stderr}")
-                return False
-                
-        except Exception as e:
-            self.log(f"  LibreOffice转换失败: {e}")
-            return False
+                data = f.read(1024 * 1024)
+                f.seek(-1024 * 1024, os.SEEK_END)
+                data += f.read()
+        if marker in data:
+            info['encrypted'] = True
+            info['error'] = "文档受密码保护"
     
-    # ==================== 批量表格转PDF ====================
-    def spreadsheets_to_pdf(self, file_paths, output_folder):
-        """批量表格转PDF"""
+    @staticmethod
+    def _probe_in_process(path, dpi):
+        """进程池中预检单个文件（静态方法，可被子进程序列化调用）"""
+        return PreflightProbe(dpi, workers=1).probe(path)
+    
+    def probe_many(self, paths):
+        """并行预检，结果与输入顺序一致
+        
+        PyMuPDF 在同一进程内只能串行使用，PDF 较多时交给进程池；其他格式只读文件头，仍用线程池
+        """
+        if len(paths) <= 1:
+            return [self.probe(p) for p in paths]
+        pdfs = [p for p in paths if Path(p).suffix.lower() == '.pdf']
+        processes = min(self.workers, os.cpu_count() or 1, len(pdfs))
+        if len(pdfs) < self.PROCESS_MIN_PDFS or processes <= 1:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(paths))) as pool:
+                return list(pool.map(self.probe, paths))
+        
+        others = [p for p in paths if Path(p).suffix.lower() != '.pdf']
+        results = {}
+        with ProcessPoolExecutor(max_workers=processes) as process_pool:
+            chunksize = max(1, len(pdfs) // (processes * 4))
+            pdf_results = process_pool.map(self._probe_in_process, pdfs, [self.dpi] * len(pdfs),
+                                           chunksize=chunksize)
+            if others:
+                with ThreadPoolExecutor(max_workers=min(self.workers, len(others))) as pool:
+                    results.update(zip(others, pool.map(self.probe, others)))
+            results.update(zip(pdfs, pdf_results))
+        return [results[p] for p in paths]
+
+
+# ==================== 内存准入控制 ====================
+class MemoryGovernor:
+    """按估算的峰值内存准入任务，预算用尽时后来的任务排队等待
+    
+    渲染一页约占 页面面积 × (dpi/72)² × 通道数 字节。没有已准入的任务时总会放行，
+    单个超出预算的大任务也能单独执行。record() 记录实测的内存峰值（RssPeakMonitor）与估算值，
+    积累足够样本后按观测到的最大比值校准之后的估算；校准系数不低于 MIN_RATIO，只会放大估算。
+    """
+    
+    MIN_SAMPLES = 5
+    MIN_RATIO = 1.0
+    
+    def __init__(self, budget=None):
+        self.budget = budget or self.default_budget()
+        self.used = 0
+        self.peak = 0
+        self.samples = 0
+        self.ratio_sum = 0.0
+        self.ratio_max = 0.0
+        self._cond = threading.Condition()
+    
+    @staticmethod
+    def system_memory():
+        """物理内存总量（字节），无法获取时按 4GB 计"""
         try:
-            self.controller.is_running = True
-            total = len(file_paths)
-            success_count = 0
-            
-            self.log(f"🔄 批量转换 {total} 个表格...")
-            os.makedirs(output_folder, exist_ok=True)
-            
-            for i, file_path in enumerate(file_paths):
-                if not self.controller.check_pause():
-                    break
+            if sys.platform == 'win32':
+                import ctypes
                 
-                self.progress(i + 1, total)
-                base_name = Path(file_path).stem
-                output_path = os.path.join(output_folder, f"{base_name}.pdf")
+                class MEMORYSTATUSEX(ctypes.Structure):
+                    _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                                ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                                ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                                ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                                ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
                 
-                if self.spreadsheet_to_pdf(file_path, output_path):
-                    success_count += 1
-            
-            self.log(f"✅ 完成！成功 {success_count}/{total}")
-            return success_count > 0
-            
-        except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
-            return False
-        finally:
-            self.controller.is_running = False
+                status = MEMORYSTATUSEX()
+                status.dwLength = ctypes.sizeof(status)
+                if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                    return status.ullTotalPhys
+            else:
+                return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        except Exception:
+            pass
+        return 4 * 1024 ** 3
     
-    def spreadsheet_to_pdf(self, file_path, output_path):
-        """单个表格转PDF"""
-        try:
-            self.log(f"🔄 转换表格: {os.path.basename(file_path)}")
-            
-            file_path = os.path.abspath(file_path)
-            output_path = os.path.abspath(output_path)
-            
-            if self.tools['ms_excel'] and HAS_WIN32COM:
-                return self._excel_to_pdf_msexcel(file_path, output_path)
-            
-            if self.tools['wps'] and HAS_WIN32COM:
-                return self._excel_to_pdf_wps(file_path, output_path)
-            
-            if self.tools['libreoffice']:
-                return self._doc_to_pdf_libreoffice(file_path, output_path)
-            
-            self.log("❌ 未找到可用的转换工具")
-            return False
-            
-        except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
-            return False
+    @classmethod
+    def default_budget(cls):
+        return int(cls.system_memory() * 0.6)
     
-    def _excel_to_pdf_msexcel(self, file_path, output_path):
-        try:
-            self.log("  使用 Microsoft Excel 转换...")
-            
-            excel = win32com.client.Dispatch("Excel.Application")
-            excel.Visible = False
-            excel.DisplayAlerts = False
-            
-            try:
-                wb = excel.Workbooks.Open(file_path)
-                wb.ExportAsFixedFormat(0, output_path)
-                wb.Close(False)
-                self.log(f"✅ PDF保存成功: {output_path}")
-                return True
-            finally:
-                excel.Quit()
-                
-        except Exception as e:
-            self.log(f"  Excel转换失败: {e}")
-            return False
+    @staticmethod
+    def page_bytes(width, height, dpi=72, channels=3):
+        """按页面尺寸（磅）和 DPI 估算一页像素缓冲的字节数"""
+        scale = dpi / 72
+        return int(width * scale + 1) * int(height * scale + 1) * channels
     
-    def _excel_to_pdf_wps(self, file_path, output_path):
+    def calibrated(self, estimate):
+        if self.samples < self.MIN_SAMPLES:
+            return estimate
+        return int(estimate * max(self.ratio_max, self.MIN_RATIO))
+    
+    def _admit(self, nbytes):
+        self.used += nbytes
+        self.peak = max(self.peak, self.used)
+    
+    def try_acquire(self, nbytes):
+        with self._cond:
+            if self.used and self.used + nbytes > self.budget:
+                return False
+            self._admit(nbytes)
+            return True
+    
+    def acquire(self, nbytes):
+        """预算不足时阻塞，直到其他任务释放"""
+        with self._cond:
+            while self.used and self.used + nbytes > self.budget:
+                self._cond.wait()
+            self._admit(nbytes)
+    
+    def charge(self, nbytes):
+        """不经准入直接计入，用于调用方已无法再等待的情况（例如已清空自己的写出队列）"""
+        with self._cond:
+            self._admit(nbytes)
+    
+    def release(self, nbytes):
+        with self._cond:
+            self.used = max(0, self.used - nbytes)
+            self._cond.notify_all()
+    
+    def reset_peak(self):
+        with self._cond:
+            self.peak = self.used
+    
+    def record(self, estimated, actual):
+        """记录一次实测峰值，用于校准；没有估算（非渲染任务）或没有测到内存增长的样本不计入"""
+        if estimated <= 0 or actual <= 0:
+            return
+        with self._cond:
+            ratio = actual / estimated
+            self.samples += 1
+            self.ratio_sum += ratio
+            self.ratio_max = max(self.ratio_max, ratio)
+    
+    def stats(self):
+        with self._cond:
+            return {
+                'budget': self.budget, 'used': self.used, 'peak': self.peak, 'samples': self.samples,
+                'ratio_avg': round(self.ratio_sum / self.samples, 3) if self.samples else None,
+                'ratio_max': round(self.ratio_max, 3) if self.samples else None,
+            }
+
+
+class RssPeakMonitor:
+    """测量一段代码执行期间进程常驻内存比起点高出的峰值（字节）
+    
+    后台线程按 interval 采样常驻内存；结束时再看操作系统记录的进程峰值
+    （Windows PeakWorkingSetSize / getrusage ru_maxrss），期间被刷新时以它为准，采样间隙的尖峰也不会漏掉。
+    """
+    
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.used = 0
+        self._stop = threading.Event()
+    
+    def __enter__(self):
+        self._base = MetricsRegistry.rss()
+        self._peak_before = MetricsRegistry.rss(peak=True)
+        self._highest = self._base
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+    
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._highest = max(self._highest, MetricsRegistry.rss())
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        highest = max(self._highest, MetricsRegistry.rss())
+        peak_after = MetricsRegistry.rss(peak=True)
+        if peak_after > self._peak_before:
+            highest = max(highest, peak_after)
+        self.used = max(0, highest - self._base)
+        return False
+
+
+# ==================== 运行指标 ====================
+class _ShardHolder:
+    """MetricsRegistry 分片的生命周期标记（可被弱引用）"""
+    __slots__ = ('__weakref__',)
+
+
+class MetricsRegistry:
+    """进程内运行指标：计数器、直方图和仪表，导出为 Prometheus 文本格式或 JSON
+    
+    热路径上的 inc() / observe() 只写当前线程自己的分片（threading.local 中的 dict），不加锁；
+    导出时才汇总所有线程的分片。线程结束时其分片并入基础累计值后移除，线程池反复换线程也不会累积分片。仪表由回调函数在导出时取值，不占用热路径。
+    服务模式的工作进程把自己的快照随任务结果带回，由主进程 merge() 后一起导出。
+    """
+    
+    # 秒，覆盖单页渲染（毫秒级）到整个文档转换（分钟级）
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+    
+    def __init__(self):
+        self._meta = {}           # 名称 -> (类型, 说明, 标签名, 分桶)
+        self._functions = {}      # (仪表名, 标签值) -> 取值函数
+        self._local = threading.local()
+        self._shards = []
+        self._base = ({}, {})     # 已结束线程的分片累计值
+        self._remote = {}         # 来源 -> 其他进程的快照
+        # 可重入：线程结束时的 _retire 可能在持锁的同一线程中被触发
+        self._lock = threading.RLock()
+    
+    def counter(self, name, help_text, labels=()):
+        self._meta[name] = ('counter', help_text, tuple(labels), None)
+    
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self._meta[name] = ('histogram', help_text, tuple(labels), tuple(buckets))
+    
+    def gauge(self, name, help_text, labels=()):
+        self._meta[name] = ('gauge', help_text, tuple(labels), None)
+    
+    def set_function(self, name, func, *labels):
+        """仪表在导出时调用 func() 取值；func 为 None 时移除"""
+        if func is None:
+            self._functions.pop((name, labels), None)
+        else:
+            self._functions[(name, labels)] = func
+    
+    def _shard(self):
         try:
-            self.log("  使用 WPS 表格转换...")
-            
-            try:
-                et = win32com.client.Dispatch("KET.Application")
-            except:
-                et = win32com.client.Dispatch("ET.Application")
-            
-            et.Visible = False
-            
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = ({}, {})
+            # holder 只被本线程的 threading.local 引用，线程结束即被回收，由 finalize 回收分片
+            holder = self._local.holder = _ShardHolder()
+            weakref.finalize(holder, self._retire, shard)
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+    
+    def _retire(self, shard):
+        """线程结束：把它的分片并入基础累计值并移除"""
+        with self._lock:
+            self._fold(self._base, shard)
             try:
-                wb = et.Workbooks.Open(file_path)
-                wb.ExportAsFixedFormat(0, output_path)
-                wb.Close(False)
-                self.log(f"✅ PDF保存成功: {output_path}")
-                return True
-            finally:
-                et.Quit()
-                
-        except Exception as e:
-            self.log(f"  WPS转换失败: {e}")
-            return False
+                self._shards.remove(shard)
+            except ValueError:
+                pass
     
-    # ==================== 批量网页转PDF ====================
-    def urls_to_pdf(self, urls, output_folder):
-        """批量网页转PDF"""
+    @staticmethod
+    def _fold(total, shard):
+        counters, histograms = total
+        shard_counters, shard_histograms = shard
+        # dict.copy() 在 C 层完成，不会与其他线程的写入交错
+        for key, value in shard_counters.copy().items():
+            counters[key] = counters.get(key, 0) + value
+        for key, slots in shard_histograms.copy().items():
+            merged = histograms.setdefault(key, [0] * len(slots))
+            for i, value in enumerate(list(slots)):
+                merged[i] += value
+    
+    def inc(self, name, value=1, *labels):
+        counters = self._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+    
+    def observe(self, name, value, *labels):
+        histograms = self._shard()[1]
+        key = (name, labels)
+        slots = histograms.get(key)
+        if slots is None:
+            # 各分桶计数（最后一个为 +Inf）+ 观测值之和
+            slots = histograms[key] = [0] * (len(self._meta[name][3]) + 2)
+        slots[bisect.bisect_left(self._meta[name][3], value)] += 1
+        slots[-1] += value
+    
+    @staticmethod
+    def rss(peak=False):
+        """当前进程的常驻内存（字节），peak=True 时为进程启动以来的峰值；无法获取时为 0"""
         try:
-            self.controller.is_running = True
-            total = len(urls)
-            success_count = 0
-            
-            self.log(f"🔄 批量转换 {total} 个网页...")
-            os.makedirs(output_folder, exist_ok=True)
-            
-            for i, url in enumerate(urls):
-                if not self.controller.check_pause():
-                    break
+            if sys.platform == 'win32':
+                import ctypes
+                from ctypes import wintypes
                 
-                self.progress(i + 1, total)
-                # 从URL生成文件名
-                from urllib.parse import urlparse
-                parsed = urlparse(url)
-                base_name = parsed.netloc.replace('.', '_') + parsed.path.replace('/', '_')
-                base_name = base_name[:50]  # 限制长度
-                if not base_name:
-                    base_name = f"webpage_{i+1}"
-                output_path = os.path.join(output_folder, f"{base_name}.pdf")
+                class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                    _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                                ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                                ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
                 
-                if self.url_to_pdf(url, output_path):
-                    success_count += 1
+                counters = PROCESS_MEMORY_COUNTERS()
+                counters.cb = ctypes.sizeof(counters)
+                handle = ctypes.windll.kernel32.GetCurrentProcess()
+                if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                    return counters.PeakWorkingSetSize if peak else counters.WorkingSetSize
+            elif peak:
+                import resource
+                # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+                maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                return maxrss if sys.platform == 'darwin' else maxrss * 1024
+            else:
+                with open('/proc/self/statm') as f:
+                    return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except Exception:
+            pass
+        return 0
+    
+    def snapshot(self, source=None):
+        """汇总本进程各线程的计数器与直方图（不含 merge 进来的其他进程），可跨进程传递"""
+        total = ({}, {})
+        # 持锁汇总，避免某个分片恰好在汇总途中被 _retire 并入基础值而重复计数
+        with self._lock:
+            self._fold(total, self._base)
+            for shard in self._shards:
+                self._fold(total, shard)
+        counters, histograms = total
+        return {'source': source or f"pid-{os.getpid()}", 'time': time.time(), 'rss': self.rss(),
+                'counters': counters, 'histograms': histograms}
+    
+    def merge(self, snapshot):
+        """合并其他进程的快照；同一来源只保留最新一份（快照是累计值）"""
+        with self._lock:
+            self._remote[snapshot['source']] = snapshot
+    
+    def collect(self):
+        """{指标名: [(标签字典, 值)]}，直方图的值为 (各分桶累计计数, 总和, 次数)"""
+        local = self.snapshot('main')
+        with self._lock:
+            snapshots = [local] + list(self._remote.values())
+        
+        counters = {}
+        histograms = {}
+        for snap in snapshots:
+            for key, value in snap['counters'].items():
+                counters[key] = counters.get(key, 0) + value
+            for key, slots in snap['histograms'].items():
+                total = histograms.setdefault(key, [0] * len(slots))
+                for i, value in enumerate(slots):
+                    total[i] += value
+        
+        samples = {name: [] for name in self._meta}
+        for (name, labels), value in counters.items():
+            samples[name].append((dict(zip(self._meta[name][2], labels)), value))
+        for (name, labels), slots in histograms.items():
+            cumulative = list(itertools.accumulate(slots[:-1]))
+            samples[name].append((dict(zip(self._meta[name][2], labels)), (cumulative, slots[-1], cumulative[-1])))
+        for (name, labels), func in list(self._functions.items()):
+            try:
+                value = func()
+            except Exception:
+                continue
+            samples[name].append((dict(zip(self._meta[name][2], labels)), value))
+        if 'docconv_resident_memory_bytes' in samples:
+            for snap in snapshots:
+                samples['docconv_resident_memory_bytes'].append(({'process': snap['source']}, snap['rss']))
+        return samples
+    
+    @staticmethod
+    def _format_labels(labels, extra=None):
+        items = list(labels.items()) + list((extra or {}).items())
+        if not items:
+            return ''
+        escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+    
+    def render_prometheus(self):
+        lines = []
+        for name, samples in self.collect().items():
+            kind, help_text, _, buckets = self._meta[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind == 'histogram':
+                    cumulative, total, count = value
+                    for bound, n in zip(list(buckets) + ['+Inf'], cumulative):
+                        lines.append(f"{name}_bucket{self._format_labels(labels, {'le': bound})} {n}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+                else:
+                    lines.append(f"{name}{self._format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+    
+    def to_json(self):
+        metrics = {}
+        for name, samples in self.collect().items():
+            kind, help_text, _, buckets = self._meta[name]
+            entries = []
+            for labels, value in samples:
+                if kind == 'histogram':
+                    cumulative, total, count = value
+                    value = {'buckets': dict(zip([str(b) for b in buckets] + ['+Inf'], cumulative)),
+                             'sum': total, 'count': count}
+                entries.append({'labels': labels, 'value': value})
+            metrics[name] = {'type': kind, 'help': help_text, 'samples': entries}
+        return {'time': time.time(), 'metrics': metrics}
+
+
+METRICS = MetricsRegistry()
+METRICS.counter('docconv_jobs_total', "转换任务数", ('operation', 'backend', 'status'))
+METRICS.counter('docconv_files_total', "转换的文件数", ('operation', 'backend', 'status'))
+METRICS.counter('docconv_pages_total', "成功转换的页数", ('operation', 'backend'))
+METRICS.histogram('docconv_stage_seconds', "各阶段耗时：预检 / 读取 / 渲染 / 编码写出 / 外部程序转换", ('stage',))
+METRICS.histogram('docconv_job_seconds', "整个任务的耗时", ('operation',))
+METRICS.gauge('docconv_queue_depth', "等待执行的任务数", ('queue',))
+METRICS.gauge('docconv_workers', "工作进程数（busy / idle）", ('state',))
+METRICS.gauge('docconv_resident_memory_bytes', "进程常驻内存", ('process',))
+METRICS.counter('docconv_web_cache_requests_total', "网页资源缓存代理处理的请求（hits / revalidated / misses / uncacheable / tunnels）",
+                ('result',))
+METRICS.counter('docconv_web_cache_bytes_total', "网页资源缓存代理转发的字节数（network / cache）", ('source',))
+
+
+class MetricsExporter:
+    """在本地端口以 Prometheus 文本格式（/metrics）和 JSON（/metrics.json）提供指标，
+    并可每隔 interval 秒把 JSON 快照原子写入 json_path"""
+    
+    def __init__(self, registry=None, host='127.0.0.1', port=None, json_path=None, interval=60):
+        self.registry = registry or METRICS
+        self.json_path = json_path
+        self.interval = interval
+        self.server = None
+        self._stop = threading.Event()
+        
+        if port is not None:
+            registry = self.registry
             
-            self.log(f"✅ 完成！成功 {success_count}/{total}")
-            return success_count > 0
+            class Handler(BaseHTTPRequestHandler):
+                def log_message(self, format, *args):
+                    pass
+                
+                def do_GET(self):
+                    path = self.path.split('?')[0]
+                    if path == '/metrics':
+                        body = registry.render_prometheus().encode('utf-8')
+                        content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                    elif path == '/metrics.json':
+                        body = json.dumps(registry.to_json(), ensure_ascii=False).encode('utf-8')
+                        content_type = 'application/json; charset=utf-8'
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
             
-        except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
-            return False
-        finally:
-            self.controller.is_running = False
+            self.server = ThreadingHTTPServer((host, port), Handler)
+            self.server.daemon_threads = True
     
-    def url_to_pdf(self, url, output_path):
-        """单个网页转PDF"""
+    def start(self):
+        if self.server:
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        if self.json_path:
+            threading.Thread(target=self._write_snapshots, daemon=True).start()
+        return self
+    
+    def write_snapshot(self):
+        with AtomicOutput(self.json_path) as out:
+            with open(out.temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.registry.to_json(), f, ensure_ascii=False)
+            out.commit()
+    
+    def _write_snapshots(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write_snapshot()
+            except OSError:
+                pass
+    
+    def stop(self):
+        self._stop.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.json_path:
+            self.write_snapshot()
+
+
+# ==================== 流水线执行 ====================
+# 读取 → 计算 → 写入 三段流水线：PrefetchReader 在后台预读后续输入，
+# 转换函数在当前线程渲染/计算，AsyncWriter 在后台编码写盘。
+# 各段之间用有界队列连接，下游变慢时上游自动阻塞，内存占用有上限。
+class PrefetchReader:
+    """后台预读输入文件，迭代得到 (路径, 文件内容)
+    
+    最多提前读入 depth 个文件；超过 max_bytes 的文件、读取失败或被 skip 判定跳过的文件
+    内容为 None，由调用方按路径直接打开（读取错误也会在那时正常报告）。
+    """
+    
+    _END = object()
+    
+    def __init__(self, paths, depth=2, max_bytes=256 * 1024 * 1024, skip=None):
+        self.paths = list(paths)
+        self.max_bytes = max_bytes
+        self.skip = skip
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def _read(self, path):
+        if self.skip and self.skip(path):
+            return None
         try:
-            self.log(f"🔄 转换网页: {url}")
-            
-            if not HAS_SELENIUM:
-                self.log("❌ 未安装selenium")
-                return False
-            
-            edge_driver = self.driver_manager.get_edge_driver()
-            if edge_driver and self.tools['edge']:
-                result = self._url_to_pdf_with_driver(url, output_path, 'edge', edge_driver)
-                if result:
-                    return True
+            if os.path.getsize(path) > self.max_bytes:
+                return None
+            start = time.perf_counter()
+            with open(path, 'rb') as f:
+                data = f.read()
+            METRICS.observe('docconv_stage_seconds', time.perf_counter() - start, 'read')
+            return data
+        except OSError:
+            return None
+    
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def _run(self):
+        for path in self.paths:
+            if not self._put((path, self._read(path))):
+                return
+        self._put(self._END)
+    
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                return
+            yield item
+    
+    def close(self):
+        """提前结束（暂停后终止、出错）时调用，让读取线程退出"""
+        self._closed.set()
+
+
+class AsyncWriter:
+    """后台写出线程：编码和写盘与下一页的渲染并行进行
+    
+    submit() 在队列满时阻塞（背压）；flush() 等待已提交的任务全部完成，
+    并抛出期间遇到的第一个错误。出错后剩余任务直接丢弃，之后的 submit/flush 都会抛出该错误。
+    
+    submit(..., keep=obj) 让提交线程持有 obj 直到任务完成，再在提交线程中释放。
+    用于 pixmap：写出线程只读取其像素内存，pixmap 的创建和销毁始终留在渲染线程。
+    """
+    
+    def __init__(self, depth=4):
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._error = None
+        self._submitted = 0
+        self._completed = 0
+        self._kept = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                self._queue.task_done()
+                return
+            func, args = task
+            task = None
+            try:
+                if self._error is None:
+                    start = time.perf_counter()
+                    func(*args)
+                    METRICS.observe('docconv_stage_seconds', time.perf_counter() - start, 'write')
+            except Exception as e:
+                self._error = e
+            finally:
+                # 先放掉对参数的引用，再标记完成
+                func = args = None
+                self._completed += 1
+                self._queue.task_done()
+    
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+    
+    def _release_kept(self):
+        while self._kept and self._kept[0][0] <= self._completed:
+            self._kept.pop(0)
+    
+    def submit(self, func, *args, keep=None):
+        self._raise_error()
+        self._release_kept()
+        self._submitted += 1
+        if keep is not None:
+            self._kept.append((self._submitted, keep))
+        self._queue.put((func, args))
+    
+    def flush(self):
+        self._queue.join()
+        self._release_kept()
+        self._raise_error()
+    
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._kept.clear()
+
+
+# ==================== 进度与剩余时间 ====================
+class ProgressTracker:
+    """分层进度：批次 → 文件 → 页面
+    
+    批次开始时给出每个文件的工作量权重（页数、像素数或字节数），文件内按页更新，
+    汇总为整个批次的完成比例；吞吐量（权重/秒）做指数平滑，据此估算剩余时间。
+    回调为 callback(已完成工作量, 总工作量, info)，info 含文件/页码、吞吐量和剩余秒数。
+    """
+    
+    SMOOTHING = 0.3
+    MIN_INTERVAL = 0.5    # 吞吐量采样的最短间隔（秒）
+    
+    def __init__(self, callback=None):
+        self.callback = callback or (lambda current, total, info=None: None)
+        self.begin_batch([1])
+    
+    def begin_batch(self, weights):
+        self.weights = list(weights) or [1]
+        self.total = sum(self.weights) or 1
+        self.index = 0
+        self.completed = 0      # 当前文件之前各文件的权重之和
+        self.fraction = 0.0     # 当前文件内的完成比例
+        self.page = (0, 0)
+        self.unit = None
+        self.start = self._sample_time = time.time()
+        self._sample_done = 0
+        self.rate = None
+    
+    def item(self, index, skipped=False):
+        """开始第 index 个文件，之前的文件计为已完成；skipped=True 表示该文件无需处理（如断点续传）"""
+        index = min(index, len(self.weights) - 1)
+        if index > self.index:
+            self.completed += sum(self.weights[self.index:index])
+        self.index = index
+        self.fraction = 0.0
+        self.page = (0, 0)
+        self.unit = None
+        if skipped:
+            # 跳过的工作量不计入吞吐量
+            self.fraction = 1.0
+            self._sample_done += self.weights[index]
+        self._report()
+    
+    def update(self, done, total, unit='页'):
+        """当前文件内的进度，例如第 done 页 / 共 total 页；unit=None 时不在界面上显示计数（如字节数）"""
+        self.fraction = done / total if total else 1.0
+        self.page = (done, total)
+        self.unit = unit
+        self._report()
+    
+    def finish(self):
+        self.completed = self.total
+        self.index = len(self.weights) - 1
+        self.fraction = 0.0
+        self._report()
+    
+    @property
+    def done(self):
+        return min(self.total, self.completed + self.weights[self.index] * self.fraction)
+    
+    def eta(self):
+        if not self.rate:
+            return None
+        return (self.total - self.done) / self.rate
+    
+    def _report(self):
+        now = time.time()
+        done = self.done
+        elapsed = now - self._sample_time
+        if elapsed >= self.MIN_INTERVAL:
+            rate = max(0.0, done - self._sample_done) / elapsed
+            self.rate = rate if self.rate is None else self.SMOOTHING * rate + (1 - self.SMOOTHING) * self.rate
+            self._sample_time, self._sample_done = now, done
+        
+        info = {
+            'fraction': done / self.total,
+            'item': self.index + 1, 'items': len(self.weights),
+            'page': self.page[0], 'pages': self.page[1], 'unit': self.unit,
+            'rate': self.rate, 'eta': self.eta(), 'elapsed': now - self.start,
+        }
+        self.callback(done, self.total, info)
+    
+    @staticmethod
+    def format_seconds(seconds):
+        seconds = int(seconds)
+        if seconds >= 3600:
+            return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+        return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+# ==================== 任务历史与吞吐统计 ====================
+class JobHistory:
+    """任务历史库：每个转换任务一行，记录操作、参数、输入输出字节数与页数、使用的后端、耗时和失败原因
+    
+    保存在本机 SQLite（WAL 模式），服务模式的多个工作进程可同时写入；分布式模式下各节点记录本机执行的任务。
+    status 为 ok / partial（部分文件失败）/ failed / stopped（被终止）。
+    """
+    
+    DEFAULT_PATH = os.path.join(APP_DATA_DIR, "history.db")
+    # 未调用外部程序时使用的内置引擎
+    ENGINES = {
+        'images_to_pdf': 'Pillow', 'images_to_ppt': 'python-pptx', 'images_to_webp': 'Pillow',
+        'folder_to_webp': 'Pillow', 'pdfs_to_ppt': 'PyMuPDF', 'pdf_to_ppt': 'PyMuPDF',
+        'pdfs_to_images': 'PyMuPDF', 'pdf_to_images': 'PyMuPDF', 'pdfs_multi_output': 'PyMuPDF',
+        'extract_images_from_pdfs': 'PyMuPDF', 'extract_images_from_pdf': 'PyMuPDF',
+        'pdfs_optimize': 'PyMuPDF', 'pdfs_merge': 'PyMuPDF', 'pdfs_split': 'PyMuPDF', 'pdfs_index_text': 'PyMuPDF',
+    }
+    BUCKETS = {'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d', 'week': '%Y-W%W', 'month': '%Y-%m'}
+    
+    def __init__(self, path=None):
+        self.path = path or self.DEFAULT_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            started REAL NOT NULL,
+            operation TEXT NOT NULL,
+            params TEXT,
+            backend TEXT,
+            file_types TEXT,
+            inputs INTEGER,
+            input_bytes INTEGER,
+            output_bytes INTEGER,
+            pages INTEGER,
+            duration REAL,
+            status TEXT NOT NULL,
+            error TEXT
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_started ON jobs (started)")
+        self.db.commit()
+    
+    def close(self):
+        with self._lock:
+            self.db.close()
+    
+    def record(self, operation, started, duration, status, params=None, backend=None, file_types=None,
+               inputs=0, input_bytes=0, output_bytes=0, pages=0, error=None):
+        with self._lock:
+            cursor = self.db.execute(
+                "INSERT INTO jobs (started, operation, params, backend, file_types, inputs, input_bytes,"
+                " output_bytes, pages, duration, status, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (started, operation, json.dumps(params or {}, ensure_ascii=False, default=str), backend,
+                 file_types, inputs, input_bytes, output_bytes, pages, duration, status, error))
+            self.db.commit()
+            return cursor.lastrowid
+    
+    def _query(self, sql, args=()):
+        with self._lock:
+            return [dict(row) for row in self.db.execute(sql, args)]
+    
+    @staticmethod
+    def _since(days):
+        return time.time() - days * 86400 if days else 0
+    
+    def recent(self, limit=20, operation=None):
+        """最近的任务，新的在前"""
+        if operation:
+            return self._query("SELECT * FROM jobs WHERE operation = ? ORDER BY started DESC LIMIT ?",
+                               (operation, limit))
+        return self._query("SELECT * FROM jobs ORDER BY started DESC LIMIT ?", (limit,))
+    
+    def failures(self, limit=20, days=None):
+        """最近失败（含部分失败）的任务及原因"""
+        return self._query("SELECT * FROM jobs WHERE status IN ('failed', 'partial') AND started >= ?"
+                           " ORDER BY started DESC LIMIT ?", (self._since(days), limit))
+    
+    def trend(self, days=30, bucket='day', operation=None):
+        """按时间段汇总：任务数、失败率、页数和吞吐量（页/秒，只统计成功的任务）"""
+        sql = ("SELECT strftime(?, started, 'unixepoch', 'localtime') AS period, COUNT(*) AS jobs,"
+               " SUM(status = 'failed') AS failed,"
+               " SUM(CASE WHEN status = 'ok' THEN pages ELSE 0 END) AS ok_pages,"
+               " SUM(CASE WHEN status = 'ok' THEN duration ELSE 0 END) AS ok_seconds,"
+               " SUM(pages) AS pages, SUM(input_bytes) AS input_bytes, SUM(output_bytes) AS output_bytes"
+               " FROM jobs WHERE started >= ?")
+        args = [self.BUCKETS[bucket], self._since(days)]
+        if operation:
+            sql += " AND operation = ?"
+            args.append(operation)
+        rows = self._query(sql + " GROUP BY period ORDER BY period", args)
+        for row in rows:
+            self._add_rates(row)
+        return rows
+    
+    def backends(self, days=None, operation=None):
+        """按 操作 + 文件类型 + 后端 汇总吞吐量与失败率，每组内按吞吐量从高到低排列"""
+        sql = ("SELECT operation, file_types, backend, COUNT(*) AS jobs, SUM(status = 'failed') AS failed,"
+               " SUM(CASE WHEN status = 'ok' THEN pages ELSE 0 END) AS ok_pages,"
+               " SUM(CASE WHEN status = 'ok' THEN duration ELSE 0 END) AS ok_seconds"
+               " FROM jobs WHERE started >= ? AND status != 'stopped'")
+        args = [self._since(days)]
+        if operation:
+            sql += " AND operation = ?"
+            args.append(operation)
+        rows = self._query(sql + " GROUP BY operation, file_types, backend", args)
+        for row in rows:
+            self._add_rates(row)
+        rows.sort(key=lambda r: (r['operation'], r['file_types'] or '', -(r['pages_per_second'] or 0)))
+        return rows
+    
+    def fastest_backends(self, days=None):
+        """{(操作, 文件类型): 吞吐量最高的后端}"""
+        fastest = {}
+        for row in self.backends(days):
+            if row['pages_per_second']:
+                fastest.setdefault((row['operation'], row['file_types']), row['backend'])
+        return fastest
+    
+    @staticmethod
+    def _add_rates(row):
+        row['failure_rate'] = row['failed'] / row['jobs'] if row['jobs'] else 0.0
+        row['pages_per_second'] = row['ok_pages'] / row['ok_seconds'] if row['ok_seconds'] else None
+    
+    def report(self, days=30, bucket='day'):
+        """文本报表：每个时间段的吞吐量与失败率、各后端速度对比和最近的失败原因"""
+        trend = self.trend(days, bucket)
+        if not trend:
+            return [f"📊 最近 {days} 天没有任务记录（{self.path}）"]
+        
+        lines = [f"📊 最近 {days} 天共 {sum(r['jobs'] for r in trend)} 个任务",
+                 f"  {'时间':<14}{'任务':>6}{'失败率':>8}{'页数':>9}{'页/秒':>9}"]
+        for r in trend:
+            rate = f"{r['pages_per_second']:.2f}" if r['pages_per_second'] else '-'
+            lines.append(f"  {r['period']:<16}{r['jobs']:>6}{r['failure_rate']:>9.1%}{r['pages'] or 0:>10}{rate:>10}")
+        
+        lines.append("🏁 各后端吞吐量（按操作与文件类型）")
+        group = None
+        for r in self.backends(days):
+            key = (r['operation'], r['file_types'])
+            rate = f"{r['pages_per_second']:.2f} 页/秒" if r['pages_per_second'] else "无成功记录"
+            best = " ← 最快" if key != group and r['pages_per_second'] else ""
+            group = key
+            lines.append(f"  {r['operation']} [{r['file_types'] or '-'}] {r['backend'] or '-'}: {rate}"
+                         f"（{r['jobs']} 个任务，失败 {r['failure_rate']:.0%}）{best}")
+        
+        failures = self.failures(10, days)
+        if failures:
+            lines.append("❌ 最近失败")
+            for r in failures:
+                when = time.strftime('%m-%d %H:%M', time.localtime(r['started']))
+                reason = (r['error'] or '').splitlines()[0] if r['error'] else '未知原因'
+                lines.append(f"  {when} {r['operation']} [{r['status']}]: {reason[:120]}")
+        return lines
+
+
+def _recorded_job(func):
+    """转换入口装饰器：把每次调用作为一个任务写入 JobHistory 并更新运行指标
+    
+    只记录最外层调用（批量转换内部调用单文件转换、folder_to_webp 调用 images_to_webp 都只算一个任务）；
+    任务状态只由返回值和批量循环经 _file_result() 报告的各文件结果决定。任务期间以 ❌ / ⛔ 开头或含“失败”的
+    日志行只作为失败原因的文字说明（“Edge自动驱动失败”之类回退成功的提示不会让任务变成部分失败）。
+    """
+    signature = inspect.signature(func)
+    
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if self._job is not None:
+            return func(self, *args, **kwargs)
+        
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        values = list(arguments.arguments.values())
+        names = list(arguments.arguments)
+        params = dict(zip(names[3:], values[3:]))
+        
+        # messages：可作为失败原因的日志行；failures：各文件明确报告的失败；seen：已归属到文件的 messages 数
+        self._job = {'backends': [], 'messages': [], 'failures': [], 'seen': 0}
+        self.preflight = {}
+        log = self.log
+        
+        def capture(message):
+            text = str(message).strip()
+            if text.startswith(('❌', '⛔')) or '失败' in text:
+                self._job['messages'].append(text)
+            log(message)
+        
+        self.log = capture
+        started = time.time()
+        result = False
+        try:
+            result = func(self, *args, **kwargs)
+            return result
+        except Exception as e:
+            self._job['messages'].append(f"❌ {type(e).__name__}: {e}")
+            raise
+        finally:
+            self.log = log
+            job, self._job = self._job, None
+            try:
+                self._record_job(func.__name__, values[1], values[2], params, started, result, job)
+            except Exception as e:
+                self.log(f"⚠️ 任务记录失败: {e}")
+    
+    return wrapper
+
+
+# ==================== 全文索引 ====================
+def _extract_pdf_text(pdf_path, first, last):
+    """在工作进程中提取 PDF 第 first~last 页（从 0 开始）的文本，返回 [(页码, 文本)]，页码从 1 开始"""
+    with fitz.open(pdf_path) as doc:
+        return [(pno + 1, doc[pno].get_text()) for pno in range(first, last + 1)]
+
+
+class TextIndex:
+    """PDF 全文索引：每页文本存入本机 SQLite FTS5 表，记录来源文件与页码
+    
+    中日韩文字没有空格分词，入库和查询时在每个字两侧加空格，使每个字成为一个词元，
+    查询词按短语匹配，任意长度的中文词都能命中；显示摘要时再去掉这些空格。
+    FTS 表的 rowid = 文件 ID × 2^20 + 页码，删除或复制某个文件的所有页都是 rowid 范围操作。
+    文件按路径登记大小、修改时间和 SHA-1：大小和时间未变直接跳过，变了再比对 SHA-1，内容不同才重新提取。
+    """
+    
+    DEFAULT_PATH = os.path.join(APP_DATA_DIR, "text_index.db")
+    PAGE_BITS = 20
+    CJK = re.compile(r'([\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef])')
+    UNSEGMENT = re.compile(r' ([\x02\x03]?[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef][\x02\x03]?) ')
+    
+    def __init__(self, path=None):
+        self.path = path or self.DEFAULT_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            sha1 TEXT,
+            size INTEGER,
+            mtime REAL,
+            page_count INTEGER,
+            indexed REAL
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS files_sha1 ON files (sha1)")
+        self.db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(text, tokenize='unicode61 remove_diacritics 2')")
+        self.db.commit()
+    
+    def close(self):
+        with self._lock:
+            self.db.close()
+    
+    @classmethod
+    def segment(cls, text):
+        return cls.CJK.sub(r' \1 ', text)
+    
+    @classmethod
+    def unsegment(cls, text):
+        return cls.UNSEGMENT.sub(r'\1', text)
+    
+    def _rowids(self, file_id):
+        return file_id << self.PAGE_BITS, ((file_id + 1) << self.PAGE_BITS) - 1
+    
+    def check(self, path):
+        """判断文件是否需要（重新）索引，返回 (是否需要, SHA-1)；不需要时 SHA-1 为 None"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self.db.execute("SELECT sha1, size, mtime FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row['sha1'] and row['size'] == st.st_size and row['mtime'] == st.st_mtime:
+            return False, None
+        sha1 = BatchJournal._checksum(path)
+        if row and row['sha1'] == sha1:
+            with self._lock:
+                self.db.execute("UPDATE files SET size = ?, mtime = ? WHERE path = ?", (st.st_size, st.st_mtime, path))
+                self.db.commit()
+            return False, None
+        return True, sha1
+    
+    def begin_file(self, path, sha1):
+        """登记文件并清空其旧的页面，返回 (文件 ID, 是否已从内容相同的文件复制了全部页面)
+        
+        sha1 在 finish_file 之前保持为空，中途终止的文件下次会重新索引。
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            self.db.execute(
+                "INSERT INTO files (path, size, mtime) VALUES (?, ?, ?)"
+                " ON CONFLICT(path) DO UPDATE SET sha1 = NULL, size = excluded.size, mtime = excluded.mtime",
+                (path, st.st_size, st.st_mtime))
+            file_id = self.db.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()[0]
+            self.db.execute("DELETE FROM pages WHERE rowid BETWEEN ? AND ?", self._rowids(file_id))
+            
+            # 内容相同的文件（复制、改名）已索引过时直接复制页面
+            same = self.db.execute("SELECT id, page_count FROM files WHERE sha1 = ? AND id != ?", (sha1, file_id)).fetchone()
+            if same:
+                low, high = self._rowids(same['id'])
+                self.db.execute("INSERT INTO pages (rowid, text) SELECT rowid - ? + ?, text FROM pages"
+                                " WHERE rowid BETWEEN ? AND ?", (low, file_id << self.PAGE_BITS, low, high))
+                self.db.execute("UPDATE files SET sha1 = ?, page_count = ?, indexed = ? WHERE id = ?",
+                                (sha1, same['page_count'], time.time(), file_id))
+            self.db.commit()
+        return file_id, bool(same)
+    
+    def add_pages(self, file_id, pages):
+        """写入一批 (页码, 文本)"""
+        with self._lock:
+            self.db.executemany("INSERT INTO pages (rowid, text) VALUES (?, ?)",
+                                [((file_id << self.PAGE_BITS) + page, self.segment(text)) for page, text in pages])
+            self.db.commit()
+    
+    def finish_file(self, file_id, sha1, pages):
+        with self._lock:
+            self.db.execute("UPDATE files SET sha1 = ?, page_count = ?, indexed = ? WHERE id = ?",
+                            (sha1, pages, time.time(), file_id))
+            self.db.commit()
+    
+    def prune(self):
+        """删除已不存在的文件及其页面，返回删除的文件数"""
+        with self._lock:
+            missing = [row['id'] for row in self.db.execute("SELECT id, path FROM files")
+                       if not os.path.exists(row['path'])]
+            for file_id in missing:
+                self.db.execute("DELETE FROM pages WHERE rowid BETWEEN ? AND ?", self._rowids(file_id))
+                self.db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            self.db.commit()
+        return len(missing)
+    
+    def stats(self):
+        with self._lock:
+            row = self.db.execute("SELECT COUNT(*) AS files, COALESCE(SUM(page_count), 0) AS pages FROM files"
+                                  " WHERE sha1 IS NOT NULL").fetchone()
+        return dict(row)
+    
+    def match_query(self, query):
+        """把查询串转为 FTS5 语法：空格分隔的各词都要出现（AND），每个词按短语匹配"""
+        phrases = []
+        for term in query.split():
+            term = ' '.join(self.segment(term).split())
+            if term:
+                phrases.append('"' + term.replace('"', '""') + '"')
+        return ' '.join(phrases)
+    
+    def search(self, query, limit=20, path_prefix=None):
+        """按相关度返回匹配的页面：[{'path', 'page', 'snippet', 'rank'}]，摘要中的命中词用【】标出"""
+        match = self.match_query(query)
+        if not match:
+            return []
+        sql = ("SELECT files.path AS path, pages.rowid & ? AS page,"
+               " snippet(pages, 0, char(2), char(3), '…', 32) AS snippet, pages.rank AS rank"
+               " FROM pages JOIN files ON files.id = pages.rowid >> ?"
+               " WHERE pages MATCH ? AND files.sha1 IS NOT NULL")
+        args = [(1 << self.PAGE_BITS) - 1, self.PAGE_BITS, match]
+        if path_prefix:
+            sql += " AND files.path LIKE ? ESCAPE '\\'"
+            prefix = os.path.abspath(path_prefix).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            args.append(prefix + '%')
+        sql += " ORDER BY pages.rank LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = [dict(row) for row in self.db.execute(sql, args)]
+        for row in rows:
+            # 摘要在词元边界截断，首尾的字缺少分词时加的空格，先补上再还原
+            snippet = row['snippet']
+            head = '…' if snippet.startswith('…') else ''
+            tail = '…' if snippet.endswith('…') and len(snippet) > len(head) else ''
+            snippet = self.unsegment(' ' + snippet[len(head):len(snippet) - len(tail)] + ' ')
+            snippet = ' '.join(snippet.replace('\x02', '【').replace('\x03', '】').split())
+            row['snippet'] = head + snippet + tail
+        return rows
+
+
+# ==================== 网页资源缓存 ====================
+class AssetCacheProxy:
+    """网页转PDF时各浏览器会话共用的本地缓存代理（仅用标准库）
+    
+    每个网页都用一个全新的临时浏览器渲染，浏览器自身的缓存总是空的；让浏览器通过 --proxy-server
+    使用本代理后，同一站点的 CSS / JS / 字体 / 图片只从网络下载一次，之后的会话直接读本地磁盘缓存。
+    - 遵循 Cache-Control（no-store / private / no-cache / max-age / s-maxage）、Expires 和 Vary；
+      没有明确有效期但有 Last-Modified 的响应按其距今时长的 10% 缓存（最多 1 天）
+    - 过期后带 If-None-Match / If-Modified-Since 向源站重新验证，返回 304 时继续使用缓存
+    - HTTPS 经 CONNECT 隧道直接转发（内容加密，无法缓存）；系统配置了上游代理时经上游代理访问
+    - 每个 URL 一个缓存文件（首行 JSON 元数据，其后为响应体），原子改名写入，多个进程可共用同一目录；
+      超出容量时按最近使用时间淘汰
+    """
+    
+    DEFAULT_DIR = os.path.join(APP_DATA_DIR, "web_cache")
+    CACHEABLE_STATUS = {200, 203, 301, 308, 404, 410}
+    HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'proxy-connection',
+                  'te', 'trailer', 'transfer-encoding', 'upgrade'}
+    HEURISTIC_MAX = 86400
+    
+    def __init__(self, cache_dir=None, max_bytes=500 * 1024 * 1024, host='127.0.0.1', port=0):
+        import urllib.request
+        from urllib.parse import urlsplit
+        self.cache_dir = cache_dir or self.DEFAULT_DIR
+        self.max_bytes = max_bytes
+        # 单个响应超过容量的 1/10 不缓存（如视频、安装包）
+        self.max_entry = max_bytes // 10
+        self.host, self.port = host, port
+        self.server = None
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(['requests', 'hits', 'revalidated', 'misses', 'uncacheable', 'tunnels',
+                                       'network_bytes', 'cache_bytes'], 0)
+        
+        upstream = urllib.request.getproxies().get('http')
+        self.upstream = None
+        if upstream:
+            parts = urlsplit(upstream if '://' in upstream else 'http://' + upstream)
+            self.upstream = (parts.hostname, parts.port or 80)
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith('.cache')
+        )
+    
+    def start(self):
+        handler = type('AssetProxyHandler', (_AssetProxyHandler,), {'proxy': self})
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+    
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+    
+    @property
+    def address(self):
+        return f"http://{self.host}:{self.port}"
+    
+    def browser_arguments(self):
+        """Chrome / Edge 启动参数；<-loopback> 使本机地址（如测试服务器）也经过代理"""
+        return [f'--proxy-server={self.address}', '--proxy-bypass-list=<-loopback>']
+    
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+        if name.endswith('_bytes'):
+            METRICS.inc('docconv_web_cache_bytes_total', value, name[:-len('_bytes')])
+        elif name != 'requests':
+            METRICS.inc('docconv_web_cache_requests_total', value, name)
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        served = stats['hits'] + stats['revalidated']
+        stats['hit_rate'] = served / stats['requests'] if stats['requests'] else 0.0
+        return stats
+    
+    def summary(self):
+        stats = self.stats()
+        return (f"🗄️ 资源缓存：{stats['requests']} 个请求，命中 {stats['hits']} 个，重新验证后使用 {stats['revalidated']} 个"
+                f"（{stats['hit_rate']:.0%}），从网络下载 {stats['network_bytes'] / 1024 / 1024:.1f} MB，"
+                f"从缓存读取 {stats['cache_bytes'] / 1024 / 1024:.1f} MB"
+                + (f"，HTTPS 隧道 {stats['tunnels']} 个" if stats['tunnels'] else ""))
+    
+    def upstream_for(self, hostname):
+        """访问 hostname 时使用的上游代理 (主机, 端口)，直连时为 None"""
+        import urllib.request
+        if self.upstream and not urllib.request.proxy_bypass(hostname):
+            return self.upstream
+        return None
+    
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.cache')
+    
+    def lookup(self, url, request_headers):
+        """返回缓存条目的元数据（含 'path'、'offset'），没有或 Vary 指定的请求头不一致时返回 None"""
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                meta['offset'] = f.tell()
+            os.utime(path)    # 修改时间作为 LRU 淘汰依据
+        except (OSError, ValueError):
+            return None
+        if meta['url'] != url:
+            return None
+        for name, value in meta['vary'].items():
+            if (request_headers.get(name) or '') != value:
+                return None
+        meta['path'] = path
+        return meta
+    
+    @staticmethod
+    def cache_control(value):
+        directives = {}
+        for item in (value or '').split(','):
+            name, _, arg = item.strip().partition('=')
+            if name:
+                directives[name.lower()] = arg.strip('"')
+        return directives
+    
+    @staticmethod
+    def _parse_date(value):
+        from email.utils import parsedate_to_datetime
+        try:
+            return parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError, IndexError):
+            return None
+    
+    def policy(self, request_headers, status, response_headers):
+        """按响应头判断能否缓存，返回元数据（不可缓存时为 None）"""
+        headers = {k.lower(): v for k, v in response_headers}
+        directives = self.cache_control(headers.get('cache-control'))
+        if status not in self.CACHEABLE_STATUS or 'no-store' in directives or 'private' in directives:
+            return None
+        if request_headers.get('Authorization') and not ('public' in directives or 's-maxage' in directives):
+            return None
+        vary = [name.strip().lower() for name in headers.get('vary', '').split(',') if name.strip()]
+        if '*' in vary:
+            return None
+        
+        now = time.time()
+        date = self._parse_date(headers.get('date')) or now
+        lifetime = 0
+        if 's-maxage' in directives or 'max-age' in directives:
+            try:
+                lifetime = int(directives.get('s-maxage') or directives.get('max-age'))
+            except ValueError:
+                lifetime = 0
+        elif headers.get('expires'):
+            expires = self._parse_date(headers['expires'])
+            lifetime = expires - date if expires else 0
+        elif headers.get('last-modified') and status in (200, 203):
+            modified = self._parse_date(headers['last-modified'])
+            lifetime = min((date - modified) * 0.1, self.HEURISTIC_MAX) if modified else 0
+        
+        no_cache = 'no-cache' in directives or headers.get('pragma', '').lower() == 'no-cache'
+        validators = headers.get('etag') or headers.get('last-modified')
+        if (lifetime <= 0 or no_cache) and not validators:
+            return None    # 每次都要重新下载，缓存没有意义
+        try:
+            age = int(headers.get('age', 0))
+        except ValueError:
+            age = 0
+        return {
+            'lifetime': lifetime, 'no_cache': no_cache, 'stored': now, 'age': age,
+            'etag': headers.get('etag'), 'last_modified': headers.get('last-modified'),
+            'vary': {name: request_headers.get(name) or '' for name in vary},
+        }
+    
+    @staticmethod
+    def is_fresh(meta):
+        return not meta['no_cache'] and time.time() - meta['stored'] + meta['age'] < meta['lifetime']
+    
+    def open_entry(self, url, meta, status, reason, headers):
+        """开始写入缓存条目，返回临时文件对象（写完后调用 commit_entry）"""
+        meta = dict(meta, url=url, status=status, reason=reason,
+                    headers=[[k, v] for k, v in headers if k.lower() != 'age'])
+        temp = open(f"{self._path(url)}.{threading.get_ident()}.tmp", 'wb')
+        temp.write(json.dumps(meta, ensure_ascii=False).encode('utf-8') + b'\n')
+        return temp
+    
+    def commit_entry(self, url, temp):
+        """临时文件改名为正式条目；覆盖已有条目时先扣除旧文件的大小"""
+        temp.close()
+        path = self._path(url)
+        with self._lock:
+            try:
+                self._total_bytes -= os.path.getsize(path)
+            except OSError:
+                pass    # 新条目，或旧条目已被淘汰
+            os.replace(temp.name, path)
+            self._total_bytes += os.path.getsize(path)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+    
+    @staticmethod
+    def discard_entry(temp):
+        temp.close()
+        try:
+            os.remove(temp.name)
+        except OSError:
+            pass
+    
+    def refresh(self, url, meta, request_headers, headers):
+        """源站返回 304：把新的响应头合并进缓存的响应头并重新计算有效期，响应体沿用缓存
+        
+        返回更新后的元数据；合并后不再可缓存时保持条目不变（已过期，下次仍会重新验证）。
+        """
+        updated = {k.lower(): [k, v] for k, v in headers}
+        merged = [updated.pop(k.lower(), [k, v]) for k, v in meta['headers']]
+        merged.extend(updated.values())
+        new_meta = self.policy(request_headers, meta['status'], merged)
+        if new_meta is None:
+            return meta
+        
+        temp = self.open_entry(url, new_meta, meta['status'], meta['reason'], merged)
+        with open(meta['path'], 'rb') as f:
+            f.seek(meta['offset'])
+            shutil.copyfileobj(f, temp)
+        self.commit_entry(url, temp)
+        return self.lookup(url, request_headers) or meta
+    
+    def _evict(self):
+        """删除最久未使用的条目，直到缓存降到上限的 90%"""
+        entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith('.cache')]
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                file_size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= file_size
+            except OSError:
+                pass
+
+
+class _AssetProxyHandler(BaseHTTPRequestHandler):
+    """代理请求处理：HTTP/1.0，每个响应后关闭连接，响应体以连接关闭为结束"""
+    proxy = None
+    timeout = 60
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _request_headers(self):
+        return [(k, v) for k, v in self.headers.items() if k.lower() not in AssetCacheProxy.HOP_BY_HOP]
+    
+    def _open_upstream(self, method, url, headers, body=None):
+        import http.client
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        upstream = self.proxy.upstream_for(parts.hostname)
+        if upstream:
+            conn = http.client.HTTPConnection(*upstream, timeout=self.timeout)
+            target = url
+        else:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+            target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        conn.putrequest(method, target, skip_host=True, skip_accept_encoding=True)
+        for key, value in headers:
+            conn.putheader(key, value)
+        conn.endheaders(body)
+        return conn, conn.getresponse()
+    
+    def _send_head(self, status, reason, headers, extra=()):
+        self.send_response_only(status, reason)
+        for key, value in list(headers) + list(extra):
+            if key.lower() not in AssetCacheProxy.HOP_BY_HOP:
+                self.send_header(key, value)
+        self.end_headers()
+    
+    def _relay(self, response, entry=None):
+        """把源站响应体转发给浏览器，entry 不为 None 时同时写入缓存；返回是否完整写入缓存"""
+        written = 0
+        while True:
+            chunk = response.read(65536)
+            if not chunk:
+                break
+            self.proxy.count('network_bytes', len(chunk))
+            self.wfile.write(chunk)
+            if entry is not None:
+                written += len(chunk)
+                if written > self.proxy.max_entry:
+                    AssetCacheProxy.discard_entry(entry)
+                    entry = None
+                else:
+                    entry.write(chunk)
+        return entry
+    
+    def _serve_cached(self, meta):
+        age = int(time.time() - meta['stored'] + meta['age'])
+        self._send_head(meta['status'], meta['reason'], meta['headers'], [('Age', str(max(age, 0)))])
+        if self.command == 'HEAD':
+            return
+        with open(meta['path'], 'rb') as f:
+            f.seek(meta['offset'])
+            while True:
+                chunk = f.read(65536)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                self.proxy.count('cache_bytes', len(chunk))
+    
+    def do_GET(self):
+        proxy = self.proxy
+        url = self.path
+        if not url.startswith('http://'):
+            self.send_error(400, "Proxy requests must use absolute http:// URLs")
+            return
+        self.close_connection = True
+        proxy.count('requests')
+        headers = self._request_headers()
+        directives = AssetCacheProxy.cache_control(self.headers.get('Cache-Control'))
+        if 'no-store' in directives:
+            meta = None
+        else:
+            meta = proxy.lookup(url, self.headers)
+        revalidate = 'no-cache' in directives or directives.get('max-age') == '0'
+        
+        try:
+            if meta and not revalidate and AssetCacheProxy.is_fresh(meta):
+                proxy.count('hits')
+                self._serve_cached(meta)
+                return
+            
+            conditional = False
+            if meta and (meta['etag'] or meta['last_modified']) and not any(
+                    k.lower() in ('if-none-match', 'if-modified-since') for k, _ in headers):
+                conditional = True
+                if meta['etag']:
+                    headers.append(('If-None-Match', meta['etag']))
+                if meta['last_modified']:
+                    headers.append(('If-Modified-Since', meta['last_modified']))
+            
+            conn, response = self._open_upstream(self.command, url, headers)
+            try:
+                response_headers = response.getheaders()
+                if conditional and response.status == 304:
+                    meta = proxy.refresh(url, meta, self.headers, response_headers)
+                    proxy.count('revalidated')
+                    self._serve_cached(meta)
+                    return
+                
+                new_meta = None if self.command == 'HEAD' else proxy.policy(self.headers, response.status,
+                                                                             response_headers)
+                length = response.getheader('Content-Length')
+                if new_meta and length and length.isdigit() and int(length) > proxy.max_entry:
+                    new_meta = None
+                proxy.count('misses' if new_meta else 'uncacheable')
+                self._send_head(response.status, response.reason, response_headers)
+                entry = proxy.open_entry(url, new_meta, response.status, response.reason,
+                                         response_headers) if new_meta else None
+                try:
+                    entry = self._relay(response, entry)
+                except Exception:
+                    if entry is not None:
+                        AssetCacheProxy.discard_entry(entry)
+                    raise
+                if entry is not None:
+                    proxy.commit_entry(url, entry)
+            finally:
+                conn.close()
+        except OSError as e:
+            try:
+                self.send_error(502, f"Upstream error: {e}")
+            except OSError:
+                pass
+    
+    do_HEAD = do_GET
+    
+    def _forward(self):
+        """POST 等其他方法直接转发，不缓存"""
+        url = self.path
+        if not url.startswith('http://'):
+            self.send_error(400, "Proxy requests must use absolute http:// URLs")
+            return
+        self.close_connection = True
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        try:
+            conn, response = self._open_upstream(self.command, url, self._request_headers(), body)
+            try:
+                self._send_head(response.status, response.reason, response.getheaders())
+                self._relay(response)
+            finally:
+                conn.close()
+        except OSError as e:
+            try:
+                self.send_error(502, f"Upstream error: {e}")
+            except OSError:
+                pass
+    
+    do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = _forward
+    
+    def do_CONNECT(self):
+        """HTTPS：建立到目标（或上游代理）的隧道后双向转发字节"""
+        import socket
+        import selectors
+        self.close_connection = True
+        host, _, port = self.path.rpartition(':')
+        try:
+            upstream = self.proxy.upstream_for(host)
+            if upstream:
+                remote = socket.create_connection(upstream, timeout=self.timeout)
+                remote.sendall(f"CONNECT {self.path} HTTP/1.1\r\nHost: {self.path}\r\n\r\n".encode('ascii'))
+                reply = b''
+                while b'\r\n\r\n' not in reply:
+                    data = remote.recv(4096)
+                    if not data:
+                        break
+                    reply += data
+                if b' 200' not in reply.split(b'\r\n', 1)[0]:
+                    remote.close()
+                    self.send_error(502, "Upstream proxy refused CONNECT")
+                    return
+            else:
+                remote = socket.create_connection((host.strip('[]'), int(port)), timeout=self.timeout)
+        except (OSError, ValueError) as e:
+            self.send_error(502, f"Tunnel error: {e}")
+            return
+        
+        self.proxy.count('tunnels')
+        self.send_response_only(200, 'Connection Established')
+        self.end_headers()
+        selector = selectors.DefaultSelector()
+        selector.register(self.connection, selectors.EVENT_READ, remote)
+        selector.register(remote, selectors.EVENT_READ, self.connection)
+        try:
+            while True:
+                events = selector.select(self.timeout)
+                if not events:
+                    break
+                for key, _ in events:
+                    data = key.fileobj.recv(65536)
+                    if not data:
+                        return
+                    key.data.sendall(data)
+                    if key.fileobj is remote:
+                        self.proxy.count('network_bytes', len(data))
+        except OSError:
+            pass
+        finally:
+            selector.close()
+            remote.close()
+
+
+class DocumentConverter:
+    """文档转换核心类"""
+    
+    def __init__(self, log_callback=None, progress_callback=None, history_path=JobHistory.DEFAULT_PATH,
+                 web_cache_dir=AssetCacheProxy.DEFAULT_DIR):
+        """history_path 为任务历史数据库位置，None 表示不记录；
+        web_cache_dir 为网页转PDF时各浏览器会话共用的资源缓存目录，None 表示不使用缓存代理
+        """
+        self.log = log_callback or print
+        self.tracker = ProgressTracker(progress_callback)
+        self.controller = TaskController()
+        self.preflight = {}
+        self.memory = MemoryGovernor()
+        self.history = None
+        self._job = None
+        self.web_cache_dir = web_cache_dir
+        self._web_proxy = None
+        if history_path:
+            try:
+                self.history = JobHistory(history_path)
+            except Exception as e:
+                self.log(f"⚠️ 任务历史不可用: {e}")
+        self.driver_manager = BrowserDriverManager(self.log)
+        self._check_available_tools()
+    
+    def _check_available_tools(self):
+        """检查可用工具"""
+        self.tools = {
+            'ms_word': False,
+            'ms_excel': False,
+            'wps': False,
+            'libreoffice': False,
+            'chrome': None,
+            'edge': None,
+        }
+        
+        if HAS_WIN32COM:
+            try:
+                word = win32com.client.Dispatch("Word.Application")
+                word.Quit()
+                self.tools['ms_word'] = True
+                self.log("✅ 检测到 Microsoft Word")
+            except:
+                pass
+            
+            try:
+                excel = win32com.client.Dispatch("Excel.Application")
+                excel.Quit()
+                self.tools['ms_excel'] = True
+                self.log("✅ 检测到 Microsoft Excel")
+            except:
+                pass
+            
+            try:
+                wps = win32com.client.Dispatch("KWPS.Application")
+                wps.Quit()
+                self.tools['wps'] = True
+                self.log("✅ 检测到 WPS Office")
+            except:
+                try:
+                    wps = win32com.client.Dispatch("KET.Application")
+                    wps.Quit()
+                    self.tools['wps'] = True
+                except:
+                    pass
+        
+        libreoffice_paths = [
+            r"C:\Program Files\LibreOffice\program\soffice.exe",
+            r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
+        ]
+        for path in libreoffice_paths:
+            if os.path.exists(path):
+                self.tools['libreoffice'] = path
+                self.log("✅ 检测到 LibreOffice")
+                break
+        
+        edge_paths = [
+            r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe",
+            r"C:\Program Files\Microsoft\Edge\Application\msedge.exe",
+        ]
+        for path in edge_paths:
+            if os.path.exists(path):
+                self.tools['edge'] = path
+                self.log("✅ 检测到 Edge 浏览器")
+                break
+        
+        chrome_paths = [
+            r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+            r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+            os.path.expandvars(r"%LOCALAPPDATA%\Google\Chrome\Application\chrome.exe"),
+        ]
+        for path in chrome_paths:
+            if os.path.exists(path):
+                self.tools['chrome'] = path
+                self.log("✅ 检测到 Chrome 浏览器")
+                break
+        
+        if self.driver_manager.get_edge_driver():
+            self.log("✅ Edge驱动已就绪")
+        elif self.tools['edge']:
+            self.log("⚠️ 未找到Edge驱动，网页转换需要下载驱动")
+        
+        if self.driver_manager.get_chrome_driver():
+            self.log("✅ Chrome驱动已就绪")
+        elif self.tools['chrome']:
+            self.log("⚠️ 未找到Chrome驱动")
+    
+    def get_controller(self):
+        return self.controller
+    
+    def get_driver_instructions(self):
+        return self.driver_manager.download_driver_instructions()
+    
+    def _note_backend(self, name):
+        """记录当前任务实际使用的转换后端（Word / WPS / LibreOffice / Edge / Chrome 等）"""
+        if self._job is not None and name not in self._job['backends']:
+            self._job['backends'].append(name)
+    
+    def _file_result(self, path, ok, error=None):
+        """批量循环报告单个文件的结果，原样返回 ok
+        
+        失败且未给出 error 时，取该文件处理期间最后一条错误日志作为原因
+        """
+        job = self._job
+        if job is None:
+            return ok
+        recent = job['messages'][job['seen']:]
+        job['seen'] = len(job['messages'])
+        if not ok:
+            reason = error or (recent[-1] if recent else '转换失败')
+            job['failures'].append(f"{os.path.basename(str(path))}: {reason}")
+        return ok
+    
+    def _record_job(self, operation, inputs, output, params, started, result, job):
+        """任务结束后汇总输入输出字节数、页数与文件类型，更新运行指标并写入任务历史"""
+        duration = time.time() - started
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        inputs = list(inputs or [])
+        
+        # 批量操作已在预检中读取过页数和大小；单文件操作或文件夹输入在此补充探测
+        infos = list(self.preflight.values())
+        rejected = [f"{os.path.basename(info['path'])}: {info['error']}" for info in infos if info['error']]
+        if not infos:
+            files = [p for p in inputs if os.path.isfile(p)]
+            infos = [PreflightProbe().probe(p) for p in files]
+        if infos:
+            usable = [info for info in infos if not info['error']]
+            ok_files = len(usable)
+            pages = sum(info['pages'] for info in usable)
+            input_bytes = sum(info['size'] for info in infos)
+            file_types = ','.join(sorted({Path(info['path']).suffix.lower() or info['kind'] for info in infos}))
+            count = len(infos)
+        else:
+            # 网页等非文件输入：每个输入计为一页
+            pages = count = ok_files = len(inputs)
+            input_bytes = 0
+            file_types = 'url' if inputs and str(inputs[0]).startswith(('http://', 'https://')) else None
+        
+        failures = job['failures'] + rejected
+        if self.controller.should_stop():
+            status = 'stopped'
+        elif not result:
+            status = 'failed'
+        else:
+            status = 'partial' if failures else 'ok'
+        # 整个任务失败时附上错误日志；部分失败只列出失败的文件及原因
+        errors = list(dict.fromkeys(failures + (job['messages'] if status == 'failed' else [])))
+        ok_files = max(ok_files - len(job['failures']), 0)
+        backend = ','.join(job['backends']) or JobHistory.ENGINES.get(operation) or '-'
+        
+        METRICS.inc('docconv_jobs_total', 1, operation, backend, status)
+        METRICS.observe('docconv_job_seconds', duration, operation)
+        if status != 'stopped':
+            # 预检拒绝的文件计为失败；整个任务失败时全部计为失败
+            ok_files = ok_files if result else 0
+            if ok_files:
+                METRICS.inc('docconv_files_total', ok_files, operation, backend, 'ok')
+            if count > ok_files:
+                METRICS.inc('docconv_files_total', count - ok_files, operation, backend, 'failed')
+            if result:
+                METRICS.inc('docconv_pages_total', pages, operation, backend)
+        
+        if self.history is None:
+            return
+        output_bytes = 0
+        if output and os.path.isfile(output):
+            output_bytes = os.path.getsize(output)
+        elif output and os.path.isdir(output):
+            # 只统计本次任务写出的文件
+            for root, dirs, names in os.walk(output):
+                for name in names:
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    if stat.st_mtime >= started:
+                        output_bytes += stat.st_size
+        
+        self.history.record(
+            operation, started, duration, status, params=params, backend=backend,
+            file_types=file_types, inputs=count, input_bytes=input_bytes, output_bytes=output_bytes,
+            pages=pages, error='\n'.join(errors[-10:])[:2000] or None,
+        )
+    
+    def _begin_progress(self, paths):
+        """以预检得到的处理成本（无法估算时用文件大小）为权重开始一个批次的进度统计"""
+        weights = []
+        for path in paths:
+            info = self.preflight.get(path)
+            weights.append(info['cost'] or info['size'] if info else 1)
+        self.tracker.begin_batch(weights)
+    
+    def _preflight(self, paths, category):
+        """批量转换前预检输入文件，返回可转换的文件（保持原顺序），预检结果存入 self.preflight"""
+        if not paths:
+            return paths
+        start = time.time()
+        results = PreflightProbe().probe_many(list(paths))
+        self.preflight = {info['path']: info for info in results}
+        accepts = PreflightProbe.ACCEPTS[category]
+        
+        usable = []
+        for info in results:
+            name = os.path.basename(info['path'])
+            if not info['error'] and info['kind'] not in accepts:
+                info['error'] = f"格式不支持（识别为 {info['kind']}）"
+            if info['error']:
+                self.log(f"  ⛔ 跳过 {name}: {info['error']}")
+                continue
+            if info['warning']:
+                self.log(f"  ⚠️ {name}: {info['warning']}")
+            usable.append(info['path'])
+        
+        METRICS.observe('docconv_stage_seconds', time.time() - start, 'preflight')
+        rejected = len(results) - len(usable)
+        pages = sum(self.preflight[p]['pages'] for p in usable)
+        cost = sum(self.preflight[p]['cost'] for p in usable)
+        self.log(f"🔍 预检 {len(results)} 个文件（{time.time() - start:.1f}秒）："
+                 f"可转换 {len(usable)} 个，约 {pages} 页 / {cost / 1e6:.0f} 百万像素"
+                 + (f"，跳过 {rejected} 个" if rejected else ""))
+        return usable
+    
+    # ==================== 批量文档转PDF ====================
+    @_recorded_job
+    def documents_to_pdf(self, doc_paths, output_folder, resume=False):
+        """批量文档转PDF，resume=True 时跳过上次已完成的文件"""
+        journal = None
+        try:
+            self.controller.is_running = True
+            doc_paths = self._preflight(doc_paths, 'document')
+            self._begin_progress(doc_paths)
+            total = len(doc_paths)
+            success_count = 0
+            skipped = 0
+            
+            self.log(f"🔄 批量转换 {total} 个文档...")
+            os.makedirs(output_folder, exist_ok=True)
+            journal = BatchJournal(output_folder, 'documents_to_pdf', resume=resume)
+            
+            for i, doc_path in enumerate(doc_paths):
+                if not self.controller.check_pause():
+                    break
+                
+                self.tracker.item(i)
+                base_name = Path(doc_path).stem
+                output_path = os.path.join(output_folder, f"{base_name}.pdf")
+                
+                if journal.is_completed(doc_path):
+                    self.tracker.item(i, skipped=True)
+                    skipped += 1
+                    success_count += 1
+                    continue
+                
+                if self._file_result(doc_path, self.document_to_pdf(doc_path, output_path)):
+                    journal.record(doc_path, [output_path])
+                    success_count += 1
+            
+            if not self.controller.should_stop():
+                self.tracker.finish()
+            if skipped:
+                self.log(f"⏭️ 跳过上次已完成的 {skipped} 个文档")
+            self.log(f"✅ 完成！成功 {success_count}/{total}")
+            return success_count > 0
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if journal:
+                journal.close()
+            self.controller.is_running = False
+    
+    @_recorded_job
+    def document_to_pdf(self, doc_path, output_path):
+        """单个文档转PDF"""
+        try:
+            self.log(f"🔄 转换文档: {os.path.basename(doc_path)}")
+            
+            doc_path = os.path.abspath(doc_path)
+            output_path = os.path.abspath(output_path)
+            
+            if self.tools['ms_word'] and HAS_WIN32COM:
+                convert, backend = self._word_to_pdf_msword, 'Microsoft Word'
+            elif self.tools['wps'] and HAS_WIN32COM:
+                convert, backend = self._word_to_pdf_wps, 'WPS'
+            elif self.tools['libreoffice']:
+                convert, backend = self._doc_to_pdf_libreoffice, 'LibreOffice'
+            else:
+                self.log("❌ 未找到可用的转换工具")
+                return False
+            
+            # 先写临时文件，成功后再改名，中途终止不会留下残缺的 PDF
+            start = time.perf_counter()
+            with AtomicOutput(output_path) as out:
+                if not convert(doc_path, out.temp_path):
+                    return False
+                out.commit()
+            METRICS.observe('docconv_stage_seconds', time.perf_counter() - start, 'convert')
+            self._note_backend(backend)
+            self.log(f"✅ PDF保存成功: {output_path}")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+    
+    def _word_to_pdf_msword(self, doc_path, output_path):
+        try:
+            self.log("  使用 Microsoft Word 转换...")
+            
+            word = win32com.client.Dispatch("Word.Application")
+            word.Visible = False
+            word.DisplayAlerts = False
+            
+            try:
+                doc = word.Documents.Open(doc_path)
+                doc.SaveAs(output_path, FileFormat=17)
+                doc.Close()
+                return True
+            finally:
+                word.Quit()
+                
+        except Exception as e:
+            self.log(f"  Word转换失败: {e}")
+            return False
+    
+    def _word_to_pdf_wps(self, doc_path, output_path):
+        try:
+            self.log("  使用 WPS 转换...")
+            
+            try:
+                wps = win32com.client.Dispatch("KWPS.Application")
+            except:
+                wps = win32com.client.Dispatch("KET.Application")
+            
+            wps.Visible = False
+            
+            try:
+                doc = wps.Documents.Open(doc_path)
+                doc.ExportAsFixedFormat(output_path, 17)
+                doc.Close()
+                return True
+            finally:
+                wps.Quit()
+                
+        except Exception as e:
+            self.log(f"  WPS转换失败: {e}")
+            return False
+    
+    def _doc_to_pdf_libreoffice(self, doc_path, output_path):
+        try:
+            self.log("  使用 LibreOffice 转换...")
+            
+            soffice = self.tools['libreoffice']
+            # LibreOffice 按源文件名输出，先输出到同盘的临时子目录，避免直接写到最终位置
+            output_dir = tempfile.mkdtemp(prefix='.lo_', dir=os.path.dirname(output_path))
+            
+            try:
+                cmd = [soffice, '--headless', '--convert-to', 'pdf', '--outdir', output_dir, doc_path]
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+                
+                expected_output = os.path.join(output_dir, Path(doc_path).stem + '.pdf')
+                
+                if os.path.exists(expected_output):
+                    shutil.move(expected_output, output_path)
+                    return True
+                else:
+                    self.log(f"  转换失败: {result.stderr}")
+                    return False
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+                
+        except Exception as e:
+            self.log(f"  LibreOffice转换失败: {e}")
+            return False
+    
+    # ==================== 批量表格转PDF ====================
+    @_recorded_job
+    def spreadsheets_to_pdf(self, file_paths, output_folder, resume=False):
+        """批量表格转PDF，resume=True 时跳过上次已完成的文件"""
+        journal = None
+        try:
+            self.controller.is_running = True
+            file_paths = self._preflight(file_paths, 'spreadsheet')
+            self._begin_progress(file_paths)
+            total = len(file_paths)
+            success_count = 0
+            skipped = 0
+            
+            self.log(f"🔄 批量转换 {total} 个表格...")
+            os.makedirs(output_folder, exist_ok=True)
+            journal = BatchJournal(output_folder, 'spreadsheets_to_pdf', resume=resume)
+            
+            for i, file_path in enumerate(file_paths):
+                if not self.controller.check_pause():
+                    break
+                
+                self.tracker.item(i)
+                base_name = Path(file_path).stem
+                output_path = os.path.join(output_folder, f"{base_name}.pdf")
+                
+                if journal.is_completed(file_path):
+                    self.tracker.item(i, skipped=True)
+                    skipped += 1
+                    success_count += 1
+                    continue
+                
+                if self._file_result(file_path, self.spreadsheet_to_pdf(file_path, output_path)):
+                    journal.record(file_path, [output_path])
+                    success_count += 1
+            
+            if not self.controller.should_stop():
+                self.tracker.finish()
+            if skipped:
+                self.log(f"⏭️ 跳过上次已完成的 {skipped} 个表格")
+            self.log(f"✅ 完成！成功 {success_count}/{total}")
+            return success_count > 0
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if journal:
+                journal.close()
+            self.controller.is_running = False
+    
+    @_recorded_job
+    def spreadsheet_to_pdf(self, file_path, output_path):
+        """单个表格转PDF"""
+        try:
+            self.log(f"🔄 转换表格: {os.path.basename(file_path)}")
+            
+            file_path = os.path.abspath(file_path)
+            output_path = os.path.abspath(output_path)
+            
+            if Path(file_path).suffix.lower() == '.csv':
+                convert, backend = self._csv_to_pdf_native, '内置 CSV'
+            elif self.tools['ms_excel'] and HAS_WIN32COM:
+                convert, backend = self._excel_to_pdf_msexcel, 'Microsoft Excel'
+            elif self.tools['wps'] and HAS_WIN32COM:
+                convert, backend = self._excel_to_pdf_wps, 'WPS'
+            elif self.tools['libreoffice']:
+                convert, backend = self._doc_to_pdf_libreoffice, 'LibreOffice'
+            else:
+                self.log("❌ 未找到可用的转换工具")
+                return False
+            
+            start = time.perf_counter()
+            with AtomicOutput(output_path) as out:
+                if not convert(file_path, out.temp_path):
+                    return False
+                out.commit()
+            METRICS.observe('docconv_stage_seconds', time.perf_counter() - start, 'convert')
+            self._note_backend(backend)
+            self.log(f"✅ PDF保存成功: {output_path}")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+    
+    CSV_SAMPLE_ROWS = 1000
+    
+    @staticmethod
+    def _detect_csv_encoding(file_path):
+        """按 BOM 和前 64KB 内容判断编码：UTF-8 解码失败时按 GB18030（兼容 GBK）处理"""
+        with open(file_path, 'rb') as f:
+            sample = f.read(65536)
+        if sample.startswith(b'\xef\xbb\xbf'):
+            return 'utf-8-sig'
+        if sample.startswith((b'\xff\xfe', b'\xfe\xff')):
+            return 'utf-16'
+        try:
+            sample.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # 样本末尾可能截断在多字节字符中间
+            if e.start < len(sample) - 3:
+                return 'gb18030'
+        return 'utf-8'
+    
+    def _csv_to_pdf_native(self, file_path, output_path):
+        """内置 CSV 渲染：逐行流式读取，按样本行估算列宽，排版为表头重复的分页表格"""
+        try:
+            self.log("  使用内置 CSV 渲染引擎...")
+            encoding = self._detect_csv_encoding(file_path)
+            total_size = os.path.getsize(file_path)
+            start = time.time()
+            last_report = start
+            
+            with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+                try:
+                    dialect = csv.Sniffer().sniff(f.read(65536), delimiters=',;\t|')
+                except csv.Error:
+                    dialect = csv.excel
+                f.seek(0)
+                reader = csv.reader(f, dialect)
+                header = next(reader, [])
+                sample_rows = list(itertools.islice(reader, self.CSV_SAMPLE_ROWS))
+                
+                writer = CsvTablePdfWriter(output_path, header, sample_rows)
+                try:
+                    if len(writer.groups) > 1:
+                        self.log(f"  列数较多（{writer.column_count} 列），每批行分 {len(writer.groups)} 页输出")
+                    for i, row in enumerate(itertools.chain(sample_rows, reader)):
+                        if i % 1000 == 0:
+                            if not self.controller.check_pause():
+                                return False
+                            position = f.buffer.tell()
+                            self.tracker.update(position, total_size, unit=None)
+                            now = time.time()
+                            if now - last_report >= 5:
+                                last_report = now
+                                percent = position * 100 / total_size if total_size else 100
+                                self.log(f"  已处理 {i} 行 ({percent:.0f}%)")
+                        writer.add_row(row)
+                finally:
+                    writer.close()
+            
+            elapsed = max(time.time() - start, 1e-6)
+            self.log(f"  ✓ {writer.row_count} 行，{len(writer.page_ids)} 页，"
+                     f"{writer.row_count / elapsed:.0f} 行/秒")
+            return True
+            
+        except Exception as e:
+            self.log(f"  CSV 渲染失败: {str(e)}")
+            return False
+    
+    def _excel_to_pdf_msexcel(self, file_path, output_path):
+        try:
+            self.log("  使用 Microsoft Excel 转换...")
+            
+            excel = win32com.client.Dispatch("Excel.Application")
+            excel.Visible = False
+            excel.DisplayAlerts = False
+            
+            try:
+                wb = excel.Workbooks.Open(file_path)
+                wb.ExportAsFixedFormat(0, output_path)
+                wb.Close(False)
+                return True
+            finally:
+                excel.Quit()
+                
+        except Exception as e:
+            self.log(f"  Excel转换失败: {e}")
+            return False
+    
+    def _excel_to_pdf_wps(self, file_path, output_path):
+        try:
+            self.log("  使用 WPS 表格转换...")
+            
+            try:
+                et = win32com.client.Dispatch("KET.Application")
+            except:
+                et = win32com.client.Dispatch("ET.Application")
+            
+            et.Visible = False
+            
+            try:
+                wb = et.Workbooks.Open(file_path)
+                wb.ExportAsFixedFormat(0, output_path)
+                wb.Close(False)
+                return True
+            finally:
+                et.Quit()
+                
+        except Exception as e:
+            self.log(f"  WPS转换失败: {e}")
+            return False
+    
+    # ==================== 批量网页转PDF ====================
+    @_recorded_job
+    def urls_to_pdf(self, urls, output_folder):
+        """批量网页转PDF，所有网页的浏览器会话共用一个资源缓存代理"""
+        own_cache = False
+        try:
+            self.controller.is_running = True
+            own_cache = self._start_web_cache()
+            total = len(urls)
+            success_count = 0
+            
+            self.log(f"🔄 批量转换 {total} 个网页...")
+            os.makedirs(output_folder, exist_ok=True)
+            self.tracker.begin_batch([1] * total)
+            
+            for i, url in enumerate(urls):
+                if not self.controller.check_pause():
+                    break
+                
+                self.tracker.item(i)
+                # 从URL生成文件名
+                from urllib.parse import urlparse
+                parsed = urlparse(url)
+                base_name = parsed.netloc.replace('.', '_') + parsed.path.replace('/', '_')
+                base_name = base_name[:50]  # 限制长度
+                if not base_name:
+                    base_name = f"webpage_{i+1}"
+                output_path = os.path.join(output_folder, f"{base_name}.pdf")
+                
+                if self._file_result(url, self.url_to_pdf(url, output_path)):
+                    success_count += 1
+            
+            if not self.controller.should_stop():
+                self.tracker.finish()
+            self.log(f"✅ 完成！成功 {success_count}/{total}")
+            return success_count > 0
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if own_cache:
+                self._stop_web_cache()
+            self.controller.is_running = False
+    
+    @_recorded_job
+    def url_to_pdf(self, url, output_path):
+        """单个网页转PDF"""
+        own_cache = False
+        try:
+            self.log(f"🔄 转换网页: {url}")
+            
+            if not HAS_SELENIUM:
+                self.log("❌ 未安装selenium")
+                return False
+            own_cache = self._start_web_cache()
+            
+            edge_driver = self.driver_manager.get_edge_driver()
+            if edge_driver and self.tools['edge']:
+                result = self._url_to_pdf_with_driver(url, output_path, 'edge', edge_driver)
+                if result:
+                    self._note_backend('Edge')
+                    return True
+            
+            chrome_driver = self.driver_manager.get_chrome_driver()
+            if chrome_driver and self.tools['chrome']:
+                result = self._url_to_pdf_with_driver(url, output_path, 'chrome', chrome_driver)
+                if result:
+                    self._note_backend('Chrome')
+                    return True
+            
+            self.log("  尝试自动下载驱动...")
+            result = self._url_to_pdf_auto_driver(url, output_path)
+            if result:
+                return True
+            
+            self.log("❌ 未找到浏览器驱动")
+            return False
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if own_cache:
+                self._stop_web_cache()
+    
+    def _start_web_cache(self):
+        """启动资源缓存代理；已由外层（批量转换）启动或未启用时返回 False"""
+        if self._web_proxy is not None or not self.web_cache_dir or not HAS_SELENIUM:
+            return False
+        try:
+            self._web_proxy = AssetCacheProxy(self.web_cache_dir).start()
+            return True
+        except Exception as e:
+            self.log(f"⚠️ 资源缓存不可用: {e}")
+            return False
+    
+    def _stop_web_cache(self):
+        proxy, self._web_proxy = self._web_proxy, None
+        proxy.stop()
+        if proxy.stats()['requests']:
+            self.log(proxy.summary())
+    
+    def _add_web_cache_arguments(self, options):
+        if self._web_proxy is not None:
+            for argument in self._web_proxy.browser_arguments():
+                options.add_argument(argument)
+    
+    def _url_to_pdf_with_driver(self, url, output_path, browser, driver_path):
+        driver = None
+        try:
+            self.log(f"  使用 {browser.upper()} 浏览器渲染...")
+            
+            if browser == 'edge':
+                options = EdgeOptions()
+                options.add_argument('--headless=new')
+                options.add_argument('--disable-gpu')
+                options.add_argument('--no-sandbox')
+                options.add_argument('--disable-dev-shm-usage')
+                options.add_argument('--window-size=1920,1080')
+                options.add_argument('--hide-scrollbars')
+                options.add_argument('--disable-extensions')
+                options.add_argument('--disable-infobars')
+                self._add_web_cache_arguments(options)
+                
+                service = EdgeService(executable_path=driver_path)
+                driver = webdriver.Edge(service=service, options=options)
+            else:
+                options = ChromeOptions()
+                options.add_argument('--headless=new')
+                options.add_argument('--disable-gpu')
+                options.add_argument('--no-sandbox')
+                options.add_argument('--disable-dev-shm-usage')
+                options.add_argument('--window-size=1920,1080')
+                options.add_argument('--hide-scrollbars')
+                self._add_web_cache_arguments(options)
+                
+                service = ChromeService(executable_path=driver_path)
+                driver = webdriver.Chrome(service=service, options=options)
+            
+            return self._capture_webpage_to_pdf(driver, url, output_path)
+            
+        except Exception as e:
+            self.log(f"  {browser}转换失败: {e}")
+            return False
+        finally:
+            if driver:
+                try:
+                    driver.quit()
+                except:
+                    pass
+    
+    def _url_to_pdf_auto_driver(self, url, output_path):
+        driver = None
+        try:
+            try:
+                from webdriver_manager.microsoft import EdgeChromiumDriverManager
+                from webdriver_manager.chrome import ChromeDriverManager
+                HAS_MANAGER = True
+            except ImportError:
+                HAS_MANAGER = False
+                self.log("  未安装 webdriver-manager")
+                return False
+            
+            if self.tools['edge']:
+                try:
+                    self.log("  下载Edge驱动...")
+                    options = EdgeOptions()
+                    options.add_argument('--headless=new')
+                    options.add_argument('--disable-gpu')
+                    options.add_argument('--no-sandbox')
+                    options.add_argument('--window-size=1920,1080')
+                    self._add_web_cache_arguments(options)
+                    
+                    service = EdgeService(EdgeChromiumDriverManager().install())
+                    driver = webdriver.Edge(service=service, options=options)
+                    if self._capture_webpage_to_pdf(driver, url, output_path):
+                        self._note_backend('Edge')
+                        return True
+                    return False
+                except Exception as e:
+                    self.log(f"  Edge自动驱动失败: {e}")
+            
+            if self.tools['chrome']:
+                try:
+                    self.log("  下载Chrome驱动...")
+                    options = ChromeOptions()
+                    options.add_argument('--headless=new')
+                    options.add_argument('--disable-gpu')
+                    options.add_argument('--no-sandbox')
+                    options.add_argument('--window-size=1920,1080')
+                    self._add_web_cache_arguments(options)
+                    
+                    service = ChromeService(ChromeDriverManager().install())
+                    driver = webdriver.Chrome(service=service, options=options)
+                    if self._capture_webpage_to_pdf(driver, url, output_path):
+                        self._note_backend('Chrome')
+                        return True
+                    return False
+                except Exception as e:
+                    self.log(f"  Chrome自动驱动失败: {e}")
+            
+            return False
+            
+        except Exception as e:
+            self.log(f"  自动驱动失败: {e}")
+            return False
+        finally:
+            if driver:
+                try:
+                    driver.quit()
+                except:
+                    pass
+    
+    def _capture_webpage_to_pdf(self, driver, url, output_path):
+        try:
+            self.log("  加载网页...")
+            driver.get(url)
+            
+            time.sleep(3)
+            
+            try:
+                WebDriverWait(driver, 15).until(
+                    EC.presence_of_element_located((By.TAG_NAME, "body"))
+                )
+            except:
+                pass
+            
+            self.log("  加载完整内容...")
+            last_height = driver.execute_script("return document.body.scrollHeight")
+            
+            scroll_count = 0
+            while scroll_count < 30:
+                if not self.controller.check_pause():
+                    return False
+                
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                time.sleep(0.5)
+                
+                new_height = driver.execute_script("return document.body.scrollHeight")
+                if new_height == last_height:
+                    break
+                last_height = new_height
+                scroll_count += 1
+            
+            driver.execute_script("window.scrollTo(0, 0);")
+            time.sleep(1)
+            
+            total_height = driver.execute_script("return document.body.scrollHeight")
+            self.log(f"  页面高度: {total_height}px")
+            
+            try:
+                self.log("  生成PDF...")
+                
+                pdf_data = driver.execute_cdp_cmd('Page.printToPDF', {
+                    'landscape': False,
+                    'displayHeaderFooter': False,
+                    'printBackground': True,
+                    'preferCSSPageSize': True,
+                    'scale': 1,
+                    'paperWidth': 8.27,
+                    'paperHeight': 11.69,
+                    'marginTop': 0.4,
+                    'marginBottom': 0.4,
+                    'marginLeft': 0.4,
+                    'marginRight': 0.4,
+                })
+                
+                import base64
+                pdf_bytes = base64.b64decode(pdf_data['data'])
+                
+                with open(output_path, 'wb') as f:
+                    f.write(pdf_bytes)
+                
+                self.log(f"✅ PDF保存成功: {output_path}")
+                return True
+                
+            except Exception as e:
+                self.log(f"  CDP打印失败: {e}")
+                return self._capture_screenshot_to_pdf(driver, output_path, total_height)
+            
+        except Exception as e:
+            self.log(f"  网页捕获失败: {e}")
+            return False
+    
+    def _capture_screenshot_to_pdf(self, driver, output_path, total_height):
+        try:
+            driver.set_window_size(1920, min(total_height + 200, 16000))
+            time.sleep(1)
+            
+            screenshot = driver.get_screenshot_as_png()
+            img = Image.open(BytesIO(screenshot))
+            
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            
+            img.save(output_path, 'PDF', resolution=150)
+            img.close()
+            
+            self.log(f"✅ PDF保存成功: {output_path}")
+            return True
+            
+        except Exception as e:
+            self.log(f"  截图失败: {e}")
+            return False
+    
+    # ==================== 图片转PDF ====================
+    IMAGE_PDF_QUALITY = {
+        'high': {'dpi': 300, 'quality': 90},
+        'medium': {'dpi': 150, 'quality': 80},
+        'low': {'dpi': 72, 'quality': 65},
+    }
+    PAGE_SIZES = {'a4': (595.28, 841.89), 'letter': (612.0, 792.0)}
+    
+    @_recorded_job
+    def images_to_pdf(self, image_paths, output_path, quality='high', page_size=None, max_dpi=None):
+        """图片转PDF：逐张按内容选择编码（照片 JPEG / 线稿 Flate / 黑白 G4 / 纯色调色板），边处理边写盘
+        
+        page_size 为 None 时每页按质量档位的 DPI 取图片原尺寸；为 'a4' / 'letter' 时图片按方向
+        等比缩放居中放入该纸张。图片在页面上的分辨率超过 max_dpi（默认为质量档位的 DPI）时先缩小再编码。
+        """
+        reader = None
+        writer = None
+        try:
+            self.controller.is_running = True
+            image_paths = self._preflight(image_paths, 'image')
+            self._begin_progress(image_paths)
+            total = len(image_paths)
+            self.log(f"🔄 转换 {total} 张图片为PDF...")
+            
+            settings = self.IMAGE_PDF_QUALITY.get(quality, self.IMAGE_PDF_QUALITY['high'])
+            max_dpi = max_dpi or settings['dpi']
+            paper = self.PAGE_SIZES.get(str(page_size).lower()) if page_size else None
+            encoder = AdaptiveImageEncoder(settings['quality'])
+            stats = {kind: [0, 0] for kind in AdaptiveImageEncoder.CLASSES}
+            input_bytes = 0
+            start = time.time()
+            
+            reader = PrefetchReader(image_paths, depth=4)
+            with AtomicOutput(output_path) as out:
+                writer = ImagePdfWriter(out.temp_path)
+                for i, (img_path, data) in enumerate(reader):
+                    if not self.controller.check_pause():
+                        return False
+                    
+                    self.log(f"  处理 {i+1}/{total}: {os.path.basename(img_path)}")
+                    self.tracker.item(i)
+                    input_bytes += len(data) if data else os.path.getsize(img_path)
+                    
+                    with Image.open(BytesIO(data) if data else img_path) as img:
+                        img = self._flatten_for_pdf(img)
+                    kind, gray = encoder.classify(img)
+                    
+                    # 页面尺寸（点）与图片在页面上的位置
+                    w, h = img.size
+                    if paper:
+                        page_w, page_h = paper if (w <= h) == (paper[0] <= paper[1]) else paper[::-1]
+                        scale = min(page_w / w, page_h / h)
+                        placement = ((page_w - w * scale) / 2, (page_h - h * scale) / 2, w * scale, h * scale)
+                    else:
+                        scale = 72 / settings['dpi']
+                        page_w, page_h = w * scale, h * scale
+                        placement = None
+                    
+                    factor = max_dpi / (72 / scale)
+                    if factor < 0.95:
+                        if img.mode == '1':
+                            img = img.convert('L')
+                        img = img.resize((max(1, round(w * factor)), max(1, round(h * factor))), Image.LANCZOS)
+                        data = None
+                    
+                    encoded = encoder.encode(img, kind, gray, source=data)
+                    writer.add_encoded_page(encoded, page_w, page_h, placement)
+                    stats[kind][0] += 1
+                    stats[kind][1] += len(encoded['data'])
+                    img.close()
+                
+                if self.controller.should_stop() or not writer.page_ids:
+                    return False
+                writer.close()
+                writer = None
+                out.commit()
+            
+            self.tracker.finish()
+            self._log_image_pdf_stats(stats, input_bytes, os.path.getsize(output_path), time.time() - start)
+            self.log(f"✅ PDF保存成功: {output_path}")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if writer:
+                writer.f.close()
+            if reader:
+                reader.close()
+            self.controller.is_running = False
+    
+    @staticmethod
+    def _flatten_for_pdf(img):
+        """透明图片铺白底，其余模式统一为 '1' / 'L' / 'RGB'"""
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            img = img.convert('RGBA')
+            bg = Image.new('RGB', img.size, (255, 255, 255))
+            bg.paste(img, mask=img.split()[3])
+            return bg
+        if img.mode in ('1', 'L', 'RGB'):
+            img.load()
+            return img
+        if img.mode in ('I;16', 'I;16B', 'I;16L', 'I'):
+            return img.point(lambda v: v / 256).convert('L')
+        return img.convert('RGB')
+    
+    def _log_image_pdf_stats(self, stats, input_bytes, output_bytes, elapsed):
+        names = {'photo': '照片 JPEG', 'lineart': '线稿/文字 Flate', 'bilevel': '黑白 G4', 'flat': '纯色 调色板'}
+        parts = [f"{names[kind]} {count} 页 {size / 1024 / 1024:.1f} MB"
+                 for kind, (count, size) in stats.items() if count]
+        self.log(f"  📊 {'，'.join(parts)}")
+        ratio = output_bytes / input_bytes if input_bytes else 0
+        self.log(f"  📦 输入 {input_bytes / 1024 / 1024:.1f} MB → 输出 {output_bytes / 1024 / 1024:.1f} MB"
+                 f"（{ratio:.0%}），用时 {elapsed:.1f} 秒")
+    
+    # ==================== 图片转PPT ====================
+    @_recorded_job
+    def images_to_ppt(self, image_paths, output_path, quality='high', dedup='off'):
+        reader = None
+        writer = None
+        try:
+            self.controller.is_running = True
+            image_paths = self._preflight(image_paths, 'image')
+            self._begin_progress(image_paths)
+            total = len(image_paths)
+            self.log(f"🔄 转换 {total} 张图片为PPT...")
             
-            chrome_driver = self.driver_manager.get_chrome_driver()
-            if chrome_driver and self.tools['chrome']:
-                result = self._url_to_pdf_with_driver(url, output_path, 'chrome', chrome_driver)
-                if result:
-                    return True
+            slide_w = Inches(13.333)
+            slide_h = Inches(7.5)
+            out = AtomicOutput(output_path)
+            # 逐张写入 PPTX，不在内存中保留整个演示文稿
+            writer = StreamingPptxWriter(out.temp_path, slide_w, slide_h)
+            reader = PrefetchReader(image_paths, depth=4)
+            previous = {}
+            skipped = 0
             
-            self.log("  尝试自动下载驱动...")
-            result = self._url_to_pdf_auto_driver(url, output_path)
-            if result:
+            for i, (img_path, data) in enumerate(reader):
+                if not self.controller.check_pause():
+                    return False
+                
+                self.log(f"  处理 {i+1}/{total}: {os.path.basename(img_path)}")
+                self.tracker.item(i)
+                
+                if data is None:
+                    with open(img_path, 'rb') as f:
+                        data = f.read()
+                img = Image.open(BytesIO(data))
+                ext = StreamingPptxWriter.IMAGE_FORMATS.get(img.format)
+                
+                if quality != 'high' or img.mode == 'RGBA' or ext is None:
+                    if quality != 'high':
+                        max_size = (1920, 1080) if quality == 'medium' else (1280, 720)
+                        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+                    
+                    if img.mode == 'RGBA':
+                        bg = Image.new('RGB', img.size, (255, 255, 255))
+                        bg.paste(img, mask=img.split()[3])
+                        img = bg
+                    elif img.mode not in ['RGB', 'L']:
+                        img = img.convert('RGB')
+                    
+                    buf = BytesIO()
+                    img.save(buf, 'JPEG', quality=95 if quality == 'high' else 85)
+                    data, ext = buf.getvalue(), 'jpeg'
+                
+                img_w, img_h = img.size
+                digest = hashlib.sha1(data).hexdigest()
+                img.close()
+                if self._repeats_previous(previous, dedup, digest):
+                    skipped += 1
+                    continue
+                
+                img_w_emu = Emu(img_w * 914400 / 96)
+                img_h_emu = Emu(img_h * 914400 / 96)
+                
+                ratio = min(slide_w / img_w_emu, slide_h / img_h_emu) * 0.95
+                new_w = int(img_w_emu * ratio)
+                new_h = int(img_h_emu * ratio)
+                
+                left = (slide_w - new_w) // 2
+                top = (slide_h - new_h) // 2
+                
+                writer.add_picture_slide(data, ext, left, top, new_w, new_h, digest)
+            
+            self._log_dedup_stats(writer, skipped)
+            if not self.controller.should_stop():
+                self.tracker.finish()
+                writer.close()
+                writer = None
+                out.commit()
+                self.log(f"✅ PPT保存成功: {output_path}")
+                return True
+            
+            return False
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if reader:
+                reader.close()
+            if writer:
+                writer.close()
+                out.discard()
+            self.controller.is_running = False
+    
+    # ==================== 批量PDF转PPT ====================
+    @_recorded_job
+    def pdfs_to_ppt(self, pdf_paths, output_folder, dpi=150, color_mode='rgb', resume=False, dedup='off',
+                    max_size=None):
+        """批量PDF转PPT，resume=True 时跳过上次已完成的文件"""
+        journal = None
+        reader = None
+        try:
+            self.controller.is_running = True
+            pdf_paths = self._preflight(pdf_paths, 'pdf')
+            self._begin_progress(pdf_paths)
+            total = len(pdf_paths)
+            success_count = 0
+            skipped = 0
+            
+            self.log(f"🔄 批量转换 {total} 个PDF...")
+            os.makedirs(output_folder, exist_ok=True)
+            journal = BatchJournal(output_folder, 'pdfs_to_ppt',
+                                   {'dpi': dpi, 'color_mode': color_mode, 'dedup': dedup, 'max_size': max_size},
+                                   resume)
+            completed = {p for p in pdf_paths if journal.is_completed(p)}
+            reader = PrefetchReader(pdf_paths, skip=completed.__contains__)
+            
+            for i, (pdf_path, data) in enumerate(reader):
+                if not self.controller.check_pause():
+                    break
+                
+                self.tracker.item(i)
+                base_name = Path(pdf_path).stem
+                output_path = os.path.join(output_folder, f"{base_name}.pptx")
+                
+                if pdf_path in completed:
+                    self.tracker.item(i, skipped=True)
+                    skipped += 1
+                    success_count += 1
+                    continue
+                
+                # 重置控制器状态用于子任务
+                self.controller.is_running = True
+                
+                ok = self._pdf_to_ppt_single(pdf_path, output_path, dpi, i + 1, total, color_mode, data, dedup,
+                                             max_size)
+                if self._file_result(pdf_path, ok):
+                    journal.record(pdf_path, [output_path])
+                    success_count += 1
+            
+            if not self.controller.should_stop():
+                self.tracker.finish()
+            if skipped:
+                self.log(f"⏭️ 跳过上次已完成的 {skipped} 个PDF")
+            self.log(f"✅ 完成！成功 {success_count}/{total}")
+            return success_count > 0
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if reader:
+                reader.close()
+            if journal:
+                journal.close()
+            self.controller.is_running = False
+    
+    def _pdf_to_ppt_single(self, pdf_path, output_path, dpi, current_file, total_files, color_mode='rgb',
+                           data=None, dedup='off', max_size=None):
+        """单个PDF转PPT，data 为预读的文件内容，dedup 见 _repeats_previous，max_size 见 _page_matrix"""
+        pdf_doc = None
+        writer = None
+        page_writer = None
+        out = AtomicOutput(output_path)
+        try:
+            self.log(f"🔄 [{current_file}/{total_files}] 转换: {os.path.basename(pdf_path)}")
+            
+            pdf_doc = fitz.open(stream=data, filetype='pdf') if data else fitz.open(pdf_path)
+            total = len(pdf_doc)
+            
+            # 每渲染一页就写入一页幻灯片，上千页的PDF也不会占满内存
+            writer = StreamingPptxWriter(out.temp_path, Inches(13.333), Inches(7.5))
+            page_writer = AsyncWriter()
+            render_stats = {'pages': 0, 'saved': 0}
+            previous = {}
+            skipped = 0
+            
+            for page_num in range(total):
+                if not self.controller.check_pause():
+                    return False
+                
+                self.log(f"  处理页面 {page_num + 1}/{total}")
+                self.tracker.update(page_num + 1, total)
+                
+                page = pdf_doc[page_num]
+                mat = self._page_matrix(page, dpi, max_size)
+                pix, page_mode = self._render_page(page, mat, color_mode, render_stats, page_writer)
+                if not self._submit_slide(writer, page_writer, pix, page_mode, mat, previous, dedup):
+                    skipped += 1
+                pix = None
+                
+                # MuPDF 的资源缓存会随页数增长，定期清空，让长文档的内存占用保持平稳
+                if page_num % 50 == 49:
+                    fitz.TOOLS.store_shrink(100)
+            
+            page_writer.flush()
+            self._log_render_stats(render_stats)
+            self._log_dedup_stats(writer, skipped)
+            
+            if not self.controller.should_stop():
+                writer.close()
+                writer = None
+                out.commit()
+                self.log(f"✅ PPT保存成功: {output_path}")
                 return True
             
-            self.log("❌ 未找到浏览器驱动")
-            return False
+            return False
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if page_writer:
+                page_writer.close()
+            if pdf_doc:
+                pdf_doc.close()
+            if writer:
+                writer.close()
+                out.discard()
+    
+    def _submit_slide(self, writer, page_writer, pix, page_mode, mat, previous, dedup='off'):
+        """把一页渲染结果编码为 PNG，作为一页幻灯片交给写出线程；重复页被跳过时返回 False"""
+        if page_mode == 'bilevel':
+            buf = BytesIO()
+            self._save_image(self._pixmap_to_image(pix, bilevel=True), buf, 'png')
+            png_data = buf.getvalue()
+        else:
+            png_data = pix.tobytes('png')
+        digest = hashlib.sha1(png_data).hexdigest()
+        if self._repeats_previous(previous, dedup, digest):
+            return False
+        
+        # 按本页实际缩放换算回物理尺寸
+        img_w_emu = Emu(pix.width * 914400 / (mat.a * 72))
+        img_h_emu = Emu(pix.height * 914400 / (mat.a * 72))
+        
+        ratio = min(writer.slide_width / img_w_emu, writer.slide_height / img_h_emu) * 0.95
+        new_w = int(img_w_emu * ratio)
+        new_h = int(img_h_emu * ratio)
+        
+        left = (writer.slide_width - new_w) // 2
+        top = (writer.slide_height - new_h) // 2
+        
+        page_writer.submit(writer.add_picture_slide, png_data, 'png', left, top, new_w, new_h, digest)
+        return True
+    
+    @_recorded_job
+    def pdf_to_ppt(self, pdf_path, output_path, dpi=150, color_mode='rgb', dedup='off', max_size=None):
+        """单个PDF转PPT（保持兼容性）"""
+        try:
+            self.controller.is_running = True
+            self.tracker.begin_batch([1])
+            return self._pdf_to_ppt_single(pdf_path, output_path, dpi, 1, 1, color_mode, dedup=dedup,
+                                           max_size=max_size)
+        finally:
+            self.controller.is_running = False
+    
+    # ==================== 批量PDF转图片 ====================
+    @_recorded_job
+    def pdfs_to_images(self, pdf_paths, output_folder, dpi=200, img_format='png', jpg_quality=95, subsampling=None,
+                       color_mode='rgb', container=None, tiff_compression='tiff_lzw', resume=False, max_size=None):
+        """批量PDF转图片，resume=True 时跳过上次已完成的文件"""
+        journal = None
+        reader = None
+        try:
+            self.controller.is_running = True
+            pdf_paths = self._preflight(pdf_paths, 'pdf')
+            self._begin_progress(pdf_paths)
+            total = len(pdf_paths)
+            success_count = 0
+            skipped = 0
+            
+            self.log(f"🔄 批量转换 {total} 个PDF为图片...")
+            os.makedirs(output_folder, exist_ok=True)
+            journal = BatchJournal(output_folder, 'pdfs_to_images', {
+                'dpi': dpi, 'img_format': img_format, 'jpg_quality': jpg_quality, 'subsampling': subsampling,
+                'color_mode': color_mode, 'container': container, 'tiff_compression': tiff_compression,
+                'max_size': max_size,
+            }, resume)
+            completed = {p for p in pdf_paths if journal.is_completed(p)}
+            # 后台预读下一个PDF，网络盘上读取与当前文件的渲染重叠
+            reader = PrefetchReader(pdf_paths, skip=completed.__contains__)
+            
+            for i, (pdf_path, data) in enumerate(reader):
+                if not self.controller.check_pause():
+                    break
+                
+                self.tracker.item(i)
+                base_name = Path(pdf_path).stem
+                # 容器模式每个PDF只输出一个文件，不再单独建子文件夹
+                pdf_output_folder = output_folder if container else os.path.join(output_folder, base_name)
+                
+                if pdf_path in completed:
+                    self.tracker.item(i, skipped=True)
+                    skipped += 1
+                    success_count += 1
+                    continue
+                
+                self.controller.is_running = True
+                
+                outputs = []
+                ok = self._pdf_to_images_single(pdf_path, pdf_output_folder, dpi, img_format, i + 1, total,
+                                                jpg_quality, subsampling, color_mode, container, tiff_compression,
+                                                outputs, data, max_size)
+                if self._file_result(pdf_path, ok):
+                    journal.record(pdf_path, outputs)
+                    success_count += 1
+            
+            if not self.controller.should_stop():
+                self.tracker.finish()
+            if skipped:
+                self.log(f"⏭️ 跳过上次已完成的 {skipped} 个PDF")
+            self.log(f"✅ 完成！成功 {success_count}/{total}")
+            return success_count > 0
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if reader:
+                reader.close()
+            if journal:
+                journal.close()
+            self.controller.is_running = False
+    
+    def _pdf_to_images_single(self, pdf_path, output_folder, dpi, img_format, current_file, total_files,
+                              jpg_quality=95, subsampling=None, color_mode='rgb', container=None,
+                              tiff_compression='tiff_lzw', outputs=None, data=None, max_size=None):
+        """单个PDF转图片
+        
+        container 为 None 时每页输出一个文件；
+        为 'tiff' / 'zip' / 'cbz' / 'pdf' 时所有页面逐页追加到一个容器文件中。
+        outputs 列表用于收集实际写出的文件路径（供断点续传日志记录）；
+        data 为预读的文件内容，为 None 时按路径打开；max_size 见 _page_matrix
+        """
+        writer = None
+        container_out = None
+        page_writer = None
+        pdf_doc = None
+        
+        def add_container_page(img, page_file, page_rect):
+            writer.add_page(img, page_file, page_rect)
+            img.close()
+        
+        try:
+            self.log(f"🔄 [{current_file}/{total_files}] 转换: {os.path.basename(pdf_path)}")
+            
+            os.makedirs(output_folder, exist_ok=True)
+            
+            pdf_doc = fitz.open(stream=data, filetype='pdf') if data else fitz.open(pdf_path)
+            total = len(pdf_doc)
+            base_name = Path(pdf_path).stem
+            
+            if max_size:
+                self.log(f"  共 {total} 页，目标尺寸: {self._format_size(max_size)} 像素")
+            else:
+                self.log(f"  共 {total} 页，DPI: {dpi}")
+            render_stats = {'pages': 0, 'saved': 0}
+            
+            if container:
+                container_path = os.path.join(output_folder, base_name + ImageContainerWriter.EXTENSIONS[container])
+                container_out = AtomicOutput(container_path)
+                writer = ImageContainerWriter(
+                    container_out.temp_path, container,
+                    lambda img, fp: self._save_image(img, fp, img_format, jpg_quality, subsampling),
+                    img_format, dpi, tiff_compression
+                )
+            
+            # 渲染在当前线程，编码写盘在后台线程，两者重叠执行
+            page_writer = AsyncWriter()
+            
+            for page_num in range(total):
+                if not self.controller.check_pause():
+                    return False
+                
+                self.log(f"  处理页面 {page_num + 1}/{total}")
+                self.tracker.update(page_num + 1, total)
+                
+                page = pdf_doc[page_num]
+                mat = self._page_matrix(page, dpi, max_size)
+                pix, page_mode = self._render_page(page, mat, color_mode, render_stats, page_writer)
+                
+                page_file = f"{base_name}_page_{page_num + 1:03d}.{img_format}"
+                if writer:
+                    # 图片直接引用 pixmap 内存，pixmap 由本线程持有到写出完成
+                    img = self._pixmap_to_image(pix, bilevel=(page_mode == 'bilevel'))
+                    page_writer.submit(add_container_page, img, page_file, page.rect, keep=pix)
+                    img = None
+                else:
+                    page_path = os.path.join(output_folder, page_file)
+                    self._submit_page_image(page_writer, pix, page_mode, page_path,
+                                            img_format, jpg_quality, subsampling)
+                    if outputs is not None:
+                        outputs.append(page_path)
+                pix = None
+            
+            page_writer.flush()
+            self._log_render_stats(render_stats)
+            if writer:
+                writer.close()
+                writer = None
+                container_out.commit()
+                if outputs is not None:
+                    outputs.append(container_out.path)
+                self.log(f"✅ 共 {total} 页保存到: {container_out.path}")
+            else:
+                self.log(f"✅ 共 {total} 张图片保存到: {output_folder}")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if page_writer:
+                page_writer.close()
+            if pdf_doc:
+                pdf_doc.close()
+            if writer:
+                writer.close()
+                container_out.discard()
+    
+    def _submit_page_image(self, page_writer, pix, page_mode, out_path, img_format, jpg_quality=95,
+                           subsampling=None):
+        """把一页渲染结果交给写出线程，保存为单独的图片文件"""
+        if img_format.lower() == 'png' and page_mode != 'bilevel':
+            # PNG 用 MuPDF 自带编码器更快，写盘仍在后台
+            page_writer.submit(self._write_page_file, pix.tobytes('png'), out_path, img_format)
+        else:
+            # 图片直接引用 pixmap 内存，pixmap 由本线程持有到写出完成
+            img = self._pixmap_to_image(pix, bilevel=(page_mode == 'bilevel'))
+            page_writer.submit(self._write_page_file, img, out_path, img_format, jpg_quality, subsampling,
+                               keep=pix)
+    
+    def _write_page_file(self, img, out_path, img_format, jpg_quality=95, subsampling=None):
+        """写出线程中执行：img 为已编码的字节或 PIL 图片"""
+        with AtomicOutput(out_path) as out:
+            if isinstance(img, bytes):
+                with open(out.temp_path, 'wb') as f:
+                    f.write(img)
+            else:
+                self._save_image(img, out.temp_path, img_format, jpg_quality, subsampling)
+                img.close()
+            out.commit()
+    
+    @_recorded_job
+    def pdf_to_images(self, pdf_path, output_folder, dpi=200, img_format='png', jpg_quality=95, subsampling=None,
+                      color_mode='rgb', container=None, tiff_compression='tiff_lzw', max_size=None):
+        """单个PDF转图片（保持兼容性）"""
+        try:
+            self.controller.is_running = True
+            self.tracker.begin_batch([1])
+            return self._pdf_to_images_single(pdf_path, output_folder, dpi, img_format, 1, 1,
+                                              jpg_quality, subsampling, color_mode, container, tiff_compression,
+                                              max_size=max_size)
+        finally:
+            self.controller.is_running = False
+    
+    def _page_matrix(self, page, dpi, max_size=None):
+        """页面渲染矩阵
+        
+        默认所有页面按同一 DPI 缩放；max_size 为 (最大宽, 最大高) 像素（或 "1920x1080"）时
+        按每页自身尺寸计算缩放，使页面刚好放进该范围：A4 与 A0 页面输出相近的像素尺寸
+        """
+        if not max_size:
+            return fitz.Matrix(dpi / 72, dpi / 72)
+        max_w, max_h = self._parse_size(max_size)
+        zoom = min(max_w / page.rect.width, max_h / page.rect.height)
+        return fitz.Matrix(zoom, zoom)
+    
+    @staticmethod
+    def _parse_size(size):
+        if isinstance(size, str):
+            size = size.lower().split('x')
+        return int(size[0]), int(size[1])
+    
+    def _format_size(self, size):
+        return "{}x{}".format(*self._parse_size(size))
+    
+    def _render_page(self, page, matrix, color_mode='rgb', stats=None, page_writer=None):
+        """按颜色模式渲染页面
+        
+        page 可以是 fitz.Page 或已构建的 fitz.DisplayList；
+        color_mode: 'rgb' 彩色 / 'gray' 灰度 / 'bilevel' 黑白 / 'auto' 自动检测
+        像素缓冲计入 self.memory，pixmap 释放时自动归还
+        返回 (pixmap, 实际使用的模式)
+        """
+        if color_mode == 'auto':
+            color_mode = 'rgb' if self._page_has_color(page) else 'gray'
+        
+        channels = 1 if color_mode in ['gray', 'bilevel'] else 3
+        nbytes = self._admit_render(page, matrix, channels, page_writer)
+        start = time.perf_counter()
+        try:
+            if channels == 1:
+                pix = page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY)
+            else:
+                pix = page.get_pixmap(matrix=matrix)
+        except Exception:
+            self.memory.release(nbytes)
+            raise
+        METRICS.observe('docconv_stage_seconds', time.perf_counter() - start, 'render')
+        weakref.finalize(pix, self.memory.release, nbytes)
+        
+        if stats is not None and color_mode != 'rgb':
+            # 相对 RGB 渲染节省的像素缓冲字节数（黑白按 1 bit/像素计算）
+            rgb_bytes = pix.width * pix.height * 3
+            used_bytes = pix.width * pix.height // 8 if color_mode == 'bilevel' else pix.width * pix.height
+            stats['pages'] += 1
+            stats['saved'] += rgb_bytes - used_bytes
+        
+        return pix, color_mode
+    
+    def _admit_render(self, page, matrix, channels, page_writer=None):
+        """渲染前按像素缓冲大小准入
+        
+        超出内存预算时先等写出线程写完排队的页面，让它们持有的 pixmap 释放，
+        然后无论是否仍超出都继续渲染：本线程不能等待自己持有的内存。
+        """
+        rect = page.rect * matrix
+        nbytes = MemoryGovernor.page_bytes(rect.width, rect.height, 72, channels)
+        if not self.memory.try_acquire(nbytes):
+            if page_writer is not None:
+                page_writer.flush()
+            self.memory.charge(nbytes)
+        return nbytes
+    
+    def _page_has_color(self, page, tolerance=24):
+        """以 36 DPI 预渲染，判断页面是否含有彩色内容"""
+        probe = page.get_pixmap(matrix=fitz.Matrix(0.5, 0.5))
+        img = Image.frombuffer('RGB', (probe.width, probe.height), probe.samples_mv,
+                               'raw', 'RGB', probe.stride, 1)
+        r, g, b = img.split()
+        chroma = ImageChops.lighter(
+            ImageChops.lighter(ImageChops.difference(r, g), ImageChops.difference(g, b)),
+            ImageChops.difference(r, b)
+        )
+        # 扫描件纸张偏色、JPEG 噪点不算彩色；超过 0.1% 的像素明显偏色才视为彩色页
+        colored = sum(chroma.histogram()[tolerance + 1:])
+        img.close()
+        return colored > probe.width * probe.height * 0.001
+    
+    def _log_render_stats(self, stats):
+        if stats['pages']:
+            self.log(f"  灰度/黑白页面 {stats['pages']} 页，渲染缓冲节省 {stats['saved'] / 1024 / 1024:.1f} MB")
+    
+    def _repeats_previous(self, previous, dedup, digest):
+        """dedup='skip' 时，编码结果与上一张保留的图片完全相同（如重复的空白分隔页）返回 True，该页不写入
+        
+        只比较已算出的图片摘要，不做近似判断：只差一行文字的页面不会被跳过。
+        完全相同的图片无论 dedup 取何值都由 StreamingPptxWriter 共用同一份数据；
+        previous 为调用方保存的状态字典
+        """
+        if dedup != 'skip':
+            return False
+        if previous.get('digest') == digest:
+            return True
+        previous['digest'] = digest
+        return False
+    
+    def _log_dedup_stats(self, writer, skipped):
+        if writer.shared_count or skipped:
+            self.log(f"  ♻️ {writer.shared_count} 页共用已有图片，跳过与上一页相同的页面 {skipped} 页")
+    
+    def _save_pixmap(self, pix, out_path, img_format, jpg_quality=95, subsampling=None, bilevel=False):
+        """保存渲染结果，JPG/WebP 直接基于 pixmap 缓冲区编码，不再复制 samples"""
+        if img_format.lower() == 'png' and not bilevel:
+            pix.save(out_path)
+            return
+        
+        img = self._pixmap_to_image(pix, bilevel)
+        self._save_image(img, out_path, img_format, jpg_quality, subsampling)
+        img.close()
+    
+    def _pixmap_to_image(self, pix, bilevel=False):
+        """pixmap 转 PIL 图片，黑白模式下二值化为 1 bit"""
+        # frombuffer + samples_mv 只包装 pixmap 内存，不产生拷贝
+        # （PyMuPDF 自带的 JPEG 编码器实测慢约 10 倍，因此仍交给 PIL 编码）
+        mode = {1: 'L', 3: 'RGB', 4: 'RGBA'}[pix.n]
+        img = Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv,
+                               'raw', mode, pix.stride, 1)
+        if bilevel:
+            # 固定阈值二值化为 1 bit，不做抖动，文字边缘更干净
+            img = img.convert('L').point(lambda v: 255 if v >= 128 else 0, '1')
+        return img
+    
+    def _save_image(self, img, out, img_format, jpg_quality=95, subsampling=None):
+        """按输出格式编码图片，out 可以是路径或文件对象"""
+        fmt = img_format.lower()
+        
+        if fmt == 'webp':
+            if img.mode == '1':
+                img = img.convert('L')
+            img.save(out, 'WEBP', quality=jpg_quality, method=4)
+        elif fmt in ['jpg', 'jpeg']:
+            if img.mode == '1':
+                img = img.convert('L')
+            if subsampling:
+                img.save(out, 'JPEG', quality=jpg_quality, subsampling=subsampling)
+            else:
+                img.save(out, 'JPEG', quality=jpg_quality)
+        elif fmt in ['tif', 'tiff']:
+            img.save(out, 'TIFF', compression='group4' if img.mode == '1' else 'tiff_lzw')
+        else:
+            img.save(out, 'PNG')
+    
+    # ==================== PDF多输出（单次解析） ====================
+    @_recorded_job
+    def pdfs_multi_output(self, pdf_paths, output_folder, images=None, ppt=None, thumbnails=None,
+                          extract=False, color_mode='rgb', resume=False):
+        """一次处理同时生成多种输出，每个PDF只打开一次，每页只解析一次
+        
+        images: {'dpi', 'img_format', 'jpg_quality', 'subsampling', 'max_size'}，输出到 <PDF名>/
+        ppt: {'dpi', 'max_size', 'dedup'}，输出 <PDF名>.pptx
+        thumbnails: {'size'}，JPG 缩略图输出到 <PDF名>/thumbnails/
+        extract: 提取内嵌图片到 <PDF名>/images/
+        为 None / False 的输出不生成
+        """
+        journal = None
+        reader = None
+        try:
+            self.controller.is_running = True
+            pdf_paths = self._preflight(pdf_paths, 'pdf')
+            self._begin_progress(pdf_paths)
+            total = len(pdf_paths)
+            success_count = 0
+            skipped = 0
+            
+            self.log(f"🔄 多输出批量处理 {total} 个PDF...")
+            os.makedirs(output_folder, exist_ok=True)
+            journal = BatchJournal(output_folder, 'pdfs_multi_output', {
+                'images': images, 'ppt': ppt, 'thumbnails': thumbnails, 'extract': extract,
+                'color_mode': color_mode,
+            }, resume)
+            completed = {p for p in pdf_paths if journal.is_completed(p)}
+            reader = PrefetchReader(pdf_paths, skip=completed.__contains__)
+            
+            for i, (pdf_path, data) in enumerate(reader):
+                if not self.controller.check_pause():
+                    break
+                
+                self.tracker.item(i)
+                if pdf_path in completed:
+                    self.tracker.item(i, skipped=True)
+                    skipped += 1
+                    success_count += 1
+                    continue
+                
+                self.controller.is_running = True
+                
+                outputs = []
+                ok = self._multi_output_single(pdf_path, output_folder, i + 1, total, images, ppt, thumbnails,
+                                               extract, color_mode, outputs, data)
+                if self._file_result(pdf_path, ok):
+                    journal.record(pdf_path, outputs)
+                    success_count += 1
+            
+            if not self.controller.should_stop():
+                self.tracker.finish()
+            if skipped:
+                self.log(f"⏭️ 跳过上次已完成的 {skipped} 个PDF")
+            self.log(f"✅ 完成！成功 {success_count}/{total}")
+            return success_count > 0
             
         except Exception as e:
             self.log(f"❌ 错误: {str(e)}")
             return False
+        finally:
+            if reader:
+                reader.close()
+            if journal:
+                journal.close()
+            self.controller.is_running = False
     
-    def _url_to_pdf_with_driver(self, url, output_path, browser, driver_path):
-        driver = None
+    def _multi_output_single(self, pdf_path, output_folder, current_file, total_files, images=None, ppt=None,
+                             thumbnails=None, extract=False, color_mode='rgb', outputs=None, data=None):
+        """单个PDF多输出：每页构建一次 DisplayList，所有光栅输出都从它渲染"""
+        pdf_doc = None
+        page_writer = None
+        ppt_writer = None
+        ppt_out = None
+        if outputs is None:
+            outputs = []
         try:
-            self.log(f"  使用 {browser.upper()} 浏览器渲染...")
+            self.log(f"🔄 [{current_file}/{total_files}] 处理: {os.path.basename(pdf_path)}")
             
-            if browser == 'edge':
-                options = EdgeOptions()
-                options.add_argument('--headless=new')
-                options.add_argument('--disable-gpu')
-                options.add_argument('--no-sandbox')
-                options.add_argument('--disable-dev-shm-usage')
-                options.add_argument('--window-size=1920,1080')
-                options.add_argument('--hide-scrollbars')
-                options.add_argument('--disable-extensions')
-                options.add_argument('--disable-infobars')
+            pdf_doc = fitz.open(stream=data, filetype='pdf') if data else fitz.open(pdf_path)
+            total = len(pdf_doc)
+            base_name = Path(pdf_path).stem
+            pdf_folder = os.path.join(output_folder, base_name)
+            
+            names = [name for name, enabled in [('图片', images), ('PPT', ppt), ('缩略图', thumbnails),
+                                                 ('内嵌图片', extract)] if enabled]
+            self.log(f"  共 {total} 页，输出: {'、'.join(names)}")
+            
+            if images:
+                img_format = images.get('img_format', 'png')
+                os.makedirs(pdf_folder, exist_ok=True)
+            if thumbnails:
+                thumb_folder = os.path.join(pdf_folder, 'thumbnails')
+                os.makedirs(thumb_folder, exist_ok=True)
+            if extract:
+                extract_folder = os.path.join(pdf_folder, 'images')
+                os.makedirs(extract_folder, exist_ok=True)
+            if ppt:
+                os.makedirs(output_folder, exist_ok=True)
+                ppt_out = AtomicOutput(os.path.join(output_folder, base_name + '.pptx'))
+                ppt_writer = StreamingPptxWriter(ppt_out.temp_path, Inches(13.333), Inches(7.5))
+            
+            page_writer = AsyncWriter()
+            render_stats = {'pages': 0, 'saved': 0}
+            previous = {}
+            slides_skipped = 0
+            image_count = 0
+            
+            for page_num in range(total):
+                if not self.controller.check_pause():
+                    return False
                 
-                service = EdgeService(executable_path=driver_path)
-                driver = webdriver.Edge(service=service, options=options)
-            else:
-                options = ChromeOptions()
-                options.add_argument('--headless=new')
-                options.add_argument('--disable-gpu')
-                options.add_argument('--no-sandbox')
-                options.add_argument('--disable-dev-shm-usage')
-                options.add_argument('--window-size=1920,1080')
-                options.add_argument('--hide-scrollbars')
+                self.log(f"  处理页面 {page_num + 1}/{total}")
+                self.tracker.update(page_num + 1, total)
                 
-                service = ChromeService(executable_path=driver_path)
-                driver = webdriver.Chrome(service=service, options=options)
+                page = pdf_doc[page_num]
+                # 页面内容只解析、解释一次，之后各种分辨率的渲染都只是回放显示列表
+                dl = page.get_displaylist()
+                page_color = color_mode
+                if color_mode == 'auto' and (images or ppt):
+                    page_color = 'rgb' if self._page_has_color(dl) else 'gray'
+                
+                if images:
+                    mat = self._page_matrix(dl, images.get('dpi', 200), images.get('max_size'))
+                    pix, page_mode = self._render_page(dl, mat, page_color, render_stats, page_writer)
+                    page_path = os.path.join(pdf_folder, f"{base_name}_page_{page_num + 1:03d}.{img_format}")
+                    self._submit_page_image(page_writer, pix, page_mode, page_path, img_format,
+                                            images.get('jpg_quality', 95), images.get('subsampling'))
+                    outputs.append(page_path)
+                
+                if ppt:
+                    mat = self._page_matrix(dl, ppt.get('dpi', 150), ppt.get('max_size'))
+                    # 同时输出图片时渲染统计只记一次
+                    pix, page_mode = self._render_page(dl, mat, page_color, None if images else render_stats,
+                                                       page_writer)
+                    if not self._submit_slide(ppt_writer, page_writer, pix, page_mode, mat, previous,
+                                              ppt.get('dedup', 'off')):
+                        slides_skipped += 1
+                
+                if thumbnails:
+                    size = thumbnails.get('size', 256)
+                    pix = dl.get_pixmap(matrix=self._page_matrix(dl, None, (size, size)))
+                    thumb_path = os.path.join(thumb_folder, f"{base_name}_page_{page_num + 1:03d}.jpg")
+                    self._submit_page_image(page_writer, pix, 'rgb', thumb_path, 'jpg', 85)
+                    outputs.append(thumb_path)
+                
+                if extract:
+                    for img_idx, img in enumerate(page.get_images(full=True)):
+                        try:
+                            base_image = pdf_doc.extract_image(img[0])
+                        except:
+                            continue
+                        image_count += 1
+                        out_path = os.path.join(extract_folder,
+                                                f"image_page{page_num + 1}_{img_idx + 1}.{base_image['ext']}")
+                        page_writer.submit(self._write_page_file, base_image["image"], out_path, base_image['ext'])
+                        outputs.append(out_path)
+                
+                pix = dl = None
+                if page_num % 50 == 49:
+                    fitz.TOOLS.store_shrink(100)
             
-            return self._capture_webpage_to_pdf(driver, url, output_path)
+            page_writer.flush()
+            self._log_render_stats(render_stats)
+            if ppt_writer:
+                self._log_dedup_stats(ppt_writer, slides_skipped)
+                ppt_writer.close()
+                ppt_writer = None
+                ppt_out.commit()
+                outputs.append(ppt_out.path)
+            if extract:
+                self.log(f"  共提取 {image_count} 张内嵌图片")
+            self.log(f"✅ 共生成 {len(outputs)} 个文件")
+            return True
             
         except Exception as e:
-            self.log(f"  {browser}转换失败: {e}")
+            self.log(f"❌ 错误: {str(e)}")
             return False
         finally:
-            if driver:
-                try:
-                    driver.quit()
-                except:
-                    pass
+            if page_writer:
+                page_writer.close()
+            if pdf_doc:
+                pdf_doc.close()
+            if ppt_writer:
+                ppt_writer.close()
+                ppt_out.discard()
     
-    def _url_to_pdf_auto_driver(self, url, output_path):
-        driver = None
+    # ==================== 批量提取PDF图片 ====================
+    @_recorded_job
+    def extract_images_from_pdfs(self, pdf_paths, output_folder):
+        """批量提取PDF中的图片"""
+        reader = None
         try:
-            try:
-                from webdriver_manager.microsoft import EdgeChromiumDriverManager
-                from webdriver_manager.chrome import ChromeDriverManager
-                HAS_MANAGER = True
-            except ImportError:
-                HAS_MANAGER = False
-                self.log("  未安装 webdriver-manager")
-                return False
+            self.controller.is_running = True
+            pdf_paths = self._preflight(pdf_paths, 'pdf')
+            self._begin_progress(pdf_paths)
+            total = len(pdf_paths)
+            success_count = 0
             
-            if self.tools['edge']:
-                try:
-                    self.log("  下载Edge驱动...")
-                    options = EdgeOptions()
-                    options.add_argument('--headless=new')
-                    options.add_argument('--disable-gpu')
-                    options.add_argument('--no-sandbox')
-                    options.add_argument('--window-size=1920,1080')
-                    
-                    service = EdgeService(EdgeChromiumDriverManager().install())
-                    driver = webdriver.Edge(service=service, options=options)
-                    return self._capture_webpage_to_pdf(driver, url, output_path)
-                except Exception as e:
-                    self.log(f"  Edge自动驱动失败: {e}")
+            self.log(f"🔄 批量提取 {total} 个PDF中的图片...")
+            os.makedirs(output_folder, exist_ok=True)
+            reader = PrefetchReader(pdf_paths)
             
-            if self.tools['chrome']:
-                try:
-                    self.log("  下载Chrome驱动...")
-                    options = ChromeOptions()
-                    options.add_argument('--headless=new')
-                    options.add_argument('--disable-gpu')
-                    options.add_argument('--no-sandbox')
-                    options.add_argument('--window-size=1920,1080')
-                    
-                    service = ChromeService(ChromeDriverManager().install())
-                    driver = webdriver.Chrome(service=service, options=options)
-                    return self._capture_webpage_to_pdf(driver, url, output_path)
-                except Exception as e:
-                    self.log(f"  Chrome自动驱动失败: {e}")
+            for i, (pdf_path, data) in enumerate(reader):
+                if not self.controller.check_pause():
+                    break
+                
+                self.tracker.item(i)
+                base_name = Path(pdf_path).stem
+                pdf_output_folder = os.path.join(output_folder, base_name)
+                
+                self.controller.is_running = True
+                
+                if self._file_result(pdf_path, self._extract_images_single(pdf_path, pdf_output_folder, i + 1, total,
+                                                                           data)):
+                    success_count += 1
             
-            return False
+            if not self.controller.should_stop():
+                self.tracker.finish()
+            self.log(f"✅ 完成！成功 {success_count}/{total}")
+            return success_count > 0
             
         except Exception as e:
-            self.log(f"  自动驱动失败: {e}")
+            self.log(f"❌ 错误: {str(e)}")
             return False
         finally:
-            if driver:
-                try:
-                    driver.quit()
-                except:
-                    pass
+            if reader:
+                reader.close()
+            self.controller.is_running = False
     
-    def _capture_webpage_to_pdf(self, driver, url, output_path):
+    def _extract_images_single(self, pdf_path, output_folder, current_file, total_files, data=None):
+        """单个PDF提取图片，data 为预读的文件内容"""
+        page_writer = None
+        pdf_doc = None
+        
+        def write_image(out_path, image_bytes):
+            # 单张图片写入失败不影响其余图片
+            try:
+                with AtomicOutput(out_path) as out:
+                    with open(out.temp_path, "wb") as f:
+                        f.write(image_bytes)
+                    out.commit()
+            except OSError as e:
+                self.log(f"    ⚠️ 保存失败: {os.path.basename(out_path)}: {e}")
+                self._file_result(out_path, False, f"保存失败: {e}")
+        
         try:
-            self.log("  加载网页...")
-            driver.get(url)
-            
-            time.sleep(3)
+            self.log(f"🔄 [{current_file}/{total_files}] 提取: {os.path.basename(pdf_path)}")
             
-            try:
-                WebDriverWait(driver, 15).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "body"))
-                )
-            except:
-                pass
+            os.makedirs(output_folder, exist_ok=True)
             
-            self.log("  加载完整内容...")
-            last_height = driver.execute_script("return document.body.scrollHeight")
+            pdf_doc = fitz.open(stream=data, filetype='pdf') if data else fitz.open(pdf_path)
+            total = len(pdf_doc)
+            image_count = 0
+            page_writer = AsyncWriter()
             
-            scroll_count = 0
-            while scroll_count < 30:
+            for page_num in range(total):
                 if not self.controller.check_pause():
                     return False
                 
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(0.5)
+                page = pdf_doc[page_num]
+                image_list = page.get_images(full=True)
                 
-                new_height = driver.execute_script("return document.body.scrollHeight")
-                if new_height == last_height:
-                    break
-                last_height = new_height
-                scroll_count += 1
+                self.log(f"  页面 {page_num + 1}: {len(image_list)} 张图片")
+                self.tracker.update(page_num + 1, total)
+                
+                for img_idx, img in enumerate(image_list):
+                    try:
+                        xref = img[0]
+                        base_image = pdf_doc.extract_image(xref)
+                        image_bytes = base_image["image"]
+                        image_ext = base_image["ext"]
+                    except:
+                        continue
+                    
+                    image_count += 1
+                    out_path = os.path.join(output_folder, f"image_page{page_num + 1}_{img_idx + 1}.{image_ext}")
+                    page_writer.submit(write_image, out_path, image_bytes)
             
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(1)
+            page_writer.flush()
             
-            total_height = driver.execute_script("return document.body.scrollHeight")
-            self.log(f"  页面高度: {total_height}px")
+            if image_count == 0:
+                self.log("⚠️ PDF中没有找到图片")
+            else:
+                self.log(f"✅ 共提取 {image_count} 张图片")
             
-            try:
-                self.log("  生成PDF...")
-                
-                pdf_data = driver.execute_cdp_cmd('Page.printToPDF', {
-                    'landscape': False,
-                    'displayHeaderFooter': False,
-                    'printBackground': True,
-                    'preferCSSPageSize': True,
-                    'scale': 1,
-                    'paperWidth': 8.27,
-                    'paperHeight': 11.69,
-                    'marginTop': 0.4,
-                    'marginBottom': 0.4,
-                    'marginLeft': 0.4,
-                    'marginRight': 0.4,
-                })
-                
-                import base64
-                pdf_bytes = base64.b64decode(pdf_data['data'])
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if page_writer:
+                page_writer.close()
+            if pdf_doc:
+                pdf_doc.close()
+    
+    @_recorded_job
+    def extract_images_from_pdf(self, pdf_path, output_folder):
+        """单个PDF提取图片（保持兼容性）"""
+        try:
+            self.controller.is_running = True
+            return self._extract_images_single(pdf_path, output_folder, 1, 1)
+        finally:
+            self.controller.is_running = False
+    
+    # ==================== 批量PDF压缩优化 ====================
+    @_recorded_job
+    def pdfs_optimize(self, pdf_paths, output_folder, image_dpi=150, jpg_quality=75, workers=None, resume=False):
+        """批量压缩 PDF：超过 image_dpi × 1.5 的图片降采样到 image_dpi 并重新压缩，子集化字体，
+        合并重复对象、清理无用对象、压缩所有流。多个文件在进程池中并行处理。
+        """
+        journal = None
+        pool = None
+        try:
+            self.controller.is_running = True
+            pdf_paths = self._preflight(pdf_paths, 'pdf')
+            total = len(pdf_paths)
+            success_count = 0
+            
+            self.log(f"🔄 批量压缩 {total} 个PDF（图片 {image_dpi} DPI，JPEG 质量 {jpg_quality}）...")
+            os.makedirs(output_folder, exist_ok=True)
+            journal = BatchJournal(output_folder, 'pdfs_optimize',
+                                   {'image_dpi': image_dpi, 'jpg_quality': jpg_quality}, resume)
+            output_paths = self._optimize_output_paths(pdf_paths, output_folder)
+            todo = [p for p in pdf_paths if not journal.is_completed(p)]
+            if len(todo) < total:
+                self.log(f"⏭️ 跳过上次已完成的 {total - len(todo)} 个PDF")
+                success_count += total - len(todo)
+            self.tracker.begin_batch([1] * len(todo))
+            
+            workers = max(1, min(workers or os.cpu_count() or 1, len(todo) or 1))
+            pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+            pending = {}
+            queued = list(todo)
+            before_total = after_total = finished = 0
+            
+            while queued or pending:
+                # 暂停时不再提交新文件，已在处理的文件继续完成
+                while queued and len(pending) < workers:
+                    if not self.controller.check_pause():
+                        queued = []
+                        break
+                    pdf_path = queued.pop(0)
+                    args = (pdf_path, output_paths[pdf_path], image_dpi, jpg_quality)
+                    if pool:
+                        future = pool.submit(self._optimize_pdf_file, *args)
+                    else:
+                        # 单进程时直接执行，结果包装为已完成的 Future
+                        future = concurrent.futures.Future()
+                        future.set_result(self._optimize_pdf_file(*args))
+                    pending[future] = pdf_path
+                if not pending:
+                    break
                 
-                with open(output_path, 'wb') as f:
-                    f.write(pdf_bytes)
+                done = next(iter(concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)[0]))
+                pdf_path = pending.pop(done)
+                result = done.result()
                 
-                self.log(f"✅ PDF保存成功: {output_path}")
-                return True
+                finished += 1
+                self.tracker.item(finished)
+                name = os.path.basename(pdf_path)
+                if result['error']:
+                    self.log(f"  ❌ {name}: {result['error']}")
+                    self._file_result(pdf_path, False, result['error'])
+                    continue
+                before_total += result['before']
+                after_total += result['after']
+                note = "（已是最优，保留原文件）" if result['kept_original'] else ""
+                self.log(f"  ✓ {name}: {result['before'] / 1024 / 1024:.1f} MB → "
+                         f"{result['after'] / 1024 / 1024:.1f} MB（{self._size_change(result)}），"
+                         f"{result['seconds']:.1f} 秒{note}")
+                journal.record(pdf_path, [result['output']])
+                success_count += 1
+            
+            if not self.controller.should_stop():
+                self.tracker.finish()
+            if before_total:
+                saved = 1 - after_total / before_total
+                self.log(f"📦 合计 {before_total / 1024 / 1024:.1f} MB → {after_total / 1024 / 1024:.1f} MB"
+                         f"（减少 {saved:.0%}）")
+            self.log(f"✅ 完成！成功 {success_count}/{total}")
+            return success_count > 0
+            
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}")
+            return False
+        finally:
+            if pool:
+                pool.shutdown(wait=True, cancel_futures=True)
+            if journal:
+                journal.close()
+            self.controller.is_running = False
+    
+    @staticmethod
+    def _size_change(result):
+        if not result['before']:
+            return "-"
+        return f"{result['after'] / result['before'] - 1:+.0%}"
+    
+    @staticmethod
+    def _image_rewrite_options(image_dpi, jpg_quality):
+        """图片重写参数：有损图片（JPEG）按 JPEG 重新压缩，无损图片（线稿、图表）降采样后仍无损存储，
+        黑白图片用 CCITT G4 并保留两倍分辨率；只在结果更小时替换"""
+        mupdf = fitz.mupdf
+        options = mupdf.PdfImageRewriterOptions()
+        threshold = int(image_dpi * 1.5)
+        for kind in ('color', 'gray'):
+            setattr(options, f'{kind}_lossy_image_recompress_method', mupdf.FZ_RECOMPRESS_JPEG)
+            setattr(options, f'{kind}_lossy_image_recompress_quality', str(jpg_quality))
+            setattr(options, f'{kind}_lossless_image_recompress_method', mupdf.FZ_RECOMPRESS_LOSSLESS)
+            for lossiness in ('lossy', 'lossless'):
+                setattr(options, f'{kind}_{lossiness}_image_subsample_method', mupdf.FZ_SUBSAMPLE_AVERAGE)
+                setattr(options, f'{kind}_{lossiness}_image_subsample_threshold', threshold)
+                setattr(options, f'{kind}_{lossiness}_image_subsample_to', image_dpi)
+        options.bitonal_image_recompress_method = mupdf.FZ_RECOMPRESS_FAX
+        options.bitonal_image_subsample_method = mupdf.FZ_SUBSAMPLE_AVERAGE
+        options.bitonal_image_subsample_threshold = threshold * 2
+        options.bitonal_image_subsample_to = image_dpi * 2
+        if hasattr(options, 'recompress_when'):
+            options.recompress_when = mupdf.FZ_RECOMPRESS_WHEN_SMALLER
+        return options
+    
+    @staticmethod
+    def _optimize_output_paths(pdf_paths, output_folder):
+        """为每个输入分配输出路径：沿用原文件名，同名时依次加 _1、_2 后缀，且不覆盖任何输入文件"""
+        key = lambda path: os.path.normcase(os.path.abspath(path))
+        used = {key(p) for p in pdf_paths}
+        outputs = {}
+        for pdf_path in pdf_paths:
+            stem = Path(pdf_path).stem
+            output_path = os.path.join(output_folder, Path(pdf_path).name)
+            if key(output_path) == key(pdf_path):
+                stem = f"{stem}_optimized"
+                output_path = os.path.join(output_folder, f"{stem}.pdf")
+            n = 0
+            while key(output_path) in used:
+                n += 1
+                output_path = os.path.join(output_folder, f"{stem}_{n}.pdf")
+            used.add(key(output_path))
+            outputs[pdf_path] = output_path
+        return outputs
+    
+    @staticmethod
+    def _optimize_pdf_file(pdf_path, output_path, image_dpi, jpg_quality):
+        """在工作进程中压缩单个 PDF，返回前后大小等结果（不调用 self.log，可跨进程执行）"""
+        start = time.time()
+        result = {'output': output_path, 'before': 0, 'after': 0, 'kept_original': False,
+                  'linear': False, 'error': None, 'seconds': 0}
+        try:
+            result['before'] = os.path.getsize(pdf_path)
+            with AtomicOutput(output_path) as out:
+                with fitz.open(pdf_path) as doc:
+                    if doc.needs_pass:
+                        raise ValueError("PDF 已加密")
+                    if image_dpi and hasattr(doc, 'rewrite_images'):
+                        doc.rewrite_images(options=DocumentConverter._image_rewrite_options(image_dpi, jpg_quality))
+                    try:
+                        doc.subset_fonts()
+                    except Exception:
+                        pass
+                    save_options = {'garbage': 4, 'clean': True, 'deflate': True,
+                                    'deflate_images': True, 'deflate_fonts': True}
+                    try:
+                        # 线性化（快速网页浏览）；新版 MuPDF 已不再支持，改用对象流进一步压缩
+                        doc.save(out.temp_path, linear=True, **save_options)
+                        result['linear'] = True
+                    except Exception:
+                        doc.save(out.temp_path, use_objstms=1, **save_options)
                 
-            except Exception as e:
-                self.log(f"  CDP打印失败: {e}")
-                return self._capture_screenshot_to_pdf(driver, output_path, total_height)
+                if os.path.getsize(out.temp_path) >= result['before']:
+                    shutil.copyfile(pdf_path, out.temp_path)
+                    result['kept_original'] = True
+                result['after'] = os.path.getsize(out.temp_path)
+                out.commit()
+        except Exception as e:
+            result['error'] = str(e)
+        result['seconds'] = time.time() - start
+        return result
+    
+    # ==================== PDF合并与拆分 ====================
+    MERGE_FLUSH_PAGES = 500    # 合并时每累计这么多页增量写盘一次，并重新打开输出文档释放内存
+    
+    @_recorded_job
+    def pdfs_merge(self, pdf_paths, output_path, bookmarks=True):
+        """按列表顺序把多个 PDF 合并为一个，直接复制页面对象，不重新渲染
+        
+        bookmarks=True 时每个源文件生成一个一级书签，源文件原有书签降一级挂在其下。
+        输出文档每累计 MERGE_FLUSH_PAGES 页就增量保存并重新打开，上千个文件合并时内存不随页数增长。
+        """
+        out = None
+        try:
+            self.controller.is_running = True
+            pdf_paths = self._preflight(pdf_paths, 'pdf')
+            if not pdf_paths:
+                self.log("❌ 没有可合并的PDF")
+                return False
+            total = len(pdf_paths)
+            self.tracker.begin_batch([self.preflight[p]['pages'] or 1 for p in pdf_paths])
+            self.log(f"🔄 合并 {total} 个PDF...")
+            start = time.time()
+            
+            with AtomicOutput(output_path) as atomic:
+                out = fitz.open()
+                toc = []
+                unflushed = 0
+                saved = False
+                for i, pdf_path in enumerate(pdf_paths):
+                    if not self.controller.check_pause():
+                        self.log("⏹️ 已终止，未生成合并文件")
+                        return False
+                    self.tracker.item(i)
+                    
+                    first_page = out.page_count + 1
+                    with fitz.open(pdf_path) as src:
+                        out.insert_pdf(src)
+                        unflushed += src.page_count
+                        if bookmarks:
+                            toc.append([1, Path(pdf_path).stem, first_page])
+                            # 外部链接等无页码的书签被去掉后，子书签的级别按 _slice_toc 上提，保持层级连续
+                            toc.extend([level + 1, title, page + first_page - 1] for level, title, page
+                                       in self._slice_toc(src.get_toc(), 0, src.page_count - 1))
+                    
+                    if unflushed >= self.MERGE_FLUSH_PAGES and i < total - 1:
+                        # 首次完整保存，之后只追加新增对象
+                        if saved:
+                            out.saveIncr()
+                        else:
+                            out.save(atomic.temp_path)
+                            saved = True
+                        out.close()
+                        out = fitz.open(atomic.temp_path)
+                        unflushed = 0
+                
+                if bookmarks:
+                    out.set_toc(toc)
+                if saved:
+                    out.saveIncr()
+                else:
+                    out.save(atomic.temp_path, garbage=3, deflate=True)
+                pages = out.page_count
+                out.close()
+                out = None
+                atomic.commit()
+            
+            self.tracker.finish()
+            elapsed = time.time() - start
+            self.log(f"✅ 已合并 {total} 个文件，共 {pages} 页（{elapsed:.1f} 秒，{pages / max(elapsed, 1e-6):.0f} 页/秒）")
+            self.log(f"📁 {output_path}")
+            return True
             
         except Exception as e:
-            self.log(f"  网页捕获失败: {e}")
+            self.log(f"❌ 错误: {str(e)}")
             return False
+        finally:
+            if out is not None:
+                out.close()
+            self.controller.is_running = False
     
-    def _capture_screenshot_to_pdf(self, driver, output_path, total_height):
+    @_recorded_job
+    def pdfs_split(self, pdf_paths, output_folder, pages_per_file=None, max_mb=None, bookmark_level=None,
+                   resume=False):
+        """批量拆分 PDF，三种方式任选其一：
+        
+        pages_per_file：每 N 页一个文件；
+        max_mb：按体积上限，依据各页引用对象的实际字节数估算，共享的字体、图片在同一分卷只计一次；
+        bookmark_level：在该级别及以上的书签处切分，文件名带书签标题。
+        只复制页面对象，不重新渲染；各分卷保留落在其页码范围内的书签。
+        """
+        journal = None
         try:
-            driver.set_window_size(1920, min(total_height + 200, 16000))
-            time.sleep(1)
-            
-            screenshot = driver.get_screenshot_as_png()
-            img = Image.open(BytesIO(screenshot))
+            self.controller.is_running = True
+            if sum(x is not None for x in (pages_per_file, max_mb, bookmark_level)) != 1:
+                self.log("❌ 请指定一种拆分方式：每份页数、体积上限或书签级别")
+                return False
+            pdf_paths = self._preflight(pdf_paths, 'pdf')
+            total = len(pdf_paths)
+            success_count = 0
+            skipped = 0
             
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
+            self.log(f"🔄 拆分 {total} 个PDF...")
+            os.makedirs(output_folder, exist_ok=True)
+            journal = BatchJournal(output_folder, 'pdfs_split', {
+                'pages_per_file': pages_per_file, 'max_mb': max_mb, 'bookmark_level': bookmark_level,
+            }, resume)
+            stems = self._unique_stems(pdf_paths)
+            self.tracker.begin_batch([self.preflight[p]['pages'] or 1 for p in pdf_paths])
             
-            img.save(output_path, 'PDF', resolution=150)
-            img.close()
+            for i, pdf_path in enumerate(pdf_paths):
+                if not self.controller.check_pause():
+                    break
+                
+                self.tracker.item(i)
+                if journal.is_completed(pdf_path):
+                    self.tracker.item(i, skipped=True)
+                    skipped += 1
+                    success_count += 1
+                    continue
+                
+                outputs = self._split_pdf_file(pdf_path, output_folder, pages_per_file, max_mb, bookmark_level,
+                                               stems[pdf_path])
+                if self._file_result(pdf_path, outputs):
+                    journal.record(pdf_path, outputs)
+                    success_count += 1
             
-            self.log(f"✅ PDF保存成功: {output_path}")
-            return True
+            if not self.controller.should_stop():
+                self.tracker.finish()
+            if skipped:
+                self.log(f"⏭️ 跳过上次已完成的 {skipped} 个PDF")
+            self.log(f"✅ 完成！成功 {success_count}/{total}")
+            return success_count > 0
             
         except Exception as e:
-            self.log(f"  截图失败: {e}")
+            self.log(f"❌ 错误: {str(e)}")
             return False
+        finally:
+            if journal:
+                journal.close()
+            self.controller.is_running = False
     
-    # ==================== 图片转PDF ====================
-    def images_to_pdf(self, image_paths, output_path, quality='high'):
+    @staticmethod
+    def _unique_stems(pdf_paths):
+        """为每个输入分配分卷文件名前缀：沿用原文件名，不同文件夹中的同名文件依次加 _1、_2 后缀"""
+        used = set()
+        stems = {}
+        for pdf_path in pdf_paths:
+            if pdf_path in stems:
+                continue
+            stem = candidate = Path(pdf_path).stem
+            n = 0
+            # Windows 文件名不区分大小写
+            while candidate.lower() in used:
+                n += 1
+                candidate = f"{stem}_{n}"
+            used.add(candidate.lower())
+            stems[pdf_path] = candidate
+        return stems
+    
+    def _split_pdf_file(self, pdf_path, output_folder, pages_per_file, max_mb, bookmark_level, stem=None):
+        """拆分单个 PDF，返回生成的分卷路径列表，失败返回 None；stem 为分卷文件名前缀（默认为原文件名）"""
+        name = os.path.basename(pdf_path)
+        stem = stem or Path(pdf_path).stem
+        try:
+            start = time.time()
+            with fitz.open(pdf_path) as doc:
+                if pages_per_file:
+                    ranges = [(first, min(first + pages_per_file, doc.page_count) - 1, None)
+                              for first in range(0, doc.page_count, pages_per_file)]
+                elif max_mb:
+                    ranges = self._split_ranges_by_size(doc, max_mb * 1024 * 1024)
+                else:
+                    ranges = self._split_ranges_by_bookmark(doc, bookmark_level)
+                
+                toc = doc.get_toc()
+                outputs = []
+                for index, (first, last, title) in enumerate(ranges, 1):
+                    if not self.controller.check_pause():
+                        return None
+                    self.tracker.update(last + 1, doc.page_count)
+                    if title:
+                        safe_title = re.sub(r'[\\/:*?"<>|\s]+', '_', title).strip('_')[:40]
+                        part_name = f"{stem}_{index:03d}_{safe_title}.pdf" if safe_title else f"{stem}_{index:03d}.pdf"
+                    else:
+                        part_name = f"{stem}_part{index:03d}.pdf"
+                    part_path = os.path.join(output_folder, part_name)
+                    
+                    with AtomicOutput(part_path) as atomic:
+                        with fitz.open() as part:
+                            part.insert_pdf(doc, from_page=first, to_page=last)
+                            part_toc = self._slice_toc(toc, first, last)
+                            if part_toc:
+                                part.set_toc(part_toc)
+                            part.save(atomic.temp_path, garbage=3, deflate=True)
+                        atomic.commit()
+                    outputs.append(part_path)
+                    
+                    if max_mb and last > first and os.path.getsize(part_path) > max_mb * 1024 * 1024:
+                        self.log(f"  ⚠️ {part_name} 超出体积上限（{os.path.getsize(part_path) / 1024 / 1024:.1f} MB）")
+            
+            self.log(f"  ✓ {name}: {len(outputs)} 个分卷（{time.time() - start:.1f} 秒）")
+            return outputs
+        except Exception as e:
+            self.log(f"  ❌ {name}: {e}")
+            return None
+    
+    @staticmethod
+    def _slice_toc(toc, first, last):
+        """截取页码落在 [first, last]（从 0 开始）内的书签，页码改为分卷内的页码，级别按需上提保持层级连续"""
+        sliced = []
+        prev_level = 0
+        for level, title, page in toc:
+            if first <= page - 1 <= last:
+                level = min(level, prev_level + 1)
+                sliced.append([level, title, page - first])
+                prev_level = level
+        return sliced
+    
+    @staticmethod
+    def _split_ranges_by_bookmark(doc, bookmark_level):
+        """在 bookmark_level 及以上级别的书签所在页切分，第一个书签之前的页单独成卷"""
+        starts = {}
+        for level, title, page in doc.get_toc():
+            if level <= bookmark_level and 1 <= page <= doc.page_count:
+                starts.setdefault(page - 1, title)
+        if 0 not in starts:
+            starts[0] = None
+        firsts = sorted(starts)
+        return [(first, (firsts[k + 1] if k + 1 < len(firsts) else doc.page_count) - 1, starts[first])
+                for k, first in enumerate(firsts)]
+    
+    @staticmethod
+    def _split_ranges_by_size(doc, budget):
+        """按体积上限分组页面：每页的成本为其引用的对象（内容流、字体、图片、书签等）中当前分卷尚未包含部分的字节数"""
+        sizes, refs = {}, {}
+        
+        def object_size(xref):
+            if xref not in sizes:
+                # 另加 "n 0 obj … endobj" 包装与交叉引用表条目约 40 字节
+                length = len(doc.xref_object(xref, compressed=True)) + 40
+                if doc.xref_is_stream(xref):
+                    value = doc.xref_get_key(xref, 'Length')
+                    if value[0] == 'int':
+                        length += int(value[1])
+                sizes[xref] = length
+            return sizes[xref]
+        
+        def reachable(xref):
+            found, stack = set(), [xref]
+            while stack:
+                current = stack.pop()
+                if current in found:
+                    continue
+                found.add(current)
+                if current not in refs:
+                    source = doc.xref_object(current, compressed=True)
+                    # 不沿 /Parent 回溯到页面树，否则每页都会引用到整个文档
+                    source = re.sub(r'/Parent\s*\d+\s+0\s+R', '', source)
+                    refs[current] = [int(ref) for ref in re.findall(r'(\d+)\s+0\s+R', source)]
+                stack.extend(refs[current])
+            return found
+        
+        # 书签条目不从页面引用，计入其目标页
+        outlines = {}
+        for item in doc.get_toc(simple=False):
+            if item[3].get('xref') and 0 <= item[3].get('page', -1) < doc.page_count:
+                outlines.setdefault(item[3]['page'], set()).add(item[3]['xref'])
+        
+        ranges = []
+        first, used, included = 0, 0, set()
+        for pno in range(doc.page_count):
+            objects = reachable(doc.page_xref(pno)) | outlines.get(pno, set())
+            cost = sum(object_size(xref) for xref in objects - included)
+            if pno > first and used + cost > budget:
+                ranges.append((first, pno - 1, None))
+                first, used, included = pno, 0, set()
+                cost = sum(object_size(xref) for xref in objects)
+            used += cost
+            included |= objects
+        ranges.append((first, doc.page_count - 1, None))
+        return ranges
+    
+    # ==================== PDF全文索引 ====================
+    TEXT_CHUNK_PAGES = 64    # 每个提取任务的页数，大文件拆成多个任务在多个进程中并行
+    
+    @_recorded_job
+    def pdfs_index_text(self, pdf_paths, index_path=TextIndex.DEFAULT_PATH, workers=None):
+        """提取每个 PDF 每页的文本（page.get_text）存入全文索引，按页块在进程池中并行
+        
+        未变化的文件直接跳过，内容相同的文件复制已有的页面；之后可用 search_text 查询。
+        """
+        index = None
+        pool = None
         try:
             self.controller.is_running = True
-            total = len(image_paths)
-            self.log(f"🔄 转换 {total} 张图片为PDF...")
+            pdf_paths = self._preflight(pdf_paths, 'pdf')
+            total = len(pdf_paths)
+            index = TextIndex(index_path)
+            start = time.time()
             
-            quality_settings = {
-                'high': {'dpi': 300, 'quality': 100},
-                'medium': {'dpi': 150, 'quality': 85},
-                'low': {'dpi': 72, 'quality': 70}
-            }
-            settings = quality_settings.get(quality, quality_settings['high'])
+            todo = []
+            unchanged = 0
+            for pdf_path in pdf_paths:
+                changed, sha1 = index.check(pdf_path)
+                if changed:
+                    todo.append((pdf_path, sha1))
+                else:
+                    unchanged += 1
+            self.log(f"🔄 索引 {len(todo)} 个PDF的文本" + (f"（{unchanged} 个未变化，跳过）" if unchanged else "") + "...")
             
-            images = []
-            first_image = None
+            # 每个文件拆成若干页块，记录各文件剩余的页块数，全部写入后才标记为已索引
+            chunks = []
+            remaining = {}
+            files = {}
+            copied = 0
+            for pdf_path, sha1 in todo:
+                file_id, done = index.begin_file(pdf_path, sha1)
+                if done:
+                    copied += 1
+                    continue
+                pages = self.preflight[pdf_path]['pages']
+                files[file_id] = (pdf_path, sha1, pages)
+                remaining[file_id] = 0
+                for first in range(0, pages, self.TEXT_CHUNK_PAGES):
+                    chunks.append((file_id, pdf_path, first, min(first + self.TEXT_CHUNK_PAGES, pages) - 1))
+                    remaining[file_id] += 1
+            if copied:
+                self.log(f"  📋 {copied} 个文件与已索引的文件内容相同，直接复制")
+            self.tracker.begin_batch([last - first + 1 for _, _, first, last in chunks])
             
-            for i, img_path in enumerate(image_paths):
-                if not self.controller.check_pause():
-                    return False
-                
-                self.log(f"  处理 {i+1}/{total}: {os.path.basename(img_path)}")
-                self.progress(i + 1, total)
-                
-                img = Image.open(img_path)
-                
-                if img.mode == 'RGBA':
-                    bg = Image.new('RGB', img.size, (255, 255, 255))
-                    bg.paste(img, mask=img.split()[3])
-                    img = bg
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
+            workers = max(1, min(workers or os.cpu_count() or 1, len(chunks) or 1))
+            pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+            pending = {}
+            queued = list(chunks)
+            finished = indexed_pages = 0
+            success_count = unchanged + copied
+            
+            while queued or pending:
+                # 暂停时不再提交新的页块，已在处理的页块继续完成
+                while queued and len(pending) < workers * 2:
+                    if not self.controller.check_pause():
+                        queued = []
+                        break
+                    chunk = queued.pop(0)
+                    if pool:
+                        future = pool.submit(_extract_pdf_text, *chunk[1:])
+                    else:
+                        future = concurrent.futures.Future()
+                        try:
+                            future.set_result(_extract_pdf_text(*chunk[1:]))
+                        except Exception as e:
+                            future.set_exception(e)
+                    pending[future] = chunk
+                if not pending:
+                    break
                 
-                if first_image is None:
-                    first_image = img
-                else:
-                    images.append(img)
-            
-            if first_image and not self.controller.should_stop():
-                first_image.save(
-                    output_path, 'PDF',
-                    resolution=settings['dpi'],
-                    save_all=True,
-                    append_images=images,
-                    quality=settings['quality']
-                )
-                self.log(f"✅ PDF保存成功: {output_path}")
-                return True
+                done = next(iter(concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)[0]))
+                file_id, pdf_path = pending.pop(done)[:2]
+                finished += 1
+                self.tracker.item(finished)
+                if file_id not in remaining:
+                    continue    # 该文件的其他页块已失败
+                try:
+                    pages = done.result()
+                except Exception as e:
+                    self.log(f"  ❌ {os.path.basename(pdf_path)}: 文本提取失败: {e}")
+                    self._file_result(pdf_path, False, f"文本提取失败: {e}")
+                    del remaining[file_id]
+                    continue
+                index.add_pages(file_id, pages)
+                indexed_pages += len(pages)
+                remaining[file_id] -= 1
+                if not remaining[file_id]:
+                    del remaining[file_id]
+                    pdf_path, sha1, page_count = files[file_id]
+                    index.finish_file(file_id, sha1, page_count)
+                    self.log(f"  ✓ {os.path.basename(pdf_path)}: {page_count} 页")
+                    success_count += 1
             
-            return False
+            if not self.controller.should_stop():
+                self.tracker.finish()
+            elapsed = time.time() - start
+            stats = index.stats()
+            self.log(f"📚 提取 {indexed_pages} 页（{elapsed:.1f} 秒，{indexed_pages / max(elapsed, 1e-6):.0f} 页/秒），"
+                     f"索引中共 {stats['files']} 个文件 / {stats['pages']} 页")
+            self.log(f"✅ 完成！成功 {success_count}/{total}")
+            return success_count > 0
             
         except Exception as e:
             self.log(f"❌ 错误: {str(e)}")
             return False
         finally:
+            if pool:
+                pool.shutdown(wait=True, cancel_futures=True)
+            if index:
+                index.close()
             self.controller.is_running = False
     
-    # ==================== 图片转PPT ====================
-    def images_to_ppt(self, image_paths, output_path, quality='high'):
+    def search_text(self, query, limit=20, index_path=TextIndex.DEFAULT_PATH, path_prefix=None):
+        """在全文索引中查询，返回按相关度排序的 [{'path', 'page', 'snippet', 'rank'}]"""
+        index = TextIndex(index_path)
+        try:
+            return index.search(query, limit, path_prefix)
+        finally:
+            index.close()
+    
+    # ==================== 图片转WebP ====================
+    @_recorded_job
+    def images_to_webp(self, input_paths, output_folder, quality=85, resize_percent=100):
+        reader = None
+        page_writer = None
         try:
             self.controller.is_running = True
-            total = len(image_paths)
-            self.log(f"🔄 转换 {total} 张图片为PPT...")
+            input_paths = self._preflight(input_paths, 'image')
+            self._begin_progress(input_paths)
+            total = len(input_paths)
+            self.log(f"🔄 转换 {total} 张图片为WebP...")
+            
+            os.makedirs(output_folder, exist_ok=True)
+            success = []
+            
+            def write_webp(img, out_path):
+                # 编码在写出线程中进行，单张失败只记录警告
+                try:
+                    with AtomicOutput(out_path) as out:
+                        img.save(out.temp_path, 'WEBP', quality=quality, method=6)
+                        out.commit()
+                    success.append(out_path)
+                except Exception as e:
+                    self.log(f"    ⚠️ 失败: {os.path.basename(out_path)}: {e}")
+                    self._file_result(out_path, False, str(e))
+                finally:
+                    img.close()
             
-            prs = Presentation()
-            prs.slide_width = Inches(13.333)
-            prs.slide_height = Inches(7.5)
-            blank_layout = prs.slide_layouts[6]
+            # 预读 → 解码/缩放 → 编码写盘 三段并行
+            reader = PrefetchReader(input_paths, depth=4)
+            page_writer = AsyncWriter()
             
-            for i, img_path in enumerate(image_paths):
+            for i, (img_path, data) in enumerate(reader):
                 if not self.controller.check_pause():
                     return False
                 
-                self.log(f"  处理 {i+1}/{total}: {os.path.basename(img_path)}")
-                self.progress(i + 1, total)
-                
-                slide = prs.slides.add_slide(blank_layout)
-                img = Image.open(img_path)
-                
-                temp_path = img_path
-                if quality != 'high' or img.mode == 'RGBA':
-                    if quality != 'high':
-                        max_size = (1920, 1080) if quality == 'medium' else (1280, 720)
-                        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+                try:
+                    self.log(f"  处理 {i+1}/{total}: {os.path.basename(img_path)}")
+                    self.tracker.item(i)
                     
-                    if img.mode == 'RGBA':
-                        bg = Image.new('RGB', img.size, (255, 255, 255))
-                        bg.paste(img, mask=img.split()[3])
-                        img = bg
+                    img = Image.open(BytesIO(data) if data else img_path)
+                    img.load()
                     
-                    temp_path = tempfile.mktemp(suffix='.jpg')
-                    img.save(temp_path, 'JPEG', quality=95 if quality == 'high' else 85)
-                
-                img_w, img_h = img.size
-                slide_w = prs.slide_width
-                slide_h = prs.slide_height
-                
-                img_w_emu = Emu(img_w * 914400 / 96)
-                img_h_emu = Emu(img_h * 914400 / 96)
-                
-                ratio = min(slide_w / img_w_emu, slide_h / img_h_emu) * 0.95
-                new_w = int(img_w_emu * ratio)
-                new_h = int(img_h_emu * ratio)
-                
-                left = (slide_w - new_w) // 2
-                top = (slide_h - new_h) // 2
-                
-                slide.shapes.add_picture(temp_path, left, top, new_w, new_h)
-                
-                if temp_path != img_path and os.path.exists(temp_path):
-                    try:
-                        os.remove(temp_path)
-                    except:
-                        pass
-            
-            if not self.controller.should_stop():
-                prs.save(output_path)
-                self.log(f"✅ PPT保存成功: {output_path}")
-                return True
+                    if resize_percent != 100:
+                        new_w = int(img.width * resize_percent / 100)
+                        new_h = int(img.height * resize_percent / 100)
+                        img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+                    
+                    base_name = Path(img_path).stem
+                    out_path = os.path.join(output_folder, f"{base_name}.webp")
+                    
+                    page_writer.submit(write_webp, img, out_path)
+                    
+                except Exception as e:
+                    self.log(f"    ⚠️ 失败: {e}")
+                    self._file_result(img_path, False, str(e))
             
-            return False
+            page_writer.flush()
+            self.tracker.finish()
+            self.log(f"✅ 成功转换 {len(success)}/{total} 张图片")
+            return True
             
         except Exception as e:
             self.log(f"❌ 错误: {str(e)}")
             return False
         finally:
+            if page_writer:
+                page_writer.close()
+            if reader:
+                reader.close()
             self.controller.is_running = False
     
-    # ==================== 批量PDF转PPT ====================
-    def pdfs_to_ppt(self, pdf_paths, output_folder, dpi=150):
-        """批量PDF转PPT"""
+    @_recorded_job
+    def folder_to_webp(self, input_folder, output_folder, quality=85, resize_percent=100):
+        extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff'}
+        files = []
+        
+        for root, dirs, filenames in os.walk(input_folder):
+            for f in filenames:
+                if Path(f).suffix.lower() in extensions:
+                    files.append(os.path.join(root, f))
+        
+        if not files:
+            self.log("⚠️ 文件夹中没有图片")
+            return False
+        
+        self.log(f"📁 找到 {len(files)} 张图片")
+        return self.images_to_webp(files, output_folder, quality, resize_percent)
+
+
+class ThumbnailService:
+    """首页缩略图服务
+    
+    - PDF：fitz 低分辨率渲染第 1 页
+    - 图片：JPEG 使用 draft 模式在解码阶段直接缩小
+    - Office 文档：优先读取文件内嵌缩略图，没有时用 LibreOffice 导出首页
+    结果写入按文件内容哈希与大小索引的磁盘缓存，超出容量时按最近使用时间淘汰，重启后缓存仍然有效。
+    """
+    
+    IMAGE_EXTS = {'.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.tif', '.webp'}
+    FITZ_EXTS = {'.pdf', '.xps', '.oxps', '.epub', '.cbz', '.fb2', '.svg'}
+    OFFICE_EXTS = {'.docx', '.doc', '.wps', '.rtf', '.xlsx', '.xls', '.et', '.csv',
+                   '.pptx', '.ppt', '.dps', '.odt', '.ods', '.odp'}
+    # OOXML / ODF / WPS 文件中可能内嵌的缩略图
+    EMBEDDED_THUMBNAILS = ['docProps/thumbnail.jpeg', 'docProps/thumbnail.png', 'Thumbnails/thumbnail.png']
+    
+    def __init__(self, converter, cache_dir=None, max_bytes=200 * 1024 * 1024, size=256):
+        self.converter = converter
+        self.log = converter.log
+        self.cache_dir = cache_dir or os.path.join(APP_DATA_DIR, "thumbnails")
+        self.max_bytes = max_bytes
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith('.jpg')
+        )
+    
+    def _cache_key(self, path, size):
+        """按文件大小、修改时间 + 首尾各 64KB 内容计算哈希，大文件也只需读取 128KB
+        
+        修改时间（纳秒）也计入：BMP / TIFF / CSV 等未压缩格式在中间改动、大小不变时首尾内容可能不变
+        """
+        st = os.stat(path)
+        file_size = st.st_size
+        h = hashlib.sha1(f"{file_size}:{st.st_mtime_ns}:{size}".encode('ascii'))
+        with open(path, 'rb') as f:
+            h.update(f.read(65536))
+            if file_size > 131072:
+                f.seek(-65536, os.SEEK_END)
+                h.update(f.read(65536))
+        return h.hexdigest()
+    
+    def get_thumbnail(self, path, size=None):
+        """按需获取单个文件的缩略图，返回缓存中 JPEG 文件路径，失败返回 None"""
+        size = size or self.size
+        try:
+            cache_path = os.path.join(self.cache_dir, f"{self._cache_key(path, size)}.jpg")
+            
+            if os.path.exists(cache_path):
+                # 更新修改时间，作为 LRU 淘汰依据
+                os.utime(cache_path)
+                self.hits += 1
+                return cache_path
+            
+            self.misses += 1
+            img = self._render_thumbnail(path, size)
+            if img is None:
+                return None
+            
+            temp_path = cache_path + '.tmp'
+            img.save(temp_path, 'JPEG', quality=80)
+            img.close()
+            os.replace(temp_path, cache_path)
+            
+            with self._lock:
+                self._total_bytes += os.path.getsize(cache_path)
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+            return cache_path
+            
+        except Exception as e:
+            self.log(f"  ⚠️ 缩略图生成失败 {os.path.basename(path)}: {e}")
+            return None
+    
+    def generate_thumbnails(self, paths, size=None):
+        """批量生成缩略图，返回 {源文件: 缩略图路径}"""
+        controller = self.converter.controller
+        results = {}
+        total = len(paths)
+        start = time.time()
+        tracker = self.converter.tracker
+        tracker.begin_batch([1] * total)
+        
+        for i, path in enumerate(paths):
+            if not controller.check_pause():
+                break
+            tracker.item(i)
+            results[path] = self.get_thumbnail(path, size)
+        
+        if not controller.should_stop():
+            tracker.finish()
+        elapsed = time.time() - start
+        self.log(f"✅ 缩略图 {len(results)}/{total}，缓存命中 {self.hits}，耗时 {elapsed:.2f} 秒")
+        return results
+    
+    def _render_thumbnail(self, path, size):
+        ext = Path(path).suffix.lower()
+        
+        if ext in self.IMAGE_EXTS:
+            return self._image_thumbnail(path, size)
+        if ext in self.FITZ_EXTS:
+            return self._fitz_thumbnail(path, size)
+        if ext in self.OFFICE_EXTS:
+            return self._office_thumbnail(path, size)
+        return None
+    
+    def _fit(self, img, size):
+        if img.mode == 'RGBA':
+            bg = Image.new('RGB', img.size, (255, 255, 255))
+            bg.paste(img, mask=img.split()[3])
+            img = bg
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        return img
+    
+    def _image_thumbnail(self, path, size):
+        # 及时关闭源文件，Windows 上不会一直占用（锁定）原图
+        with Image.open(path) as img:
+            # JPEG 在 DCT 解码阶段按 1/2、1/4、1/8 缩小，无需解码完整分辨率
+            img.draft('RGB', (size, size))
+            thumb = self._fit(img, size)
+            # _fit 对 RGB 图片原地缩小并返回同一对象，关闭前复制一份
+            return thumb.copy() if thumb is img else thumb
+    
+    def _fitz_thumbnail(self, path, size):
+        doc = fitz.open(path)
+        try:
+            page = doc[0]
+            zoom = size / max(page.rect.width, page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+        finally:
+            doc.close()
+    
+    def _office_thumbnail(self, path, size):
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as zf:
+                names = set(zf.namelist())
+                for name in self.EMBEDDED_THUMBNAILS:
+                    if name in names:
+                        return self._fit(Image.open(BytesIO(zf.read(name))), size)
+        
+        soffice = self.converter.tools.get('libreoffice')
+        if not soffice:
+            return None
+        
+        # LibreOffice 导出 PNG 时只输出首页
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cmd = [soffice, '--headless', '--convert-to', 'png', '--outdir', temp_dir, path]
+            subprocess.run(cmd, capture_output=True, timeout=60)
+            png_path = os.path.join(temp_dir, Path(path).stem + '.png')
+            if not os.path.exists(png_path):
+                return None
+            img = Image.open(png_path)
+            img.load()
+            return self._fit(img, size)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    def _evict(self):
+        """删除最久未使用的缩略图，直到缓存降到上限的 90%"""
+        entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith('.jpg')]
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                file_size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= file_size
+            except OSError:
+                pass
+
+
+class FileListModel:
+    """文件列表模型
+    
+    列表保持用户看到的顺序，集合索引负责去重；
+    添加、删除、移动、排序都是一次 O(n) 的批量操作，10 万级列表也不会卡顿。
+    """
+    
+    def __init__(self, items=None):
+        self.items = []
+        self._index = set()
+        if items:
+            self.add_many(items)
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def __iter__(self):
+        return iter(self.items)
+    
+    def __getitem__(self, i):
+        return self.items[i]
+    
+    def __contains__(self, path):
+        return os.path.normpath(path) in self._index
+    
+    def add_many(self, paths):
+        """批量添加（自动去重），返回实际新增数量"""
+        added = 0
+        for path in paths:
+            # 对话框返回 / 分隔，os.walk 在 Windows 上返回 \ 分隔，统一后再去重
+            path = os.path.normpath(path)
+            if path not in self._index:
+                self._index.add(path)
+                self.items.append(path)
+                added += 1
+        return added
+    
+    def clear(self):
+        self.items = []
+        self._index = set()
+    
+    def remove_indices(self, indices):
+        drop = set(indices)
+        self.items = [p for i, p in enumerate(self.items) if i not in drop]
+        self._index = set(self.items)
+    
+    def move(self, indices, delta):
+        """选中项整体上移（delta=-1）或下移（delta=1），返回移动后的索引"""
+        indices = sorted(indices)
+        if not indices:
+            return []
+        if (delta < 0 and indices[0] == 0) or (delta > 0 and indices[-1] >= len(self.items) - 1):
+            return indices
+        
+        for i in (indices if delta < 0 else reversed(indices)):
+            self.items[i], self.items[i + delta] = self.items[i + delta], self.items[i]
+        return [i + delta for i in indices]
+    
+    def sorted_items(self, key='natural'):
+        """返回排序后的副本（可在后台线程调用），key 为 'natural' 或 'mtime'"""
+        items = list(self.items)
+        if key == 'mtime':
+            items.sort(key=self._mtime)
+        else:
+            items.sort(key=self.natural_key)
+        return items
+    
+    def reorder(self, items):
+        """应用后台排序结果；排序期间新增的文件保留在末尾，已删除的文件不会复活"""
+        ordered = [p for p in items if p in self._index]
+        seen = set(ordered)
+        self.items = ordered + [p for p in self.items if p not in seen]
+    
+    @staticmethod
+    def natural_key(path):
+        """自然排序：page2 排在 page10 之前"""
+        return [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', os.path.basename(path).lower())]
+    
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0
+    
+    @staticmethod
+    def scan_folder(folder, extensions):
+        """递归扫描文件夹中指定后缀的文件，按目录、自然顺序返回"""
+        files = []
+        for root, dirs, filenames in os.walk(folder):
+            dirs.sort(key=FileListModel.natural_key)
+            for f in sorted(filenames, key=FileListModel.natural_key):
+                if Path(f).suffix.lower() in extensions:
+                    files.append(os.path.join(root, f))
+        return files
+
+
+# ==================== 跨进程共享内存传输 ====================
+class SharedMemoryRing:
+    """在进程间传递渲染结果的共享内存环：一块共享内存切成 slots 个固定大小的槽位
+    
+    生产方（渲染进程）取一个空闲槽位写入像素或编码后的数据，队列中只传递
+    (槽位, 长度, 附加信息) 这样的小描述符；消费方按描述符直接读取共享内存，用完后 release() 归还槽位。
+    槽位用完时 put() 阻塞，起到背压作用；超过槽位大小的数据随描述符直接传递（pickle）。
+    
+    创建方负责 close()（同时释放共享内存）。子进程通过 Process 参数或进程池的 initargs 获得本对象，
+    读取得到的 memoryview 须在 release() 前用完并释放。
+    """
+    
+    def __init__(self, slot_size, slots=4):
+        self.slot_size = slot_size
+        self.slots = slots
+        self._shm = shared_memory.SharedMemory(create=True, size=slot_size * slots)
+        self._free = multiprocessing.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+        self._owner = True
+    
+    def __getstate__(self):
+        return {'slot_size': self.slot_size, 'slots': self.slots, 'name': self._shm.name, 'free': self._free}
+    
+    def __setstate__(self, state):
+        self.slot_size = state['slot_size']
+        self.slots = state['slots']
+        self._free = state['free']
+        self._shm = shared_memory.SharedMemory(name=state['name'])
+        self._owner = False
+    
+    def put(self, data, meta=None, timeout=None):
+        """写入一份数据，返回描述符 (槽位, 长度, meta)；槽位为 None 时数据随描述符传递"""
+        data = memoryview(data).cast('B')
+        if data.nbytes > self.slot_size:
+            return (None, bytes(data), meta)
+        slot = self._free.get(timeout=timeout)
+        offset = slot * self.slot_size
+        self._shm.buf[offset:offset + data.nbytes] = data
+        return (slot, data.nbytes, meta)
+    
+    def get(self, desc):
+        """按描述符取得数据视图（不复制）"""
+        slot, size, _ = desc
+        if slot is None:
+            return memoryview(size)
+        offset = slot * self.slot_size
+        return self._shm.buf[offset:offset + size]
+    
+    def release(self, desc):
+        if desc[0] is not None:
+            self._free.put(desc[0])
+    
+    def put_pixmap(self, pix, timeout=None):
+        """写入 pixmap 的像素缓冲，附带重建图片所需的尺寸信息"""
+        mode = {1: 'L', 3: 'RGB', 4: 'RGBA'}[pix.n]
+        return self.put(pix.samples_mv, {'mode': mode, 'size': (pix.width, pix.height), 'stride': pix.stride},
+                        timeout)
+    
+    def get_image(self, desc):
+        """把 put_pixmap() 的描述符还原为直接引用共享内存的 PIL 图片"""
+        meta = desc[2]
+        return Image.frombuffer(meta['mode'], meta['size'], self.get(desc), 'raw', meta['mode'], meta['stride'], 1)
+    
+    def close(self):
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _shared_memory_benchmark_producer(ring, results, nbytes, pages):
+    """基准测试的生产进程：ring 为 None 时直接 pickle 传输数据"""
+    payload = bytes(nbytes)
+    results.put('ready')
+    for _ in range(pages):
+        results.put(payload if ring is None else ring.put(payload))
+    results.put(None)
+
+
+def shared_memory_benchmark(dpis=(150, 300, 600), pages=10, log=print):
+    """对比 pickle 与共享内存环在进程间传递 A4 页面像素（RGB）的吞吐量（MB/秒）"""
+    if not HAS_SHARED_MEMORY:
+        log("❌ 当前 Python 不支持 multiprocessing.shared_memory（需要 3.8+）")
+        return []
+    
+    results = []
+    for dpi in dpis:
+        nbytes = MemoryGovernor.page_bytes(595, 842, dpi)
+        row = {'dpi': dpi, 'page_mb': round(nbytes / 1024 ** 2, 1)}
+        for mode in ['pickle', 'shared_memory']:
+            ring = SharedMemoryRing(nbytes, slots=4) if mode == 'shared_memory' else None
+            queue_ = multiprocessing.Queue()
+            proc = multiprocessing.Process(target=_shared_memory_benchmark_producer,
+                                           args=(ring, queue_, nbytes, pages))
+            proc.start()
+            try:
+                queue_.get()
+                start = time.perf_counter()
+                while True:
+                    item = queue_.get()
+                    if item is None:
+                        break
+                    if ring is not None:
+                        view = ring.get(item)
+                        view.release()
+                        ring.release(item)
+                elapsed = time.perf_counter() - start
+            finally:
+                proc.join()
+                if ring is not None:
+                    ring.close()
+            row[mode] = round(nbytes * pages / 1024 ** 2 / elapsed, 1)
+        results.append(row)
+        log(f"  {dpi} DPI（每页 {row['page_mb']} MB）：pickle {row['pickle']} MB/秒，"
+            f"共享内存 {row['shared_memory']} MB/秒")
+    return results
+
+
+def pdf_merge_benchmark(pdf_paths=None, files=1000, pages=3, log=print):
+    """合并与拆分的吞吐量（页/秒）基准：未指定 pdf_paths 时生成 files 个各 pages 页、带书签的小 PDF"""
+    with tempfile.TemporaryDirectory() as folder:
+        if not pdf_paths:
+            pdf_paths = []
+            for i in range(files):
+                with fitz.open() as doc:
+                    for j in range(pages):
+                        doc.new_page().insert_text((72, 72), f"file {i} page {j + 1}", fontname='helv')
+                    doc.set_toc([[1, f"chapter {j + 1}", j + 1] for j in range(pages)])
+                    path = os.path.join(folder, f"input_{i:05d}.pdf")
+                    doc.save(path)
+                pdf_paths.append(path)
+        
+        converter = DocumentConverter(log_callback=lambda msg: None, history_path=None)
+        merged = os.path.join(folder, 'merged.pdf')
+        with fitz.open(pdf_paths[0]) as doc:
+            pages_per_file = max(1, doc.page_count)
+        tasks = [
+            ('merge', lambda: converter.pdfs_merge(pdf_paths, merged)),
+            ('split_pages', lambda: converter.pdfs_split([merged], os.path.join(folder, 'pages'),
+                                                         pages_per_file=pages_per_file * 50)),
+            ('split_size', lambda: converter.pdfs_split([merged], os.path.join(folder, 'size'),
+                                                        max_mb=max(os.path.getsize(merged) / 1024 ** 2 / 20, 0.1))),
+            ('split_bookmark', lambda: converter.pdfs_split([merged], os.path.join(folder, 'bookmark'),
+                                                            bookmark_level=1)),
+        ]
+        
+        results = []
+        for name, task in tasks:
+            start = time.perf_counter()
+            ok = task()
+            elapsed = time.perf_counter() - start
+            if not ok:
+                log(f"  {name}: 失败")
+                continue
+            with fitz.open(merged) as doc:
+                total_pages = doc.page_count
+            row = {'operation': name, 'pages': total_pages, 'seconds': round(elapsed, 2),
+                   'pages_per_second': round(total_pages / max(elapsed, 1e-6)),
+                   'rss_mb': round(MetricsRegistry.rss() / 1024 ** 2)}
+            results.append(row)
+            log(f"  {name}: {total_pages} 页 {row['seconds']} 秒，{row['pages_per_second']} 页/秒，"
+                f"常驻内存 {row['rss_mb']} MB")
+        return results
+
+
+def web_cache_benchmark(pages=50, assets=20, latency=0.02, log=print):
+    """资源缓存代理的效果测试：本机测试站点每个网页引用同一组 CSS / JS / 字体，每个响应延迟 latency 秒，
+    模拟每个网页一个空缓存的浏览器会话依次下载网页和全部资源，对比直连与经缓存代理的耗时、源站请求数和字节数
+    """
+    import urllib.request
+    
+    served = {'requests': 0, 'bytes': 0}
+    lock = threading.Lock()
+    
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+        
+        def do_GET(self):
+            time.sleep(latency)
+            static = self.path.startswith('/static/')
+            body = (self.path * (2000 if static else 200)).encode('ascii')
+            with lock:
+                served['requests'] += 1
+                served['bytes'] += len(body)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/css' if static else 'text/html')
+            self.send_header('Cache-Control', 'max-age=3600' if static else 'no-store')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    
+    fixture = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    fixture.daemon_threads = True
+    threading.Thread(target=fixture.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{fixture.server_address[1]}"
+    
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        proxy = AssetCacheProxy(cache_dir).start()
         try:
-            self.controller.is_running = True
-            total = len(pdf_paths)
-            success_count = 0
-            
-            self.log(f"🔄 批量转换 {total} 个PDF...")
-            os.makedirs(output_folder, exist_ok=True)
-            
-            for i, pdf_path in enumerate(pdf_paths):
-                if not self.controller.check_pause():
-                    break
-                
-                base_name = Path(pdf_path).stem
-                output_path = os.path.join(output_folder, f"{base_name}.pptx")
-                
-                # 重置控制器状态用于子任务
-                self.controller.is_running = True
-                
-                if self._pdf_to_ppt_single(pdf_path, output_path, dpi, i + 1, total):
-                    success_count += 1
-            
-            self.log(f"✅ 完成！成功 {success_count}/{total}")
-            return success_count > 0
-            
-        except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
-            return False
+            for mode in ['direct', 'cache']:
+                served.update(requests=0, bytes=0)
+                handler = urllib.request.ProxyHandler({'http': proxy.address} if mode == 'cache' else {})
+                start = time.perf_counter()
+                for page in range(pages):
+                    # 每个网页一个新的 opener，相当于一个空缓存的浏览器会话
+                    opener = urllib.request.build_opener(handler)
+                    opener.open(f"{base}/page{page}.html").read()
+                    for asset in range(assets):
+                        opener.open(f"{base}/static/asset{asset}.css").read()
+                elapsed = time.perf_counter() - start
+                row = {'mode': mode, 'seconds': round(elapsed, 2), 'origin_requests': served['requests'],
+                       'origin_mb': round(served['bytes'] / 1024 ** 2, 2)}
+                results.append(row)
+                log(f"  {'直连' if mode == 'direct' else '缓存代理'}：{pages} 个网页 {row['seconds']} 秒，"
+                    f"源站请求 {row['origin_requests']} 个，下载 {row['origin_mb']} MB")
+            log("  " + proxy.summary())
         finally:
-            self.controller.is_running = False
+            proxy.stop()
+            fixture.shutdown()
+            fixture.server_close()
+    return results
+
+
+# ==================== 本地HTTP转换服务 ====================
+# 服务模式下可调用的批量操作：输出为单个文件(file)或输出文件夹(folder，结果打包为 zip 下载)
+SERVICE_OPERATIONS = {
+    'images_to_pdf': ('file', '.pdf'),
+    'images_to_ppt': ('file', '.pptx'),
+    'documents_to_pdf': ('folder', None),
+    'spreadsheets_to_pdf': ('folder', None),
+    'urls_to_pdf': ('folder', None),
+    'pdfs_to_ppt': ('folder', None),
+    'pdfs_to_images': ('folder', None),
+    'extract_images_from_pdfs': ('folder', None),
+    'pdfs_optimize': ('folder', None),
+    'pdfs_merge': ('file', '.pdf'),
+    'pdfs_split': ('folder', None),
+    'images_to_webp': ('folder', None),
+}
+
+_service_converter = None
+
+
+def _service_run_job(operation, inputs, output, params, memory_budget=None):
+    """在工作进程中执行一个转换任务，每个进程只初始化一次 DocumentConverter
     
-    def _pdf_to_ppt_single(self, pdf_path, output_path, dpi, current_file, total_files):
-        """单个PDF转PPT"""
-        try:
-            self.log(f"🔄 [{current_file}/{total_files}] 转换: {os.path.basename(pdf_path)}")
-            
-            pdf_doc = fitz.open(pdf_path)
-            total = len(pdf_doc)
-            
-            prs = Presentation()
-            prs.slide_width = Inches(13.333)
-            prs.slide_height = Inches(7.5)
-            blank_layout = prs.slide_layouts[6]
-            
-            for page_num in range(total):
-                if not self.controller.check_pause():
-                    pdf_doc.close()
-                    return False
-                
-                self.log(f"  处理页面 {page_num + 1}/{total}")
-                self.progress(page_num + 1, total)
-                
-                page = pdf_doc[page_num]
-                mat = fitz.Matrix(dpi/72, dpi/72)
-                pix = page.get_pixmap(matrix=mat)
-                
-                temp_img = tempfile.mktemp(suffix='.png')
-                pix.save(temp_img)
-                
-                slide = prs.slides.add_slide(blank_layout)
-                
-                img = Image.open(temp_img)
-                img_w, img_h = img.size
-                img.close()
-                
-                img_w_emu = Emu(img_w * 914400 / dpi)
-                img_h_emu = Emu(img_h * 914400 / dpi)
-                
-                ratio = min(prs.slide_width / img_w_emu, prs.slide_height / img_h_emu) * 0.95
-                new_w = int(img_w_emu * ratio)
-                new_h = int(img_h_emu * ratio)
-                
-                left = (prs.slide_width - new_w) // 2
-                top = (prs.slide_height - new_h) // 2
-                
-                slide.shapes.add_picture(temp_img, left, top, new_w, new_h)
-                
-                try:
-                    os.remove(temp_img)
-                except:
-                    pass
-                
-                pix = None
-            
-            pdf_doc.close()
-            
-            if not self.controller.should_stop():
-                prs.save(output_path)
-                self.log(f"✅ PPT保存成功: {output_path}")
-                return True
-            
+    memory_budget 为服务端为该任务准入的渲染内存，返回值附带实测的内存增长峰值（RssPeakMonitor）用于校准，
+    以及本进程运行指标的快照，由主进程合并后导出
+    """
+    global _service_converter
+    logs = []
+    if _service_converter is None:
+        _service_converter = DocumentConverter(log_callback=lambda msg: None)
+    _service_converter.log = logs.append
+    _service_converter.controller.reset()
+    if memory_budget:
+        _service_converter.memory.budget = memory_budget
+    _service_converter.memory.reset_peak()
+    
+    with RssPeakMonitor() as monitor:
+        ok = getattr(_service_converter, operation)(inputs, output, **params)
+    return bool(ok), logs, monitor.used, METRICS.snapshot(f"worker-{os.getpid()}")
+
+
+class MultipartStreamParser:
+    """流式解析 multipart/form-data 请求体，文件部分边读边写入磁盘，不在内存中缓存整个上传"""
+    
+    def __init__(self, rfile, boundary, length, chunk_size=64 * 1024):
+        self.rfile = rfile
+        self.delimiter = b'\r\n--' + boundary
+        self.remaining = length
+        self.chunk_size = chunk_size
+        # 在开头补一个 CRLF，使第一个分隔符与后续分隔符格式一致
+        self.buf = b'\r\n'
+    
+    def _read_more(self):
+        if self.remaining <= 0:
             return False
-            
-        except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
+        chunk = self.rfile.read(min(self.chunk_size, self.remaining))
+        if not chunk:
+            self.remaining = 0
             return False
+        self.remaining -= len(chunk)
+        self.buf += chunk
+        return True
     
-    def pdf_to_ppt(self, pdf_path, output_path, dpi=150):
-        """单个PDF转PPT（保持兼容性）"""
-        try:
-            self.controller.is_running = True
-            return self._pdf_to_ppt_single(pdf_path, output_path, dpi, 1, 1)
-        finally:
-            self.controller.is_running = False
+    def _read_until_delimiter(self, sink=None):
+        keep = len(self.delimiter) - 1
+        while True:
+            idx = self.buf.find(self.delimiter)
+            if idx >= 0:
+                if sink:
+                    sink(self.buf[:idx])
+                self.buf = self.buf[idx + len(self.delimiter):]
+                return True
+            if len(self.buf) > keep:
+                if sink:
+                    sink(self.buf[:-keep])
+                self.buf = self.buf[-keep:]
+            if not self._read_more():
+                return False
     
-    # ==================== 批量PDF转图片 ====================
-    def pdfs_to_images(self, pdf_paths, output_folder, dpi=200, img_format='png'):
-        """批量PDF转图片"""
-        try:
-            self.controller.is_running = True
-            total = len(pdf_paths)
-            success_count = 0
-            
-            self.log(f"🔄 批量转换 {total} 个PDF为图片...")
-            os.makedirs(output_folder, exist_ok=True)
+    def iter_parts(self, upload_dir):
+        """逐个返回 (字段名, 文件名, 值)；文件部分的值为保存后的路径，普通字段为字符串"""
+        if not self._read_until_delimiter():
+            return
+        
+        while True:
+            while len(self.buf) < 2 and self._read_more():
+                pass
+            if self.buf[:2] == b'--':
+                return
             
-            for i, pdf_path in enumerate(pdf_paths):
-                if not self.controller.check_pause():
-                    break
-                
-                base_name = Path(pdf_path).stem
-                pdf_output_folder = os.path.join(output_folder, base_name)
-                
-                self.controller.is_running = True
-                
-                if self._pdf_to_images_single(pdf_path, pdf_output_folder, dpi, img_format, i + 1, total):
-                    success_count += 1
+            while b'\r\n\r\n' not in self.buf:
+                if not self._read_more():
+                    raise ValueError("multipart 请求头不完整")
+            head, self.buf = self.buf.split(b'\r\n\r\n', 1)
+            disposition = ''
+            for line in head.decode('utf-8', 'replace').split('\r\n'):
+                if line.lower().startswith('content-disposition:'):
+                    disposition = line
+            name_match = re.search(r'\bname="([^"]*)"', disposition)
+            file_match = re.search(r'\bfilename="([^"]*)"', disposition)
+            name = name_match.group(1) if name_match else ''
             
-            self.log(f"✅ 完成！成功 {success_count}/{total}")
-            return success_count > 0
+            if file_match and file_match.group(1):
+                filename = os.path.basename(file_match.group(1).replace('\\', '/'))
+                path = os.path.join(upload_dir, filename)
+                index = 1
+                while os.path.exists(path):
+                    path = os.path.join(upload_dir, f"{index}_{filename}")
+                    index += 1
+                with open(path, 'wb') as f:
+                    complete = self._read_until_delimiter(f.write)
+                value = path
+            else:
+                filename = None
+                chunks = []
+                complete = self._read_until_delimiter(chunks.append)
+                value = b''.join(chunks).decode('utf-8', 'replace')
             
-        except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
-            return False
-        finally:
-            self.controller.is_running = False
+            if not complete:
+                raise ValueError("multipart 请求体不完整")
+            yield name, filename, value
+
+
+class _ChunkedWriter:
+    """HTTP/1.1 chunked 传输编码的写入包装，zipfile 可直接向其流式写入"""
+    
+    def __init__(self, wfile):
+        self.wfile = wfile
+    
+    def write(self, data):
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode('ascii'))
+            self.wfile.write(data)
+            self.wfile.write(b"\r\n")
+        return len(data)
+    
+    def flush(self):
+        self.wfile.flush()
+    
+    def close(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class ConversionService:
+    """本地 HTTP 转换服务
+    
+    POST   /jobs/<操作>?参数=值   multipart 上传输入文件，返回任务 ID（202）
+    GET    /jobs/<任务ID>         查询任务状态
+    GET    /jobs/<任务ID>/result  下载结果（多文件结果以 zip 流式返回）
+    DELETE /jobs/<任务ID>         删除任务及其临时文件
+    GET    /health                服务状态
+    GET    /metrics               运行指标（Prometheus 文本格式，/metrics.json 为 JSON）
+    
+    转换在进程池中执行；排队任务数超过上限时直接返回 503，避免无限堆积。
+    任务按预估的峰值内存准入：内存预算用尽时，即使有空闲的工作进程也先排队，
+    工作进程数可以设为 CPU 核数而不必担心多个大页面同时渲染耗尽内存。
+    """
+    
+    JOB_TTL = 3600
+    # 每个任务除渲染缓冲外的基础内存（解释器、预读缓冲等）
+    JOB_BASE_MEMORY = 128 * 1024 * 1024
+    # 同时存在的渲染页数：正在渲染的一页 + 写出队列（AsyncWriter 默认深度 4）+ 正在写出的一页
+    PAGES_IN_FLIGHT = 6
     
-    def _pdf_to_images_single(self, pdf_path, output_folder, dpi, img_format, current_file, total_files):
-        """单个PDF转图片"""
+    def __init__(self, host='127.0.0.1', port=8765, workers=2, max_pending=None, log_callback=None,
+                 memory_budget=None):
+        self.log = log_callback or print
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(max_pending or workers * 4)
+        self.memory = MemoryGovernor(memory_budget)
+        self.waiting = []
+        self.jobs = {}
+        self.lock = threading.RLock()
+        self.work_dir = tempfile.mkdtemp(prefix='docconv_service_')
+        
+        METRICS.set_function('docconv_queue_depth', lambda: len(self.waiting), 'service')
+        METRICS.set_function('docconv_workers', lambda: self.busy_workers(), 'busy')
+        METRICS.set_function('docconv_workers', lambda: self.workers - self.busy_workers(), 'idle')
+        
+        handler = type('ServiceHandler', (_ServiceRequestHandler,), {'service': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+    
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def serve_forever(self):
+        self.log(f"🌐 转换服务已启动: {self.address}（工作进程 {self.workers} 个，"
+                 f"内存预算 {self.memory.budget // 1024 ** 2} MB）")
         try:
-            self.log(f"🔄 [{current_file}/{total_files}] 转换: {os.path.basename(pdf_path)}")
-            
-            os.makedirs(output_folder, exist_ok=True)
-            
-            pdf_doc = fitz.open(pdf_path)
-            total = len(pdf_doc)
-            base_name = Path(pdf_path).stem
-            
-            self.log(f"  共 {total} 页，DPI: {dpi}")
-            
-            for page_num in range(total):
-                if not self.controller.check_pause():
-                    pdf_doc.close()
-                    return False
-                
-                self.log(f"  处理页面 {page_num + 1}/{total}")
-                self.progress(page_num + 1, total)
-                
-                page = pdf_doc[page_num]
-                mat = fitz.Matrix(dpi/72, dpi/72)
-                pix = page.get_pixmap(matrix=mat)
-                
-                out_path = os.path.join(output_folder, f"{base_name}_page_{page_num + 1:03d}.{img_format}")
-                
-                if img_format.lower() in ['jpg', 'jpeg']:
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    img.save(out_path, "JPEG", quality=95)
-                    img.close()
+            self.server.serve_forever()
+        finally:
+            self.shutdown()
+    
+    def shutdown(self):
+        self.server.server_close()
+        self.pool.shutdown(wait=False)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def submit(self, operation, inputs, params, job_dir):
+        """提交任务，队列已满时返回 None"""
+        if not self.slots.acquire(blocking=False):
+            return None
+        
+        kind, ext = SERVICE_OPERATIONS[operation]
+        if kind == 'file':
+            stem = Path(inputs[0]).stem if inputs else operation
+            output = os.path.join(job_dir, 'output', stem + ext)
+        else:
+            output = os.path.join(job_dir, 'output')
+        os.makedirs(os.path.join(job_dir, 'output'), exist_ok=True)
+        
+        job_id = os.path.basename(job_dir)
+        job = {
+            'id': job_id, 'operation': operation, 'params': params, 'inputs': len(inputs),
+            'dir': job_dir, 'output': output, 'kind': kind,
+            'status': 'queued', 'created': time.time(), 'finished': None,
+            'error': None, 'log': [], 'future': None,
+            'args': (operation, inputs, output, params),
+            'render_estimate': self.estimate_render_memory(inputs, params), 'admitted': 0,
+        }
+        with self.lock:
+            self._purge_expired()
+            self.jobs[job_id] = job
+            self.waiting.append(job)
+            self._dispatch()
+        return job
+    
+    def estimate_render_memory(self, inputs, params):
+        """按预检得到的最大页面尺寸 / 图片尺寸和 DPI 估算任务的渲染内存峰值"""
+        files = [p for p in inputs if os.path.isfile(p)]
+        dpi = params.get('dpi', 200)
+        max_size = params.get('max_size')
+        largest = 0
+        for info in PreflightProbe(dpi).probe_many(files):
+            if info['error']:
+                continue
+            if info['kind'] == 'pdf':
+                if max_size:
+                    max_w, max_h = DocumentConverter._parse_size(max_size)
+                    page = max_w * max_h * 3
                 else:
-                    pix.save(out_path)
-                
-                pix = None
-            
-            pdf_doc.close()
-            self.log(f"✅ 共 {total} 张图片保存到: {output_folder}")
-            return True
-            
-        except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
-            return False
+                    page = MemoryGovernor.page_bytes(info['max_width'], info['max_height'], dpi)
+                largest = max(largest, page * self.PAGES_IN_FLIGHT)
+            elif info['kind'] == 'image':
+                # 解码后的 RGBA 像素，再加一份缩放/转换的副本
+                largest = max(largest, info['max_width'] * info['max_height'] * 4 * 2)
+        return largest
     
-    def pdf_to_images(self, pdf_path, output_folder, dpi=200, img_format='png'):
-        """单个PDF转图片（保持兼容性）"""
+    def _dispatch(self):
+        """按提交顺序准入排队任务，直到内存预算用尽（调用方持有 self.lock）"""
+        while self.waiting:
+            job = self.waiting[0]
+            admitted = self.JOB_BASE_MEMORY + self.memory.calibrated(job['render_estimate'])
+            if not self.memory.try_acquire(admitted):
+                return
+            self.waiting.pop(0)
+            job['admitted'] = admitted
+            args = job.pop('args')
+            future = self.pool.submit(_service_run_job, *args, admitted - self.JOB_BASE_MEMORY)
+            job['future'] = future
+            future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+    
+    def _on_done(self, job, future):
         try:
-            self.controller.is_running = True
-            return self._pdf_to_images_single(pdf_path, output_folder, dpi, img_format, 1, 1)
+            ok, logs, peak, metrics = future.result()
+            METRICS.merge(metrics)
+            job['log'] = logs
+            job['status'] = 'done' if ok else 'failed'
+            if not ok:
+                job['error'] = next((line for line in reversed(logs) if '❌' in line), "转换失败")
+            self.memory.record(job['render_estimate'], peak)
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
         finally:
-            self.controller.is_running = False
+            job['finished'] = time.time()
+            self.slots.release()
+            with self.lock:
+                self.memory.release(job['admitted'])
+                self._dispatch()
+    
+    def busy_workers(self):
+        with self.lock:
+            running = sum(1 for job in self.jobs.values() if job['future'] is not None and not job['finished'])
+        return min(running, self.workers)
+    
+    def get_job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def delete_job(self, job_id):
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+            if job in self.waiting:
+                # 尚未开始执行的任务直接出队
+                self.waiting.remove(job)
+                job['finished'] = time.time()
+                self.slots.release()
+        if job:
+            shutil.rmtree(job['dir'], ignore_errors=True)
+        return job is not None
+    
+    def job_status(self, job):
+        status = job['status']
+        if status == 'queued' and job['future'] is not None and job['future'].running():
+            status = 'running'
+        finished = job['finished']
+        return {
+            'id': job['id'],
+            'operation': job['operation'],
+            'params': job['params'],
+            'inputs': job['inputs'],
+            'status': status,
+            'created': job['created'],
+            'finished': finished,
+            'duration': round(finished - job['created'], 3) if finished else None,
+            'error': job['error'],
+            'log': job['log'][-20:],
+        }
+    
+    def _purge_expired(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job['finished'] and now - job['finished'] > self.JOB_TTL]
+        for job_id in expired:
+            shutil.rmtree(self.jobs.pop(job_id)['dir'], ignore_errors=True)
+
+
+class _ServiceRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    service = None
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, code, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _parse_params(self, query, fields):
+        from urllib.parse import parse_qsl
+        params = {}
+        urls = []
+        for key, value in parse_qsl(query) + fields:
+            if key == 'url':
+                urls.append(value)
+            elif value.lstrip('-').isdigit():
+                params[key] = int(value)
+            else:
+                params[key] = value
+        return params, urls
+    
+    def do_GET(self):
+        from urllib.parse import urlsplit
+        parts = [p for p in urlsplit(self.path).path.split('/') if p]
+        
+        if parts == ['metrics']:
+            body = METRICS.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
+        if parts == ['metrics.json']:
+            self._send_json(200, METRICS.to_json())
+            return
+        
+        if parts == ['health']:
+            with self.service.lock:
+                active = sum(1 for job in self.service.jobs.values() if not job['finished'])
+            self._send_json(200, {'status': 'ok', 'workers': self.service.workers, 'active_jobs': active,
+                                  'waiting_jobs': len(self.service.waiting), 'memory': self.service.memory.stats()})
+            return
+        
+        if len(parts) < 2 or parts[0] != 'jobs':
+            self._send_json(404, {'error': '未找到'})
+            return
+        
+        job = self.service.get_job(parts[1])
+        if job is None:
+            self._send_json(404, {'error': '任务不存在'})
+            return
+        
+        if len(parts) == 2:
+            self._send_json(200, self.service.job_status(job))
+        elif parts[2:] == ['result']:
+            self._send_result(job)
+        else:
+            self._send_json(404, {'error': '未找到'})
+    
+    def do_POST(self):
+        from urllib.parse import urlsplit
+        split = urlsplit(self.path)
+        parts = [p for p in split.path.split('/') if p]
+        
+        if len(parts) != 2 or parts[0] != 'jobs' or parts[1] not in SERVICE_OPERATIONS:
+            self._send_json(404, {'error': '不支持的操作', 'operations': list(SERVICE_OPERATIONS)})
+            return
+        operation = parts[1]
+        
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self._send_json(411, {'error': '需要 Content-Length'})
+            return
+        length = int(length)
+        
+        job_dir = tempfile.mkdtemp(prefix='job_', dir=self.service.work_dir)
+        upload_dir = os.path.join(job_dir, 'input')
+        os.makedirs(upload_dir)
+        
+        inputs = []
+        fields = []
+        content_type = self.headers.get('Content-Type', '')
+        match = re.search(r'boundary="?([^";]+)"?', content_type)
+        try:
+            if content_type.startswith('multipart/form-data') and match:
+                parser = MultipartStreamParser(self.rfile, match.group(1).encode('latin-1'), length)
+                for name, filename, value in parser.iter_parts(upload_dir):
+                    if filename:
+                        inputs.append(value)
+                    else:
+                        fields.append((name, value))
+            else:
+                self.rfile.read(length)
+        except ValueError as e:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            self._send_json(400, {'error': str(e)})
+            return
+        
+        params, urls = self._parse_params(split.query, fields)
+        if operation == 'urls_to_pdf':
+            inputs = urls
+        if not inputs:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            self._send_json(400, {'error': '没有输入文件'})
+            return
+        
+        job = self.service.submit(operation, inputs, params, job_dir)
+        if job is None:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            self._send_json(503, {'error': '任务队列已满，请稍后重试'}, {'Retry-After': '5'})
+            return
+        
+        self._send_json(202, {
+            'id': job['id'],
+            'status_url': f"/jobs/{job['id']}",
+            'result_url': f"/jobs/{job['id']}/result",
+        })
+    
+    def do_DELETE(self):
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        if len(parts) == 2 and parts[0] == 'jobs' and self.service.delete_job(parts[1]):
+            self._send_json(200, {'deleted': parts[1]})
+        else:
+            self._send_json(404, {'error': '任务不存在'})
+    
+    def _send_result(self, job):
+        if job['status'] != 'done':
+            self._send_json(409, self.service.job_status(job))
+            return
+        
+        output = job['output']
+        if job['kind'] == 'file':
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Disposition', self._attachment(os.path.basename(output)))
+            self.send_header('Content-Length', str(os.path.getsize(output)))
+            self.end_headers()
+            with open(output, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+            return
+        
+        # 多文件结果边压缩边发送，不落盘生成临时 zip
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Disposition', self._attachment(f'{job["id"]}.zip'))
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        
+        writer = _ChunkedWriter(self.wfile)
+        with zipfile.ZipFile(writer, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            for root, dirs, files in os.walk(output):
+                dirs.sort()
+                for name in sorted(files):
+                    # 断点续传日志和未完成的 .partial 临时文件不属于结果
+                    if name.endswith('.journal.jsonl') or Path(name).stem.endswith('.partial'):
+                        continue
+                    path = os.path.join(root, name)
+                    zf.write(path, os.path.relpath(path, output))
+        writer.close()
+    
+    @staticmethod
+    def _attachment(filename):
+        """Content-Disposition：响应头只能是 latin-1，非 ASCII 文件名另以 RFC 5987 的 filename* 给出"""
+        from urllib.parse import quote
+        fallback = ''.join(c if ' ' <= c < '\x7f' and c not in '"\\' else '_' for c in filename)
+        if fallback == filename:
+            return f'attachment; filename="{filename}"'
+        return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename, safe="")}'
+
+
+def service_load_test(base_url, operation, files, concurrency=8, requests=50, params=None):
+    """对转换服务做并发压测：提交 -> 轮询 -> 下载，输出吞吐量与延迟分位数"""
+    import uuid
+    import urllib.request
+    from urllib.parse import urlencode
+    
+    boundary = uuid.uuid4().hex
+    body = BytesIO()
+    for path in files:
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                   f'filename="{os.path.basename(path)}"\r\n\r\n'.encode('utf-8'))
+        with open(path, 'rb') as f:
+            body.write(f.read())
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode('ascii'))
+    payload = body.getvalue()
+    query = f"?{urlencode(params)}" if params else ''
+    
+    def one_request():
+        start = time.perf_counter()
+        req = urllib.request.Request(
+            f"{base_url}/jobs/{operation}{query}", data=payload, method='POST',
+            headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+        with urllib.request.urlopen(req) as resp:
+            job = json.loads(resp.read())
+        while True:
+            with urllib.request.urlopen(base_url + job['status_url']) as resp:
+                status = json.loads(resp.read())['status']
+            if status in ['done', 'failed']:
+                break
+            time.sleep(0.02)
+        if status == 'done':
+            with urllib.request.urlopen(base_url + job['result_url']) as resp:
+                while resp.read(1024 * 1024):
+                    pass
+        urllib.request.urlopen(urllib.request.Request(base_url + job['status_url'], method='DELETE')).read()
+        return time.perf_counter() - start, status == 'done'
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: one_request(), range(requests)))
+    elapsed = time.perf_counter() - start
+    
+    latencies = sorted(r[0] for r in results)
+    
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+    
+    report = {
+        'requests': requests,
+        'succeeded': sum(1 for r in results if r[1]),
+        'concurrency': concurrency,
+        'requests_per_sec': round(requests / elapsed, 2),
+        'p50_ms': round(percentile(0.50) * 1000, 1),
+        'p95_ms': round(percentile(0.95) * 1000, 1),
+        'p99_ms': round(percentile(0.99) * 1000, 1),
+    }
+    print(json.dumps(report, ensure_ascii=False))
+    return report
+
+
+# ==================== 分布式转换（共享目录队列） ====================
+class SpoolQueue:
+    """放在共享目录（网络盘）上的任务队列，多台机器上的工作进程共同领取执行
+    
+    目录结构：pending/ 待领取，running/ 执行中，done/ 已完成，failed/ 多次失败。
+    每个任务是一个 JSON 文件；领取即把文件从 pending/ 改名到 running/（改名是原子操作，
+    并发领取同一任务时只有一个进程成功）。执行期间工作进程定期更新 running/ 中文件的修改时间续租，
+    超过租期未续租（进程崩溃、机器掉线）的任务由任意节点改名回 pending/ 重新排队，
+    已领取 MAX_ATTEMPTS 次的任务（反复让工作进程崩溃的输入）移入 failed/。
+    running/ 中的文件名带有每次领取时生成的令牌（<任务ID>.<令牌>.json），续租和结束任务只操作自己令牌的文件：
+    租约丢失后任务即使已被别的节点重新领取，停滞的旧进程也无法续租或提交结果。
+    结束任务时先把该文件改名为本进程私有的 .finish 文件，再写入结果并改名到目标目录。
+    时间统一以共享目录上文件的修改时间为准，避免各机器时钟不一致。
+    
+    不使用 SQLite：其文件锁在 SMB/NFS 等网络文件系统上并不可靠。
+    """
+    
+    STATES = ['pending', 'running', 'done', 'failed']
+    MAX_ATTEMPTS = 3
+    
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        for state in self.STATES:
+            os.makedirs(os.path.join(self.root, state), exist_ok=True)
+    
+    def _path(self, state, job_id):
+        return os.path.join(self.root, state, job_id + '.json')
+    
+    def _running_path(self, job):
+        return os.path.join(self.root, 'running', f"{job['id']}.{job['claim']}.json")
+    
+    def _write(self, path, job):
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(temp, path)
+    
+    def _read(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def now(self):
+        """共享目录所在文件系统的当前时间"""
+        clock = os.path.join(self.root, '.clock')
+        with open(clock, 'a'):
+            pass
+        os.utime(clock)
+        return os.path.getmtime(clock)
+    
+    def submit(self, operation, inputs, output, params=None):
+        """提交任务：输出到文件夹的操作按输入文件拆成多个任务，合并为单个文件的操作作为一个任务"""
+        kind, ext = SERVICE_OPERATIONS[operation]
+        groups = [[p] for p in inputs] if kind == 'folder' else [list(inputs)]
+        # 时间戳在前保证按提交顺序领取；随机部分区分同一秒内（或不同机器上同一 PID）的多次提交
+        batch = f"{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:12]}"
+        job_ids = []
+        for i, group in enumerate(groups):
+            job_id = f"{batch}_{i:05d}_{operation}"
+            job = {
+                'id': job_id, 'operation': operation,
+                'inputs': [os.path.abspath(p) for p in group],
+                'output': os.path.abspath(output), 'params': params or {},
+                'attempts': 0, 'worker': None, 'submitted': time.time(),
+            }
+            self._write(self._path('pending', job_id), job)
+            job_ids.append(job_id)
+        return job_ids
+    
+    def claim(self, worker_id):
+        """领取一个待执行任务，没有时返回 None"""
+        for name in sorted(os.listdir(os.path.join(self.root, 'pending'))):
+            if not name.endswith('.json'):
+                continue
+            job_id = name[:-5]
+            token = uuid.uuid4().hex[:12]
+            running = self._running_path({'id': job_id, 'claim': token})
+            try:
+                os.rename(self._path('pending', job_id), running)
+                # 改名保留了提交时的修改时间，立即续租，以免被当作过期任务收回
+                os.utime(running)
+            except OSError:
+                continue    # 已被其他节点领取
+            try:
+                job = self._read(running)
+            except (OSError, ValueError):
+                continue
+            job['attempts'] += 1
+            job['worker'] = worker_id
+            job['claim'] = token
+            job['claimed'] = time.time()
+            self._write(running, job)
+            return job
+        return None
     
-    # ==================== 批量提取PDF图片 ====================
-    def extract_images_from_pdfs(self, pdf_paths, output_folder):
-        """批量提取PDF中的图片"""
+    def renew(self, job):
+        """续租；任务已被重新排队或被其他节点重新领取（租约丢失）时返回 False"""
         try:
-            self.controller.is_running = True
-            total = len(pdf_paths)
-            success_count = 0
-            
-            self.log(f"🔄 批量提取 {total} 个PDF中的图片...")
-            os.makedirs(output_folder, exist_ok=True)
-            
-            for i, pdf_path in enumerate(pdf_paths):
-                if not self.controller.check_pause():
-                    break
-                
-                base_name = Path(pdf_path).stem
-                pdf_output_folder = os.path.join(output_folder, base_name)
-                
-                self.controller.is_running = True
-                
-                if self._extract_images_single(pdf_path, pdf_output_folder, i + 1, total):
-                    success_count += 1
-            
-            self.log(f"✅ 完成！成功 {success_count}/{total}")
-            return success_count > 0
-            
-        except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
+            os.utime(self._running_path(job))
+            return True
+        except OSError:
             return False
-        finally:
-            self.controller.is_running = False
     
-    def _extract_images_single(self, pdf_path, output_folder, current_file, total_files):
-        """单个PDF提取图片"""
+    def complete(self, job, ok, logs=None):
+        """记录执行结果。失败且未超过重试次数的任务重新排队"""
+        running = self._running_path(job)
+        finishing = f"{running}.{os.getpid()}.finish"
         try:
-            self.log(f"🔄 [{current_file}/{total_files}] 提取: {os.path.basename(pdf_path)}")
-            
-            os.makedirs(output_folder, exist_ok=True)
-            
-            pdf_doc = fitz.open(pdf_path)
-            total = len(pdf_doc)
-            image_count = 0
-            
-            for page_num in range(total):
-                if not self.controller.check_pause():
-                    pdf_doc.close()
-                    return False
-                
-                page = pdf_doc[page_num]
-                image_list = page.get_images(full=True)
-                
-                self.log(f"  页面 {page_num + 1}: {len(image_list)} 张图片")
-                self.progress(page_num + 1, total)
-                
-                for img_idx, img in enumerate(image_list):
-                    try:
-                        xref = img[0]
-                        base_image = pdf_doc.extract_image(xref)
-                        image_bytes = base_image["image"]
-                        image_ext = base_image["ext"]
-                        
-                        image_count += 1
-                        out_path = os.path.join(output_folder, f"image_page{page_num + 1}_{img_idx + 1}.{image_ext}")
-                        
-                        with open(out_path, "wb") as f:
-                            f.write(image_bytes)
-                    except:
-                        continue
-            
-            pdf_doc.close()
-            
-            if image_count == 0:
-                self.log("⚠️ PDF中没有找到图片")
-            else:
-                self.log(f"✅ 共提取 {image_count} 张图片")
-            
-            return True
-            
-        except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
+            # 先改名取得文件；租约已丢失（已被移走或重新领取，令牌不同）时改名失败，不再写回
+            os.rename(running, finishing)
+        except OSError:
             return False
-    
-    def extract_images_from_pdf(self, pdf_path, output_folder):
-        """单个PDF提取图片（保持兼容性）"""
+        job['finished'] = time.time()
+        job['log'] = (logs or [])[-50:]
+        if ok:
+            state = 'done'
+        elif job['attempts'] < self.MAX_ATTEMPTS:
+            state = 'pending'
+        else:
+            state = 'failed'
+        self._write(finishing, job)
         try:
-            self.controller.is_running = True
-            return self._extract_images_single(pdf_path, output_folder, 1, 1)
-        finally:
-            self.controller.is_running = False
+            os.rename(finishing, self._path(state, job['id']))
+        except OSError:
+            return False
+        return True
     
-    # ==================== 图片转WebP ====================
-    def images_to_webp(self, input_paths, output_folder, quality=85, resize_percent=100):
-        try:
-            self.controller.is_running = True
-            total = len(input_paths)
-            self.log(f"🔄 转换 {total} 张图片为WebP...")
-            
-            os.makedirs(output_folder, exist_ok=True)
-            success_count = 0
-            
-            for i, img_path in enumerate(input_paths):
-                if not self.controller.check_pause():
-                    return False
-                
+    def requeue_expired(self, lease):
+        """回收超过 lease 秒未续租的任务，返回 [(任务 ID, 新状态)]
+        
+        未达到 MAX_ATTEMPTS 次领取的放回 pending/，否则移入 failed/，反复让工作进程崩溃的任务不会无限重试
+        """
+        now = self.now()
+        requeued = []
+        folder = os.path.join(self.root, 'running')
+        for name in os.listdir(folder):
+            # 也回收结束途中崩溃的进程留下的 .finish 文件
+            if not name.endswith(('.json', '.finish')):
+                continue
+            job_id = name.split('.', 1)[0]
+            path = os.path.join(folder, name)
+            try:
+                if now - os.path.getmtime(path) <= lease:
+                    continue
                 try:
-                    self.log(f"  处理 {i+1}/{total}: {os.path.basename(img_path)}")
-                    self.progress(i + 1, total)
-                    
-                    img = Image.open(img_path)
-                    
-                    if resize_percent != 100:
-                        new_w = int(img.width * resize_percent / 100)
-                        new_h = int(img.height * resize_percent / 100)
-                        img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-                    
-                    base_name = Path(img_path).stem
-                    out_path = os.path.join(output_folder, f"{base_name}.webp")
-                    
-                    img.save(out_path, 'WEBP', quality=quality, method=6)
-                    img.close()
-                    
-                    success_count += 1
-                    
-                except Exception as e:
-                    self.log(f"    ⚠️ 失败: {e}")
-            
-            self.log(f"✅ 成功转换 {success_count}/{total} 张图片")
-            return True
-            
+                    job = self._read(path)
+                except ValueError:
+                    job = None    # 写到一半的文件，按未超过次数处理
+                state = 'failed' if job and job.get('attempts', 0) >= self.MAX_ATTEMPTS else 'pending'
+                os.rename(path, self._path(state, job_id))
+            except OSError:
+                continue    # 已完成或已被其他节点处理
+            if state == 'failed':
+                job.setdefault('log', []).append(f"⛔ 租约过期 {job['attempts']} 次，不再重试")
+                try:
+                    self._write(self._path('failed', job_id), job)
+                except OSError:
+                    pass
+            requeued.append((job_id, state))
+        return requeued
+    
+    def counts(self):
+        return {state: sum(1 for n in os.listdir(os.path.join(self.root, state)) if n.endswith('.json'))
+                for state in self.STATES}
+    
+    def job_state(self, job_id):
+        for state in self.STATES:
+            if state == 'running':
+                prefix = job_id + '.'
+                if any(n.startswith(prefix) for n in os.listdir(os.path.join(self.root, state))):
+                    return state
+            elif os.path.exists(self._path(state, job_id)):
+                return state
+        return None
+    
+    def wait(self, job_ids, lease=None, poll=2.0):
+        """等待任务全部结束（done 或 failed）；提供 lease 时顺带回收过期租约"""
+        remaining = set(job_ids)
+        while remaining:
+            if lease:
+                self.requeue_expired(lease)
+            remaining = {j for j in remaining if self.job_state(j) not in ['done', 'failed']}
+            if remaining:
+                time.sleep(poll)
+        return {state: sum(1 for j in job_ids if self.job_state(j) == state) for state in ['done', 'failed']}
+
+
+def run_spool_worker(root, worker_id=None, lease=60, poll=2.0, exit_when_idle=False, log=print):
+    """工作进程主循环：领取任务 → 在后台线程续租的同时调用 DocumentConverter 执行 → 写回结果"""
+    import socket
+    spool = SpoolQueue(root)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    converter = DocumentConverter(log_callback=lambda msg: None)
+    busy = threading.Event()
+    METRICS.set_function('docconv_queue_depth', lambda: spool.counts()['pending'], 'spool')
+    METRICS.set_function('docconv_workers', lambda: int(busy.is_set()), 'busy')
+    METRICS.set_function('docconv_workers', lambda: int(not busy.is_set()), 'idle')
+    log(f"🛠️ 工作进程 {worker_id} 已启动，队列目录: {spool.root}")
+    
+    while True:
+        for job_id, state in spool.requeue_expired(lease):
+            if state == 'pending':
+                log(f"  ♻️ 租约过期，重新排队: {job_id}")
+            else:
+                log(f"  ⛔ 租约过期且已达重试上限，移入 failed: {job_id}")
+        job = spool.claim(worker_id)
+        if job is None:
+            # 仍有执行中的任务时继续等待：其租约可能过期而重新排队
+            counts = spool.counts()
+            if exit_when_idle and not counts['running'] and not counts['pending']:
+                return
+            time.sleep(poll)
+            continue
+        
+        log(f"▶️ {job['id']}（第 {job['attempts']} 次）")
+        logs = []
+        converter.log = logs.append
+        converter.controller.reset()
+        
+        stop = threading.Event()
+        lost = threading.Event()
+        
+        def heartbeat():
+            while not stop.wait(lease / 3):
+                if not spool.renew(job):
+                    # 任务已被其他节点重新排队，停止本次执行
+                    lost.set()
+                    converter.controller.stop()
+                    return
+        
+        beat = threading.Thread(target=heartbeat, daemon=True)
+        beat.start()
+        busy.set()
+        try:
+            if SERVICE_OPERATIONS[job['operation']][0] == 'folder':
+                os.makedirs(job['output'], exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+            ok = bool(getattr(converter, job['operation'])(job['inputs'], job['output'], **job['params']))
         except Exception as e:
-            self.log(f"❌ 错误: {str(e)}")
-            return False
+            logs.append(f"❌ 错误: {str(e)}")
+            ok = False
         finally:
-            self.controller.is_running = False
+            busy.clear()
+            stop.set()
+            beat.join()
+        
+        if lost.is_set() or not spool.complete(job, ok, logs):
+            log(f"  ⚠️ 租约已失效，结果交由重新领取的节点: {job['id']}")
+        else:
+            log(f"{'✅' if ok else '❌'} {job['id']}")
+
+
+# ==================== GUI界面 ====================
+class VirtualFileListView:
+    """只渲染可见行的文件列表视图
     
-    def folder_to_webp(self, input_folder, output_folder, quality=85, resize_percent=100):
-        extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff'}
-        files = []
+    Listbox 中始终只有一屏的行，滚动时按偏移量重新填充；
+    选中状态以模型索引保存，与当前渲染窗口无关。
+    """
+    
+    def __init__(self, parent, model, height=5, font=('Consolas', 9)):
+        self.model = model
+        self.offset = 0
+        self.rows = height
+        self.selection = set()
+        self._rendering = False
         
-        for root, dirs, filenames in os.walk(input_folder):
-            for f in filenames:
-                if Path(f).suffix.lower() in extensions:
-                    files.append(os.path.join(root, f))
+        self.frame = ttk.Frame(parent)
+        self.scrollbar = ttk.Scrollbar(self.frame, command=self._on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
-        if not files:
-            self.log("⚠️ 文件夹中没有图片")
-            return False
+        self.listbox = tk.Listbox(self.frame, height=height, selectmode=tk.EXTENDED,
+                                  font=font, exportselection=False)
+        self.listbox.pack(fill=tk.BOTH, expand=True)
+        self._line_height = tkfont.Font(font=font).metrics('linespace') + 1
         
-        self.log(f"📁 找到 {len(files)} 张图片")
-        return self.images_to_webp(files, output_folder, quality, resize_percent)
+        self.listbox.bind('<Configure>', self._on_resize)
+        self.listbox.bind('<<ListboxSelect>>', self._on_select)
+        self.listbox.bind('<MouseWheel>', self._on_wheel)
+        self.listbox.bind('<Button-4>', lambda e: self._scroll_to(self.offset - 3) or 'break')
+        self.listbox.bind('<Button-5>', lambda e: self._scroll_to(self.offset + 3) or 'break')
+    
+    def refresh(self):
+        total = len(self.model)
+        self.offset = max(0, min(self.offset, total - self.rows))
+        end = min(total, self.offset + self.rows)
+        
+        self._rendering = True
+        self.listbox.delete(0, tk.END)
+        if end > self.offset:
+            self.listbox.insert(tk.END, *[os.path.basename(p) for p in self.model.items[self.offset:end]])
+            for i in range(self.offset, end):
+                if i in self.selection:
+                    self.listbox.selection_set(i - self.offset)
+        self.listbox.yview_moveto(0)
+        self._rendering = False
+        
+        if total:
+            self.scrollbar.set(self.offset / total, end / total)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def curselection(self):
+        """与 Listbox.curselection 相同的接口，返回模型中的索引"""
+        return tuple(sorted(self.selection))
+    
+    def set_selection(self, indices):
+        self.selection = set(indices)
+    
+    def clear_selection(self):
+        self.selection = set()
+    
+    def see(self, index):
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.rows:
+            self.offset = index - self.rows + 1
+    
+    def _scroll_to(self, offset):
+        self.offset = offset
+        self.refresh()
+    
+    def _on_scroll(self, *args):
+        if args[0] == 'moveto':
+            self._scroll_to(int(float(args[1]) * len(self.model)))
+        elif args[0] == 'scroll':
+            step = self.rows if args[2] == 'pages' else 1
+            self._scroll_to(self.offset + int(args[1]) * step)
+    
+    def _on_wheel(self, event):
+        self._scroll_to(self.offset - int(event.delta / 120) * 3)
+        return 'break'
+    
+    def _on_resize(self, event):
+        rows = max(1, event.height // self._line_height)
+        if rows != self.rows:
+            self.rows = rows
+            self.refresh()
+    
+    def _on_select(self, event):
+        if self._rendering:
+            return
+        visible = range(self.offset, self.offset + self.listbox.size())
+        self.selection.difference_update(visible)
+        self.selection.update(self.offset + i for i in self.listbox.curselection())
 
 
-# ==================== GUI界面 ====================
 class ConverterGUI:
     """GUI界面"""
     
@@ -1279,10 +6712,10 @@ class ConverterGUI:
         self.converter = DocumentConverter(self.log_message, self.update_progress)
         
         # 文件列表存储
-        self.selected_files = []      # 图片文件
-        self.doc_files = []           # 文档文件
-        self.sheet_files = []         # 表格文件
-        self.pdf_files = []           # PDF文件
+        self.selected_files = FileListModel()      # 图片文件
+        self.doc_files = FileListModel()           # 文档文件
+        self.sheet_files = FileListModel()         # 表格文件
+        self.pdf_files = FileListModel()           # PDF文件
         self.url_list = []            # URL列表
         
         self.create_widgets()
@@ -1318,7 +6751,7 @@ class ConverterGUI:
         self.progress_bar = ttk.Progressbar(progress_frame, variable=self.progress_var, maximum=100)
         self.progress_bar.pack(fill=tk.X, side=tk.LEFT, expand=True, padx=(0, 10))
         
-        self.progress_label = ttk.Label(progress_frame, text="就绪", width=15)
+        self.progress_label = ttk.Label(progress_frame, text="就绪", width=40)
         self.progress_label.pack(side=tk.RIGHT)
         
         # 控制按钮
@@ -1328,6 +6761,9 @@ class ConverterGUI:
         ttk.Button(control_frame, text="⏸️ 暂停", command=self.pause_task, width=12).pack(side=tk.LEFT, padx=2)
         ttk.Button(control_frame, text="▶️ 继续", command=self.resume_task, width=12).pack(side=tk.LEFT, padx=2)
         ttk.Button(control_frame, text="⏹️ 终止", command=self.stop_task, width=12).pack(side=tk.LEFT, padx=2)
+        self.resume_batch = tk.BooleanVar(value=False)
+        ttk.Checkbutton(control_frame, text="🔁 断点续传（跳过已完成）",
+                        variable=self.resume_batch).pack(side=tk.LEFT, padx=10)
         ttk.Button(control_frame, text="🗑️ 清除日志", command=self.clear_log, width=12).pack(side=tk.RIGHT, padx=2)
         
         # 日志
@@ -1340,7 +6776,7 @@ class ConverterGUI:
         self.log_message("✅ 程序启动成功！支持批量多文件选择")
         self.log_message("=" * 60)
     
-    def create_file_list_widget(self, parent, list_var_name, file_types, title="文件列表"):
+    def create_file_list_widget(self, parent, model, file_types, title="文件列表"):
         """创建通用的文件列表组件"""
         frame = ttk.LabelFrame(parent, text=f"📁 {title}", padding="10")
         frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
@@ -1351,27 +6787,31 @@ class ConverterGUI:
         add_btn = ttk.Button(btn_frame, text="➕ 添加文件", width=12)
         add_btn.pack(side=tk.LEFT, padx=2)
         
+        folder_btn = ttk.Button(btn_frame, text="📂 添加文件夹", width=12)
+        folder_btn.pack(side=tk.LEFT, padx=2)
+        
         clear_btn = ttk.Button(btn_frame, text="🗑️ 清除全部", width=12)
         clear_btn.pack(side=tk.LEFT, padx=2)
         
         del_btn = ttk.Button(btn_frame, text="❌ 删除选中", width=12)
         del_btn.pack(side=tk.LEFT, padx=2)
         
+        sort_box = ttk.Combobox(btn_frame, values=['按名称排序', '按修改时间排序'], state='readonly', width=14)
+        sort_box.set('排序...')
+        sort_box.pack(side=tk.LEFT, padx=2)
+        
         count_label = ttk.Label(btn_frame, text="已选择: 0 个文件")
         count_label.pack(side=tk.RIGHT, padx=5)
         
-        list_frame = ttk.Frame(frame)
-        list_frame.pack(fill=tk.BOTH, expand=True)
-        
-        scrollbar = ttk.Scrollbar(list_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        view = VirtualFileListView(frame, model)
+        view.frame.pack(fill=tk.BOTH, expand=True)
         
-        listbox = tk.Listbox(list_frame, height=5, selectmode=tk.EXTENDED, 
-                            yscrollcommand=scrollbar.set, font=('Consolas', 9))
-        listbox.pack(fill=tk.BOTH, expand=True)
-        scrollbar.config(command=listbox.yview)
+        extensions = {Path(p).suffix.lower() for _, patterns in file_types for p in patterns.split()}
+        folder_btn.config(command=lambda: self.add_folder(model, view, count_label, extensions))
+        sort_box.bind('<<ComboboxSelected>>',
+                      lambda e: self.sort_file_list(model, view, 'mtime' if sort_box.current() == 1 else 'natural'))
         
-        return frame, listbox, add_btn, clear_btn, del_btn, count_label
+        return frame, view, add_btn, clear_btn, del_btn, count_label
     
     def create_image_tab(self):
         tab = ttk.Frame(self.notebook, padding="15")
@@ -1379,7 +6819,7 @@ class ConverterGUI:
         
         # 文件列表
         _, self.image_listbox, add_btn, clear_btn, del_btn, self.image_count_label = \
-            self.create_file_list_widget(tab, 'selected_files', 
+            self.create_file_list_widget(tab, self.selected_files, 
                 [("图片", "*.png *.jpg *.jpeg *.bmp *.gif *.tiff *.webp")], "图片文件")
         
         add_btn.config(command=self.add_images)
@@ -1400,6 +6840,16 @@ class ConverterGUI:
         for val, text in [('high', '高 (300 DPI)'), ('medium', '中 (150 DPI)'), ('low', '低 (72 DPI)')]:
             ttk.Radiobutton(quality_frame, text=text, variable=self.image_quality, value=val).pack(side=tk.LEFT, padx=10)
         
+        ttk.Label(quality_frame, text="PDF纸张:").pack(side=tk.LEFT, padx=(20, 5))
+        self.image_page_size = tk.StringVar(value='原图')
+        ttk.Combobox(quality_frame, textvariable=self.image_page_size, values=['原图', 'A4', 'Letter'],
+                     state='readonly', width=7).pack(side=tk.LEFT)
+        
+        ttk.Label(quality_frame, text="PPT重复图片:").pack(side=tk.LEFT, padx=(20, 5))
+        self.image_ppt_dedup = tk.StringVar(value='off')
+        for val, text in [('off', '保留'), ('skip', '跳过连续重复')]:
+            ttk.Radiobutton(quality_frame, text=text, variable=self.image_ppt_dedup, value=val).pack(side=tk.LEFT, padx=5)
+        
         # 转换按钮
         convert_frame = ttk.Frame(tab)
         convert_frame.pack(fill=tk.X)
@@ -1419,7 +6869,7 @@ class ConverterGUI:
         
         # 文件列表
         _, self.doc_listbox, add_btn, clear_btn, del_btn, self.doc_count_label = \
-            self.create_file_list_widget(tab, 'doc_files', 
+            self.create_file_list_widget(tab, self.doc_files, 
                 [("Word文档", "*.docx *.doc *.wps *.rtf")], "Word文档")
         
         add_btn.config(command=self.add_documents)
@@ -1444,7 +6894,7 @@ class ConverterGUI:
         
         # 文件列表
         _, self.sheet_listbox, add_btn, clear_btn, del_btn, self.sheet_count_label = \
-            self.create_file_list_widget(tab, 'sheet_files', 
+            self.create_file_list_widget(tab, self.sheet_files, 
                 [("Excel表格", "*.xlsx *.xls *.csv")], "Excel表格")
         
         add_btn.config(command=self.add_spreadsheets)
@@ -1489,7 +6939,7 @@ class ConverterGUI:
         
         # 文件列表
         _, self.pdf_listbox, add_btn, clear_btn, del_btn, self.pdf_count_label = \
-            self.create_file_list_widget(tab, 'pdf_files', 
+            self.create_file_list_widget(tab, self.pdf_files, 
                 [("PDF文件", "*.pdf")], "PDF文件")
         
         add_btn.config(command=self.add_pdfs)
@@ -1511,6 +6961,60 @@ class ConverterGUI:
         self.image_format = tk.StringVar(value='png')
         ttk.Radiobutton(settings_row, text="PNG", variable=self.image_format, value='png').pack(side=tk.LEFT, padx=5)
         ttk.Radiobutton(settings_row, text="JPG", variable=self.image_format, value='jpg').pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(settings_row, text="WebP", variable=self.image_format, value='webp').pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(settings_row, text="TIFF", variable=self.image_format, value='tiff').pack(side=tk.LEFT, padx=5)
+        
+        jpg_row = ttk.Frame(settings_frame)
+        jpg_row.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(jpg_row, text="JPG/WebP质量:").pack(side=tk.LEFT, padx=(0, 5))
+        self.pdf_jpg_quality = tk.IntVar(value=95)
+        ttk.Spinbox(jpg_row, from_=1, to=100, textvariable=self.pdf_jpg_quality, width=6).pack(side=tk.LEFT, padx=(0, 20))
+        
+        ttk.Label(jpg_row, text="色度采样:").pack(side=tk.LEFT, padx=(0, 5))
+        self.pdf_subsampling = tk.StringVar(value='默认')
+        ttk.Combobox(jpg_row, textvariable=self.pdf_subsampling, values=['默认', '4:4:4', '4:2:2', '4:2:0'],
+                     state='readonly', width=8).pack(side=tk.LEFT, padx=(0, 20))
+        
+        ttk.Label(jpg_row, text="颜色:").pack(side=tk.LEFT, padx=(0, 5))
+        self.pdf_color_mode = tk.StringVar(value='auto')
+        for val, text in [('auto', '自动'), ('rgb', '彩色'), ('gray', '灰度'), ('bilevel', '黑白')]:
+            ttk.Radiobutton(jpg_row, text=text, variable=self.pdf_color_mode, value=val).pack(side=tk.LEFT, padx=5)
+        
+        container_row = ttk.Frame(settings_frame)
+        container_row.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(container_row, text="PDF→图片输出:").pack(side=tk.LEFT, padx=(0, 5))
+        self.pdf_container = tk.StringVar(value='')
+        for val, text in [('', '每页一个文件'), ('tiff', '多页TIFF'), ('zip', 'ZIP'), ('cbz', 'CBZ'), ('pdf', '纯图片PDF')]:
+            ttk.Radiobutton(container_row, text=text, variable=self.pdf_container, value=val).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(container_row, text="TIFF压缩:").pack(side=tk.LEFT, padx=(15, 5))
+        self.pdf_tiff_compression = tk.StringVar(value='tiff_lzw')
+        ttk.Combobox(container_row, textvariable=self.pdf_tiff_compression, values=['tiff_lzw', 'group4', 'jpeg'],
+                     state='readonly', width=9).pack(side=tk.LEFT)
+        
+        size_row = ttk.Frame(settings_frame)
+        size_row.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(size_row, text="渲染尺寸:").pack(side=tk.LEFT, padx=(0, 5))
+        self.pdf_size_mode = tk.StringVar(value='dpi')
+        ttk.Radiobutton(size_row, text="按DPI", variable=self.pdf_size_mode, value='dpi').pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(size_row, text="每页缩放到不超过", variable=self.pdf_size_mode, value='fit').pack(side=tk.LEFT, padx=5)
+        self.pdf_max_width = tk.IntVar(value=1920)
+        ttk.Spinbox(size_row, from_=100, to=20000, textvariable=self.pdf_max_width, width=7).pack(side=tk.LEFT)
+        ttk.Label(size_row, text="x").pack(side=tk.LEFT, padx=2)
+        self.pdf_max_height = tk.IntVar(value=1080)
+        ttk.Spinbox(size_row, from_=100, to=20000, textvariable=self.pdf_max_height, width=7).pack(side=tk.LEFT)
+        ttk.Label(size_row, text="像素（PPT 建议 1920x1080，与幻灯片显示分辨率一致）").pack(side=tk.LEFT, padx=5)
+        
+        ppt_row = ttk.Frame(settings_frame)
+        ppt_row.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(ppt_row, text="PDF→PPT重复页面:").pack(side=tk.LEFT, padx=(0, 5))
+        self.pdf_ppt_dedup = tk.StringVar(value='off')
+        for val, text in [('off', '保留'), ('skip', '跳过连续重复页')]:
+            ttk.Radiobutton(ppt_row, text=text, variable=self.pdf_ppt_dedup, value=val).pack(side=tk.LEFT, padx=5)
         
         # 转换按钮
         convert_frame = ttk.LabelFrame(tab, text="🔄 转换操作", padding="10")
@@ -1525,6 +7029,49 @@ class ConverterGUI:
                   command=lambda: self.run_task(self.convert_pdfs_to_images), width=15).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_row, text="📤 批量提取图片", 
                   command=lambda: self.run_task(self.extract_pdfs_images), width=15).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_row, text="🗜️ 批量压缩PDF", 
+                  command=lambda: self.run_task(self.optimize_pdfs), width=15).pack(side=tk.LEFT, padx=5)
+        
+        # 多输出：每个PDF只解析一次，同时生成所选的几种输出
+        multi_row = ttk.Frame(convert_frame)
+        multi_row.pack(fill=tk.X, pady=(8, 0))
+        
+        self.multi_images = tk.BooleanVar(value=True)
+        self.multi_ppt = tk.BooleanVar(value=True)
+        self.multi_thumbnails = tk.BooleanVar(value=False)
+        self.multi_extract = tk.BooleanVar(value=False)
+        for var, text in [(self.multi_images, '图片'), (self.multi_ppt, 'PPT'),
+                          (self.multi_thumbnails, '缩略图'), (self.multi_extract, '提取图片')]:
+            ttk.Checkbutton(multi_row, text=text, variable=var).pack(side=tk.LEFT, padx=5)
+        ttk.Button(multi_row, text="⚡ 一次生成所选输出",
+                  command=lambda: self.run_task(self.convert_pdfs_multi_output), width=18).pack(side=tk.LEFT, padx=10)
+        
+        # 合并与拆分：直接复制页面，不重新渲染
+        merge_row = ttk.Frame(convert_frame)
+        merge_row.pack(fill=tk.X, pady=(8, 0))
+        
+        ttk.Button(merge_row, text="📎 合并为一个PDF",
+                  command=lambda: self.run_task(self.merge_pdfs), width=15).pack(side=tk.LEFT, padx=5)
+        ttk.Label(merge_row, text="拆分方式:").pack(side=tk.LEFT, padx=(15, 5))
+        self.split_mode = tk.StringVar(value='pages')
+        for val, text in [('pages', '每份页数'), ('size', '体积上限(MB)'), ('bookmark', '书签级别')]:
+            ttk.Radiobutton(merge_row, text=text, variable=self.split_mode, value=val).pack(side=tk.LEFT, padx=5)
+        self.split_value = tk.IntVar(value=100)
+        ttk.Spinbox(merge_row, from_=1, to=100000, textvariable=self.split_value, width=7).pack(side=tk.LEFT, padx=5)
+        ttk.Button(merge_row, text="✂️ 批量拆分PDF",
+                  command=lambda: self.run_task(self.split_pdfs), width=15).pack(side=tk.LEFT, padx=10)
+        
+        # 全文索引：提取文本存入本机索引库，搜索结果输出到日志
+        text_row = ttk.Frame(convert_frame)
+        text_row.pack(fill=tk.X, pady=(8, 0))
+        
+        ttk.Button(text_row, text="🔎 建立全文索引",
+                  command=lambda: self.run_task(self.index_pdfs_text), width=15).pack(side=tk.LEFT, padx=5)
+        self.text_query = tk.StringVar()
+        query_entry = ttk.Entry(text_row, textvariable=self.text_query, width=40)
+        query_entry.pack(side=tk.LEFT, padx=(15, 5))
+        query_entry.bind('<Return>', lambda e: self.search_pdfs_text())
+        ttk.Button(text_row, text="🔍 搜索", command=self.search_pdfs_text, width=8).pack(side=tk.LEFT, padx=5)
     
     def create_webp_tab(self):
         tab = ttk.Frame(self.notebook, padding="15")
@@ -1595,11 +7142,20 @@ class ConverterGUI:
         
         ttk.Button(btn_frame, text="🔄 重新检测驱动", command=self.refresh_drivers).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="📂 打开程序目录", command=lambda: os.startfile(os.getcwd())).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="📊 任务统计", command=self.show_history_report).pack(side=tk.LEFT, padx=5)
     
     def refresh_drivers(self):
         self.converter.driver_manager._find_drivers()
         self.log_message("🔄 已重新检测驱动")
     
+    def show_history_report(self):
+        """在日志区输出最近 30 天的吞吐量、失败率趋势和各后端速度对比"""
+        if self.converter.history is None:
+            self.log_message("⚠️ 任务历史不可用")
+            return
+        for line in self.converter.history.report(days=30):
+            self.log_message(line)
+    
     # ================ 辅助方法 ================
     
     def log_message(self, message):
@@ -1608,11 +7164,23 @@ class ConverterGUI:
             self.log_text.see(tk.END)
         self.root.after(0, _log)
     
-    def update_progress(self, current, total):
+    def update_progress(self, current, total, info=None):
         def _update():
             percent = (current / total) * 100 if total > 0 else 0
             self.progress_var.set(percent)
-            self.progress_label.config(text=f"{current}/{total} ({percent:.0f}%)")
+            if info is None:
+                self.progress_label.config(text=f"{current}/{total} ({percent:.0f}%)")
+                return
+            parts = [f"{percent:.1f}%"]
+            if info['items'] > 1:
+                parts.append(f"文件 {info['item']}/{info['items']}")
+            if info['unit'] and info['pages'] > 1:
+                parts.append(f"{info['unit']} {info['page']}/{info['pages']}")
+            if info['eta'] is not None and percent < 100:
+                parts.append(f"剩余 {ProgressTracker.format_seconds(info['eta'])}")
+            elif percent >= 100:
+                parts.append(f"用时 {ProgressTracker.format_seconds(info['elapsed'])}")
+            self.progress_label.config(text=" · ".join(parts))
         self.root.after(0, _update)
     
     def clear_log(self):
@@ -1641,6 +7209,41 @@ class ConverterGUI:
             self.converter.controller.stop()
             self.log_message("⏹️ 终止中...")
     
+    # ================ 文件列表通用操作 ================
+    
+    def add_folder(self, model, view, count_label, extensions):
+        """递归添加文件夹，扫描在后台线程进行，避免大目录卡住界面"""
+        folder = filedialog.askdirectory(title="选择文件夹（包含子文件夹）")
+        if not folder:
+            return
+        
+        count_label.config(text="扫描中...")
+        
+        def _scan():
+            files = FileListModel.scan_folder(folder, extensions)
+            self.root.after(0, lambda: _apply(files))
+        
+        def _apply(files):
+            added = model.add_many(files)
+            view.refresh()
+            count_label.config(text=f"已选择: {len(model)} 个文件")
+            self.log_message(f"📂 从文件夹添加 {added} 个文件，共 {len(model)} 个")
+        
+        threading.Thread(target=_scan, daemon=True).start()
+    
+    def sort_file_list(self, model, view, key):
+        """按自然顺序或修改时间排序，读取修改时间可能较慢，同样放到后台线程"""
+        def _sort():
+            items = model.sorted_items(key)
+            self.root.after(0, lambda: _apply(items))
+        
+        def _apply(items):
+            model.reorder(items)
+            view.clear_selection()
+            view.refresh()
+        
+        threading.Thread(target=_sort, daemon=True).start()
+    
     # ================ 图片文件操作 ================
     
     def add_images(self):
@@ -1648,50 +7251,40 @@ class ConverterGUI:
             title="选择图片（可多选）", 
             filetypes=[("图片", "*.png *.jpg *.jpeg *.bmp *.gif *.tiff *.webp"), ("所有", "*.*")]
         )
-        for f in files:
-            if f not in self.selected_files:
-                self.selected_files.append(f)
-                self.image_listbox.insert(tk.END, os.path.basename(f))
+        self.selected_files.add_many(files)
+        self.image_listbox.refresh()
         self._update_image_count()
         if files:
             self.log_message(f"📁 添加 {len(files)} 张图片，共 {len(self.selected_files)} 张")
     
     def clear_images(self):
         self.selected_files.clear()
-        self.image_listbox.delete(0, tk.END)
+        self.image_listbox.clear_selection()
+        self.image_listbox.refresh()
         self._update_image_count()
     
     def delete_selected_images(self):
-        sel = list(self.image_listbox.curselection())
-        for i in reversed(sel):
-            del self.selected_files[i]
-            self.image_listbox.delete(i)
+        self.selected_files.remove_indices(self.image_listbox.curselection())
+        self.image_listbox.clear_selection()
+        self.image_listbox.refresh()
         self._update_image_count()
     
     def _update_image_count(self):
         self.image_count_label.config(text=f"已选择: {len(self.selected_files)} 个文件")
     
     def move_up(self):
-        sel = self.image_listbox.curselection()
-        if not sel or sel[0] == 0:
-            return
-        for i in sel:
-            self.selected_files[i], self.selected_files[i-1] = self.selected_files[i-1], self.selected_files[i]
-            text = self.image_listbox.get(i)
-            self.image_listbox.delete(i)
-            self.image_listbox.insert(i-1, text)
-            self.image_listbox.selection_set(i-1)
+        self._move_selected(-1)
     
     def move_down(self):
-        sel = self.image_listbox.curselection()
-        if not sel or sel[-1] >= len(self.selected_files) - 1:
+        self._move_selected(1)
+    
+    def _move_selected(self, delta):
+        sel = self.selected_files.move(self.image_listbox.curselection(), delta)
+        if not sel:
             return
-        for i in reversed(sel):
-            self.selected_files[i], self.selected_files[i+1] = self.selected_files[i+1], self.selected_files[i]
-            text = self.image_listbox.get(i)
-            self.image_listbox.delete(i)
-            self.image_listbox.insert(i+1, text)
-            self.image_listbox.selection_set(i+1)
+        self.image_listbox.set_selection(sel)
+        self.image_listbox.see(sel[0] if delta < 0 else sel[-1])
+        self.image_listbox.refresh()
     
     # ================ 文档文件操作 ================
     
@@ -1700,24 +7293,22 @@ class ConverterGUI:
             title="选择文档（可多选）", 
             filetypes=[("Word文档", "*.docx *.doc *.wps *.rtf"), ("所有", "*.*")]
         )
-        for f in files:
-            if f not in self.doc_files:
-                self.doc_files.append(f)
-                self.doc_listbox.insert(tk.END, os.path.basename(f))
+        self.doc_files.add_many(files)
+        self.doc_listbox.refresh()
         self._update_doc_count()
         if files:
             self.log_message(f"📄 添加 {len(files)} 个文档，共 {len(self.doc_files)} 个")
     
     def clear_documents(self):
         self.doc_files.clear()
-        self.doc_listbox.delete(0, tk.END)
+        self.doc_listbox.clear_selection()
+        self.doc_listbox.refresh()
         self._update_doc_count()
     
     def delete_selected_documents(self):
-        sel = list(self.doc_listbox.curselection())
-        for i in reversed(sel):
-            del self.doc_files[i]
-            self.doc_listbox.delete(i)
+        self.doc_files.remove_indices(self.doc_listbox.curselection())
+        self.doc_listbox.clear_selection()
+        self.doc_listbox.refresh()
         self._update_doc_count()
     
     def _update_doc_count(self):
@@ -1730,24 +7321,22 @@ class ConverterGUI:
             title="选择表格（可多选）", 
             filetypes=[("Excel表格", "*.xlsx *.xls *.csv"), ("所有", "*.*")]
         )
-        for f in files:
-            if f not in self.sheet_files:
-                self.sheet_files.append(f)
-                self.sheet_listbox.insert(tk.END, os.path.basename(f))
+        self.sheet_files.add_many(files)
+        self.sheet_listbox.refresh()
         self._update_sheet_count()
         if files:
             self.log_message(f"📊 添加 {len(files)} 个表格，共 {len(self.sheet_files)} 个")
     
     def clear_spreadsheets(self):
         self.sheet_files.clear()
-        self.sheet_listbox.delete(0, tk.END)
+        self.sheet_listbox.clear_selection()
+        self.sheet_listbox.refresh()
         self._update_sheet_count()
     
     def delete_selected_spreadsheets(self):
-        sel = list(self.sheet_listbox.curselection())
-        for i in reversed(sel):
-            del self.sheet_files[i]
-            self.sheet_listbox.delete(i)
+        self.sheet_files.remove_indices(self.sheet_listbox.curselection())
+        self.sheet_listbox.clear_selection()
+        self.sheet_listbox.refresh()
         self._update_sheet_count()
     
     def _update_sheet_count(self):
@@ -1760,24 +7349,22 @@ class ConverterGUI:
             title="选择PDF（可多选）", 
             filetypes=[("PDF文件", "*.pdf"), ("所有", "*.*")]
         )
-        for f in files:
-            if f not in self.pdf_files:
-                self.pdf_files.append(f)
-                self.pdf_listbox.insert(tk.END, os.path.basename(f))
+        self.pdf_files.add_many(files)
+        self.pdf_listbox.refresh()
         self._update_pdf_count()
         if files:
             self.log_message(f"📄 添加 {len(files)} 个PDF，共 {len(self.pdf_files)} 个")
     
     def clear_pdfs(self):
         self.pdf_files.clear()
-        self.pdf_listbox.delete(0, tk.END)
+        self.pdf_listbox.clear_selection()
+        self.pdf_listbox.refresh()
         self._update_pdf_count()
     
     def delete_selected_pdfs(self):
-        sel = list(self.pdf_listbox.curselection())
-        for i in reversed(sel):
-            del self.pdf_files[i]
-            self.pdf_listbox.delete(i)
+        self.pdf_files.remove_indices(self.pdf_listbox.curselection())
+        self.pdf_listbox.clear_selection()
+        self.pdf_listbox.refresh()
         self._update_pdf_count()
     
     def _update_pdf_count(self):
@@ -1814,7 +7401,9 @@ class ConverterGUI:
             title="保存PDF", defaultextension=".pdf", filetypes=[("PDF", "*.pdf")]
         )
         if output:
-            self.converter.images_to_pdf(self.selected_files, output, self.image_quality.get())
+            page_size = self.image_page_size.get()
+            self.converter.images_to_pdf(list(self.selected_files), output, self.image_quality.get(),
+                                         None if page_size == '原图' else page_size)
     
     def convert_images_to_ppt(self):
         if not self.selected_files:
@@ -1824,7 +7413,8 @@ class ConverterGUI:
             title="保存PPT", defaultextension=".pptx", filetypes=[("PPT", "*.pptx")]
         )
         if output:
-            self.converter.images_to_ppt(self.selected_files, output, self.image_quality.get())
+            self.converter.images_to_ppt(list(self.selected_files), output, self.image_quality.get(),
+                                         self.image_ppt_dedup.get())
     
     def convert_docs_to_pdf(self):
         if not self.doc_files:
@@ -1832,7 +7422,7 @@ class ConverterGUI:
             return
         output = filedialog.askdirectory(title="选择输出文件夹")
         if output:
-            self.converter.documents_to_pdf(self.doc_files, output)
+            self.converter.documents_to_pdf(list(self.doc_files), output, resume=self.resume_batch.get())
     
     def convert_sheets_to_pdf(self):
         if not self.sheet_files:
@@ -1840,7 +7430,7 @@ class ConverterGUI:
             return
         output = filedialog.askdirectory(title="选择输出文件夹")
         if output:
-            self.converter.spreadsheets_to_pdf(self.sheet_files, output)
+            self.converter.spreadsheets_to_pdf(list(self.sheet_files), output, resume=self.resume_batch.get())
     
     def convert_urls_to_pdf(self):
         text = self.url_text.get(1.0, tk.END).strip()
@@ -1871,6 +7461,11 @@ class ConverterGUI:
             if output:
                 self.converter.urls_to_pdf(urls, output)
     
+    def _pdf_max_size(self):
+        if self.pdf_size_mode.get() != 'fit':
+            return None
+        return (self.pdf_max_width.get(), self.pdf_max_height.get())
+    
     def convert_pdfs_to_ppt(self):
         if not self.pdf_files:
             messagebox.showwarning("提示", "请先添加PDF")
@@ -1881,11 +7476,14 @@ class ConverterGUI:
                 title="保存PPT", defaultextension=".pptx", filetypes=[("PPT", "*.pptx")]
             )
             if output:
-                self.converter.pdf_to_ppt(self.pdf_files[0], output, self.pdf_dpi.get())
+                self.converter.pdf_to_ppt(self.pdf_files[0], output, self.pdf_dpi.get(), self.pdf_color_mode.get(),
+                                          self.pdf_ppt_dedup.get(), self._pdf_max_size())
         else:
             output = filedialog.askdirectory(title="选择输出文件夹")
             if output:
-                self.converter.pdfs_to_ppt(self.pdf_files, output, self.pdf_dpi.get())
+                self.converter.pdfs_to_ppt(list(self.pdf_files), output, self.pdf_dpi.get(), self.pdf_color_mode.get(),
+                                           resume=self.resume_batch.get(), dedup=self.pdf_ppt_dedup.get(),
+                                           max_size=self._pdf_max_size())
     
     def convert_pdfs_to_images(self):
         if not self.pdf_files:
@@ -1893,15 +7491,51 @@ class ConverterGUI:
             return
         output = filedialog.askdirectory(title="选择输出文件夹")
         if output:
+            subsampling = self.pdf_subsampling.get()
+            subsampling = None if subsampling == '默认' else subsampling
             if len(self.pdf_files) == 1:
                 self.converter.pdf_to_images(
-                    self.pdf_files[0], output, self.pdf_dpi.get(), self.image_format.get()
+                    self.pdf_files[0], output, self.pdf_dpi.get(), self.image_format.get(),
+                    self.pdf_jpg_quality.get(), subsampling, self.pdf_color_mode.get(),
+                    self.pdf_container.get() or None, self.pdf_tiff_compression.get(),
+                    max_size=self._pdf_max_size()
                 )
             else:
                 self.converter.pdfs_to_images(
-                    self.pdf_files, output, self.pdf_dpi.get(), self.image_format.get()
+                    list(self.pdf_files), output, self.pdf_dpi.get(), self.image_format.get(),
+                    self.pdf_jpg_quality.get(), subsampling, self.pdf_color_mode.get(),
+                    self.pdf_container.get() or None, self.pdf_tiff_compression.get(),
+                    resume=self.resume_batch.get(), max_size=self._pdf_max_size()
                 )
     
+    def convert_pdfs_multi_output(self):
+        if not self.pdf_files:
+            messagebox.showwarning("提示", "请先添加PDF")
+            return
+        if not (self.multi_images.get() or self.multi_ppt.get() or
+                self.multi_thumbnails.get() or self.multi_extract.get()):
+            messagebox.showwarning("提示", "请至少选择一种输出")
+            return
+        output = filedialog.askdirectory(title="选择输出文件夹")
+        if output:
+            subsampling = self.pdf_subsampling.get()
+            images = None
+            if self.multi_images.get():
+                images = {
+                    'dpi': self.pdf_dpi.get(), 'img_format': self.image_format.get(),
+                    'jpg_quality': self.pdf_jpg_quality.get(),
+                    'subsampling': None if subsampling == '默认' else subsampling,
+                    'max_size': self._pdf_max_size(),
+                }
+            ppt = None
+            if self.multi_ppt.get():
+                ppt = {'dpi': self.pdf_dpi.get(), 'max_size': self._pdf_max_size(), 'dedup': self.pdf_ppt_dedup.get()}
+            thumbnails = {'size': 256} if self.multi_thumbnails.get() else None
+            self.converter.pdfs_multi_output(
+                list(self.pdf_files), output, images, ppt, thumbnails, self.multi_extract.get(),
+                self.pdf_color_mode.get(), resume=self.resume_batch.get()
+            )
+    
     def extract_pdfs_images(self):
         if not self.pdf_files:
             messagebox.showwarning("提示", "请先添加PDF")
@@ -1911,7 +7545,60 @@ class ConverterGUI:
             if len(self.pdf_files) == 1:
                 self.converter.extract_images_from_pdf(self.pdf_files[0], output)
             else:
-                self.converter.extract_images_from_pdfs(self.pdf_files, output)
+                self.converter.extract_images_from_pdfs(list(self.pdf_files), output)
+    
+    def merge_pdfs(self):
+        if len(self.pdf_files) < 2:
+            messagebox.showwarning("提示", "请至少添加两个PDF")
+            return
+        output = filedialog.asksaveasfilename(
+            title="保存PDF", defaultextension=".pdf", filetypes=[("PDF", "*.pdf")]
+        )
+        if output:
+            self.converter.pdfs_merge(list(self.pdf_files), output)
+    
+    def split_pdfs(self):
+        if not self.pdf_files:
+            messagebox.showwarning("提示", "请先添加PDF")
+            return
+        output = filedialog.askdirectory(title="选择输出文件夹")
+        if output:
+            option = {'pages': 'pages_per_file', 'size': 'max_mb', 'bookmark': 'bookmark_level'}[self.split_mode.get()]
+            self.converter.pdfs_split(list(self.pdf_files), output, resume=self.resume_batch.get(),
+                                      **{option: self.split_value.get()})
+    
+    def index_pdfs_text(self):
+        if not self.pdf_files:
+            messagebox.showwarning("提示", "请先添加PDF")
+            return
+        self.converter.pdfs_index_text(list(self.pdf_files))
+    
+    def search_pdfs_text(self):
+        query = self.text_query.get().strip()
+        if not query:
+            return
+        
+        def _search():
+            start = time.time()
+            try:
+                results = self.converter.search_text(query, limit=50)
+            except Exception as e:
+                self.log_message(f"❌ 搜索失败: {e}")
+                return
+            self.log_message(f"🔍 “{query}”：{len(results)} 个结果（{(time.time() - start) * 1000:.0f} 毫秒）")
+            for row in results:
+                self.log_message(f"  {row['path']} 第 {row['page']} 页：{row['snippet']}")
+        
+        threading.Thread(target=_search, daemon=True).start()
+    
+    def optimize_pdfs(self):
+        if not self.pdf_files:
+            messagebox.showwarning("提示", "请先添加PDF")
+            return
+        output = filedialog.askdirectory(title="选择输出文件夹")
+        if output:
+            self.converter.pdfs_optimize(list(self.pdf_files), output, self.pdf_dpi.get(),
+                                         self.pdf_jpg_quality.get(), resume=self.resume_batch.get())
     
     def convert_to_webp(self):
         mode = self.webp_mode.get()
@@ -1938,9 +7625,116 @@ class ConverterGUI:
 
 
 def main():
+    import argparse
     import warnings
     warnings.filterwarnings('ignore')
     
+    parser = argparse.ArgumentParser(description="多功能文档转换工具")
+    parser.add_argument('--serve', action='store_true', help="以本地 HTTP 转换服务模式运行（不启动界面）")
+    parser.add_argument('--host', default='127.0.0.1', help="服务监听地址")
+    parser.add_argument('--port', type=int, default=8765, help="服务监听端口")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="转换工作进程数")
+    parser.add_argument('--memory-budget', type=int, metavar='MB', help="渲染内存预算（MB），默认为物理内存的 60%%")
+    parser.add_argument('--load-test', metavar='OPERATION', help="对已启动的服务执行并发压测，如 pdfs_to_images")
+    parser.add_argument('--files', nargs='*', default=[], help="压测上传的文件")
+    parser.add_argument('--concurrency', type=int, default=8, help="压测并发数")
+    parser.add_argument('--requests', type=int, default=50, help="压测请求总数")
+    parser.add_argument('--bench-shm', action='store_true', help="测试进程间传递页面像素的吞吐量（pickle 与共享内存对比）")
+    parser.add_argument('--bench-merge', action='store_true',
+                        help="测试 PDF 合并与拆分的吞吐量（默认生成 1000 个小 PDF，或用 --files 指定）")
+    parser.add_argument('--bench-web-cache', action='store_true',
+                        help="用本机测试站点对比网页资源直连与经缓存代理的耗时和网络流量")
+    parser.add_argument('--index-text', action='store_true', help="提取 --files 指定的 PDF 文本，增量更新全文索引")
+    parser.add_argument('--search', metavar='QUERY', help="在全文索引中搜索，空格分隔的词都要出现")
+    parser.add_argument('--index', default=TextIndex.DEFAULT_PATH, metavar='DB', help="全文索引数据库位置")
+    parser.add_argument('--limit', type=int, default=20, help="搜索返回的最多页数")
+    parser.add_argument('--spool', metavar='DIR', help="分布式模式的共享队列目录")
+    parser.add_argument('--submit', metavar='OPERATION', help="向队列提交任务，如 pdfs_to_images（配合 --files、--output）")
+    parser.add_argument('--output', help="提交任务的输出位置（共享目录）")
+    parser.add_argument('--param', action='append', default=[], metavar='KEY=VALUE', help="转换参数，可重复")
+    parser.add_argument('--wait', action='store_true', help="提交后等待全部任务结束")
+    parser.add_argument('--worker', action='store_true', help="作为工作进程从队列领取任务执行")
+    parser.add_argument('--lease', type=int, default=60, help="任务租期（秒），超时未续租的任务重新排队")
+    parser.add_argument('--history', type=int, nargs='?', const=30, metavar='DAYS',
+                        help="输出最近 DAYS 天（默认 30）的任务吞吐量与失败率报表")
+    parser.add_argument('--bucket', choices=list(JobHistory.BUCKETS), default='day', help="报表的统计时间段")
+    parser.add_argument('--metrics-port', type=int, help="服务 / 工作进程模式下在此端口提供 /metrics 运行指标")
+    parser.add_argument('--metrics-json', metavar='FILE', help="定期把运行指标的 JSON 快照写入该文件")
+    parser.add_argument('--metrics-interval', type=int, default=60, help="JSON 快照的写入间隔（秒）")
+    args = parser.parse_args()
+    
+    if args.history is not None:
+        history = JobHistory()
+        print("\n".join(history.report(args.history, args.bucket)))
+        history.close()
+        return
+    
+    exporter = None
+    if (args.serve or args.worker) and (args.metrics_port or args.metrics_json):
+        exporter = MetricsExporter(host=args.host, port=args.metrics_port, json_path=args.metrics_json,
+                                   interval=args.metrics_interval).start()
+    
+    if args.spool and args.worker:
+        try:
+            run_spool_worker(args.spool, lease=args.lease)
+        finally:
+            if exporter:
+                exporter.stop()
+        return
+    
+    if args.spool:
+        spool = SpoolQueue(args.spool)
+        if args.submit:
+            params = {}
+            for item in args.param:
+                key, _, value = item.partition('=')
+                params[key] = int(value) if value.lstrip('-').isdigit() else value
+            job_ids = spool.submit(args.submit, args.files, args.output, params)
+            print(f"已提交 {len(job_ids)} 个任务")
+            if args.wait:
+                print(json.dumps(spool.wait(job_ids, args.lease), ensure_ascii=False))
+        print(json.dumps(spool.counts(), ensure_ascii=False))
+        return
+    
+    if args.bench_shm:
+        shared_memory_benchmark()
+        return
+    
+    if args.index_text:
+        converter = DocumentConverter()
+        converter.pdfs_index_text(args.files, args.index)
+        return
+    
+    if args.search:
+        start = time.time()
+        results = DocumentConverter(history_path=None).search_text(args.search, args.limit, args.index)
+        for row in results:
+            print(f"{row['path']}\t第 {row['page']} 页\t{row['snippet']}")
+        print(f"{len(results)} 个结果（{(time.time() - start) * 1000:.1f} 毫秒）")
+        return
+    
+    if args.bench_merge:
+        pdf_merge_benchmark(args.files)
+        return
+    
+    if args.bench_web_cache:
+        web_cache_benchmark()
+        return
+    
+    if args.serve:
+        budget = args.memory_budget * 1024 * 1024 if args.memory_budget else None
+        try:
+            ConversionService(args.host, args.port, args.workers, memory_budget=budget).serve_forever()
+        finally:
+            if exporter:
+                exporter.stop()
+        return
+    
+    if args.load_test:
+        service_load_test(f"http://{args.host}:{args.port}", args.load_test, args.files,
+                          args.concurrency, args.requests)
+        return
+    
     root = tk.Tk()
     app = ConverterGUI(root)
     root.mainloop()
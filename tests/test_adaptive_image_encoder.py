@@ -0,0 +1,54 @@
+"""AdaptiveImageEncoder 分类的回归测试（python -m unittest discover tests）"""
+import os
+import sys
+import unittest
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMPORT_ERROR = None
+try:
+    import main
+except ImportError as e:    # main.py 依赖 Windows 的 winreg 等模块
+    main = None
+    IMPORT_ERROR = str(e)
+
+A4_300DPI = (2480, 3508)
+
+
+def text_page(top=150, lines=80, background=245):
+    """灰度扫描的文字页：抗锯齿文字 + 轻微噪点"""
+    page = Image.new('L', A4_300DPI, background)
+    draw = ImageDraw.Draw(page)
+    for i in range(lines):
+        draw.text((200, top + i * 40), "Lorem ipsum dolor sit amet consectetur " * 3, fill=15)
+    w, h = A4_300DPI
+    page = page.resize((w // 2, h // 2)).resize((w, h))
+    return Image.blend(page, Image.effect_noise(A4_300DPI, 8), 0.05)
+
+
+@unittest.skipIf(main is None, f"无法导入 main.py: {IMPORT_ERROR}")
+class ClassifyTest(unittest.TestCase):
+    def setUp(self):
+        self.encoder = main.AdaptiveImageEncoder(85)
+    
+    def test_text_scan_is_bilevel(self):
+        self.assertEqual(self.encoder.classify(text_page()), ('bilevel', True))
+    
+    def test_photo_above_text_is_not_bilevel(self):
+        # 照片在页面上方，中心区域只有文字：仍不能二值化成 G4
+        page = text_page(top=1150, lines=55)
+        photo = Image.linear_gradient('L').resize((1800, 900)).filter(ImageFilter.GaussianBlur(3))
+        photo = Image.blend(photo, Image.effect_noise(photo.size, 30), 0.3)
+        page.paste(photo, (340, 150))
+        kind, gray = self.encoder.classify(page)
+        self.assertTrue(gray)
+        self.assertNotEqual(kind, 'bilevel')
+    
+    def test_gray_photo_is_photo(self):
+        photo = Image.effect_noise((1200, 800), 60).filter(ImageFilter.GaussianBlur(1)).convert('RGB')
+        self.assertEqual(self.encoder.classify(photo), ('photo', True))
+
+
+if __name__ == '__main__':
+    unittest.main()